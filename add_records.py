@@ -1,43 +1,160 @@
-import pandas as pd
+# إضافة سجلات جديدة إلى ملف/مجلد البيانات دون إعادة كتابة البيانات القديمة
+# - وضع append: تُلحق الصفوف الجديدة فقط بنهاية ملف CSV الحالي (التكلفة O(عدد الصفوف الجديدة))
+# - وضع partition: تُكتب الصفوف الجديدة كملف جزء مستقل داخل مجلد البيانات
+# - وضع store: تُضاف الصفوف كجزء Parquet جديد إلى مجموعة في مخزن البيانات (heart_store.py)
+# في كل الأوضاع يُتحقق من الترويسة والمخطط أولاً، والكتابة آمنة عند الانقطاع
+#
+# أمثلة:
+#   python add_records.py heart_comma_updated.csv --rows 10000
+#   python add_records.py data/heart_parts --mode partition --rows 10000
+#   python add_records.py heart --mode store --rows 10000
+import argparse
+import os
+import time
+import uuid
+from io import StringIO
+from pathlib import Path
+
 import numpy as np
+import pandas as pd
+
+from make_heart_data import COLUMNS, generate_chunk, load_risk_model, write_frame
+
+
+# قراءة سطر الترويسة فقط واكتشاف الفاصل ("," أو ";") دون قراءة بقية الملف
+def read_header(path):
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        line = f.readline().rstrip("\r\n")
+    sep = ";" if line.count(";") > line.count(",") else ","
+    return [c.strip() for c in line.split(sep)], sep
+
+
+# التحقق من أن الصفوف الجديدة تطابق ترويسة الملف (الأسماء والترتيب) وأن قيمها رقمية وغير ناقصة
+def validate_schema(df: pd.DataFrame, header):
+    missing = [c for c in header if c not in df.columns]
+    extra = [c for c in df.columns if c not in header]
+    if missing or extra:
+        raise ValueError(f"المخطط غير متطابق. أعمدة ناقصة: {missing}، أعمدة زائدة: {extra}")
+    df = df[header]
+    bad = [c for c in header if not pd.api.types.is_numeric_dtype(df[c])]
+    if bad:
+        raise ValueError("أعمدة غير رقمية: " + ", ".join(bad))
+    if df.isna().any().any():
+        raise ValueError("الصفوف الجديدة تحتوي قيماً ناقصة.")
+    return df
+
+
+# هل السطر سجل بيانات مكتمل: عدد حقوله مطابق للترويسة وكل حقل رقمي غير فارغ (كما يشترط validate_schema)
+def _complete_record(line, n_fields, sep):
+    fields = line.split(sep)
+    if len(fields) != n_fields:
+        return False
+    try:
+        values = [float(v) for v in fields]
+    except ValueError:
+        return False
+    return not any(np.isnan(values))
+
+
+# تجهيز نهاية الملف للإلحاق: سطر أخير بلا "\n" يُكمَل بـ "\n" إن كان سجلاً مكتملاً (كُتب دون سطر جديد أخير)
+# أو ترويسة الملف، وإلا فهو بقايا انقطاع سابق أثناء الإلحاق (قد يتوقف داخل الحقل الأخير) فيُزال
+def _repair_tail(f, n_fields, sep):
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    if size == 0:
+        return 0
+    f.seek(size - 1)
+    if f.read(1) == b"\n":
+        return size
+    # نبحث للخلف عن بداية السطر الأخير
+    pos = size
+    block = 64 * 1024
+    line_start = 0
+    while pos > 0:
+        start = max(0, pos - block)
+        f.seek(start)
+        chunk = f.read(pos - start)
+        idx = chunk.rfind(b"\n")
+        if idx >= 0:
+            line_start = start + idx + 1
+            break
+        pos = start
+    f.seek(line_start)
+    tail = f.read(size - line_start).decode("utf-8", errors="replace").rstrip("\r")
+    header = line_start == 0 and len(tail.split(sep)) == n_fields
+    if header or _complete_record(tail, n_fields, sep):
+        f.seek(size)
+        f.write(b"\n")
+        return size + 1
+    if line_start == 0:
+        raise ValueError("الملف لا يحتوي على ترويسة مكتملة.")
+    f.truncate(line_start)
+    return line_start
+
+
+# إلحاق الصفوف بنهاية ملف CSV موجود: كتلة واحدة + fsync، ومع أي خطأ نعيد الملف لحجمه الأصلي
+def append_rows(path, df: pd.DataFrame):
+    header, sep = read_header(path)
+    df = validate_schema(df, header)
+    buf = StringIO()
+    df.to_csv(buf, sep=sep, index=False, header=False, lineterminator="\n")
+    data = buf.getvalue().encode("utf-8")
+    with open(path, "r+b") as f:
+        original = _repair_tail(f, len(header), sep)
+        try:
+            f.seek(original)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        except BaseException:
+            f.truncate(original)
+            raise
+    return len(df)
+
+
+# كتابة الصفوف كملف جزء جديد داخل مجلد بيانات (كتابة ذرّية: ملف مؤقت ثم إعادة تسمية)
+def write_partition(dataset_dir, df: pd.DataFrame, sep=";"):
+    dataset_dir = Path(dataset_dir)
+    dataset_dir.mkdir(parents=True, exist_ok=True)
+    existing = sorted(dataset_dir.glob("part-*.csv"))
+    if existing:
+        header, sep = read_header(existing[0])
+        df = validate_schema(df, header)
+    else:
+        df = validate_schema(df, COLUMNS)
+    path = dataset_dir / f"part-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.csv"
+    write_frame(df, path, "csv", sep)
+    return path
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="إضافة سجلات اصطناعية جديدة دون إعادة كتابة البيانات الحالية")
+    ap.add_argument("target", help="ملف CSV (وضع append) أو مجلد بيانات (وضع partition) أو اسم مجموعة (وضع store)")
+    ap.add_argument("--mode", choices=["append", "partition", "store"], default="append")
+    ap.add_argument("--rows", type=int, default=10000, help="عدد السجلات الجديدة")
+    ap.add_argument("--seed", type=int, default=None, help="بذرة التوليد (افتراضياً عشوائية)")
+    ap.add_argument("--risk-model", default=None, help="ملف JSON لنموذج الخطر الكامن (انظر make_heart_data.py)")
+    args = ap.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    new_data = generate_chunk(args.rows, rng, load_risk_model(args.risk_model))
+
+    t0 = time.perf_counter()
+    if args.mode == "append":
+        if not os.path.exists(args.target):
+            raise SystemExit(f"الملف غير موجود: {args.target}")
+        append_rows(args.target, new_data)
+        where = args.target
+    elif args.mode == "store":
+        from heart_store import append_frame, read_manifest
+        manifest = read_manifest(args.target)
+        if manifest is not None:
+            validate_schema(new_data, list(manifest["schema"]))
+        where = f"{args.target}/" + append_frame(new_data, args.target)
+    else:
+        where = write_partition(args.target, new_data)
+    print(f"تمت إضافة {args.rows} سجل جديد بنجاح إلى {where} خلال {time.perf_counter() - t0:.2f} ث")
+
 
-# مسار ملف البيانات
-file_path = "C:/Users/Elite/Downloads/heart_comma_updated.csv"
-
-
-# قراءة الملف الأصلي مع تحديد الفاصل الصحيح
-df = pd.read_csv(file_path, sep=';')
-
-print("عدد السجلات الأصلي:", len(df))
-print("معاينة البيانات:")
-print(df.head())
-
-# تحديد عدد السجلات الجديدة
-num_new_records = 10000
-
-# إنشاء بيانات عشوائية جديدة بناءً على نطاقات البيانات الأصلية
-new_data = pd.DataFrame({
-    'age': np.random.randint(df['age'].min(), df['age'].max()+1, size=num_new_records),
-    'sex': np.random.choice(df['sex'].unique(), size=num_new_records),
-    'cp': np.random.choice(df['cp'].unique(), size=num_new_records),
-    'trtbps': np.random.randint(df['trtbps'].min(), df['trtbps'].max()+1, size=num_new_records),
-    'chol': np.random.randint(df['chol'].min(), df['chol'].max()+1, size=num_new_records),
-    'fbs': np.random.choice(df['fbs'].unique(), size=num_new_records),
-    'restecg': np.random.choice(df['restecg'].unique(), size=num_new_records),
-    'thalachh': np.random.randint(df['thalachh'].min(), df['thalachh'].max()+1, size=num_new_records),
-    'exng': np.random.choice(df['exng'].unique(), size=num_new_records),
-    'oldpeak': np.round(np.random.uniform(df['oldpeak'].min(), df['oldpeak'].max(), size=num_new_records), 1),
-    'slp': np.random.choice(df['slp'].unique(), size=num_new_records),
-    'caa': np.random.choice(df['caa'].unique(), size=num_new_records),
-    'thall': np.random.choice(df['thall'].unique(), size=num_new_records),
-    'output': np.random.choice(df['output'].unique(), size=num_new_records),
-})
-
-# دمج البيانات الجديدة مع الأصلية
-df = pd.concat([df, new_data], ignore_index=True)
-
-# حفظ الملف مرة ثانية مع الفاصل الصحيح
-df.to_csv(file_path, sep=';', index=False)
-
-print(f"تمت إضافة {num_new_records} سجل جديد بنجاح!")
-print("عدد السجلات الآن:", len(df))
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# قياس كلفة بدء تشغيل الواجهة: زمن أول تشغيل للسكربت وذروة الذاكرة لكل صفحة، كلٌّ في عملية جديدة (بدء بارد)
+# - الأساس: عملية تستورد streamlit وأداة الاختبار فقط، ثم يُطرح زمنها/ذاكرتها من كل صفحة
+# - يعرض أيضاً أي المكتبات الثقيلة حُمّلت، لاكتشاف أي استيراد أعلى الملف يعيدها لكل جلسة
+#
+# أمثلة:
+#   python bench_startup.py
+#   python bench_startup.py --repeat 5 --json startup.json
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+APP = Path(__file__).parent / "heart_web.py"
+HEAVY = ["sklearn", "scipy", "plotly", "pyarrow", "joblib"]
+SCENARIOS = {
+    "الأساس": "-",
+    "الدخول": "",
+    "الرئيسية": "الصفحة الرئيسية",
+    "التنبؤ (قبل النقر)": "نموذج التنبؤ",
+    "التنبؤ (بعد النقر)": "نموذج التنبؤ+",
+    "رفع CSV": "رفع ملف CSV",
+    "التدريب": "تدريب النموذج",
+    "حول": "حول",
+}
+
+# الكود الذي يُنفَّذ في العملية الجديدة (الوسائط: ملف التطبيق، الصفحة أو "-" للأساس، المكتبات الثقيلة)
+# الصفحة الفارغة = صفحة الدخول، واللاحقة "+" = النقر على زر التنبؤ؛ يطبع سطر JSON واحداً
+_CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+nav = sys.argv[2]
+if nav != "-":
+    at = AppTest.from_file(sys.argv[1], default_timeout=300)
+    if nav:
+        at.session_state["authenticated"] = True
+        at.session_state["username"] = "bench"
+        at.session_state["nav"] = nav.rstrip("+")
+    at.run()
+    if nav.endswith("+"):
+        [b for b in at.button if "تنبؤ" in b.label][0].click().run()
+    errors = [str(e.value) for e in at.exception]
+else:
+    errors = []
+seconds = time.perf_counter() - t0
+try:
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_mb = rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+except ImportError:
+    rss_mb = None
+heavy = sorted({m.split(".")[0] for m in sys.modules} & set(json.loads(sys.argv[3])))
+print(json.dumps({"seconds": seconds, "rss_mb": rss_mb, "heavy": heavy, "errors": errors}))
+"""
+
+
+def run_once(nav):
+    argv = [sys.executable, "-c", _CHILD, str(APP), nav, json.dumps(HEAVY)]
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    env.pop("HEART_WARMUP", None)
+    out = subprocess.run(argv, capture_output=True, text=True, cwd=str(APP.parent), env=env, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="قياس زمن البدء البارد وذروة الذاكرة لصفحات الواجهة")
+    ap.add_argument("--repeat", type=int, default=3, help="عدد التكرارات لكل صفحة (يُعرض الوسيط)")
+    ap.add_argument("--json", default=None, help="حفظ النتائج في ملف JSON لمتابعتها بين الإصدارات")
+    args = ap.parse_args(argv)
+
+    results = {}
+    for name, nav in SCENARIOS.items():
+        runs = [run_once(nav) for _ in range(max(1, args.repeat))]
+        rss = [r["rss_mb"] for r in runs if r["rss_mb"] is not None]
+        results[name] = {
+            "seconds": statistics.median(r["seconds"] for r in runs),
+            "rss_mb": statistics.median(rss) if rss else None,
+            "heavy": runs[-1]["heavy"],
+            "errors": runs[-1]["errors"],
+        }
+
+    base = results["الأساس"]
+    print(f"{'الصفحة':<20}{'الزمن (ث)':>10}{'+ فوق الأساس':>14}{'ذروة RSS (MB)':>15}{'+ فوق الأساس':>14}  المكتبات الثقيلة")
+    for name, r in results.items():
+        d_rss = "" if r["rss_mb"] is None or base["rss_mb"] is None else f"{r['rss_mb'] - base['rss_mb']:+.0f}"
+        rss = "—" if r["rss_mb"] is None else f"{r['rss_mb']:.0f}"
+        print(f"{name:<20}{r['seconds']:>10.2f}{r['seconds'] - base['seconds']:>+14.2f}{rss:>15}{d_rss:>14}  "
+              f"{', '.join(r['heavy']) or '—'}{'  ⚠️ ' + r['errors'][0] if r['errors'] else ''}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+# سجل تدقيق لكل تنبؤ (فردي أو دفعي): الوقت، المستخدم، نسخة النموذج، بصمة المدخلات، والنتيجة
+# - مسار التنبؤ لا ينتظر القرص أبداً: التسجيل وضع عنصر في طابور محدود في الذاكرة (put_nowait) فقط؛
+#   عند امتلاء الطابور يُسقط العنصر ويُعدّ في stats()["dropped"] بدل أن يتأخر التنبؤ
+# - خيط كاتب واحد في الخلفية يفرّغ الطابور على دفعات (حتى FLUSH_ITEMS عنصر أو كل FLUSH_INTERVAL_S ثانية)
+#   في معاملة SQLite واحدة (executemany)؛ حساب بصمات المدخلات يتم هنا أيضاً لا في مسار التنبؤ
+# - SQLite بوضع WAL: القراءة (صفحة السجل) لا تحجب الكاتب، وعدة عمليات (عمال heart_service) تكتب لنفس الملف
+# - الخيط يُنشأ عند أول تسجيل في كل عملية (وبعد fork من جديد) لأن الخيوط لا تنتقل عبر fork
+#
+# أمثلة:
+#   python heart_audit.py recent --limit 20
+#   python heart_audit.py recent --user admin --kind batch
+#   python heart_audit.py summary
+import argparse
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_DB = Path(os.environ.get("HEART_AUDIT_DB", str(Path(__file__).parent / "data" / "audit.sqlite3")))
+QUEUE_SIZE = int(os.environ.get("HEART_AUDIT_QUEUE", "10000"))
+FLUSH_ITEMS = 256
+FLUSH_INTERVAL_S = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    user TEXT,
+    model_version TEXT,
+    kind TEXT NOT NULL,
+    batch_id TEXT,
+    row_no INTEGER,
+    inputs_hash INTEGER NOT NULL,
+    prediction INTEGER,
+    risk REAL
+);
+CREATE INDEX IF NOT EXISTS predictions_ts ON predictions (ts);
+CREATE INDEX IF NOT EXISTS predictions_user ON predictions (user, id);
+CREATE INDEX IF NOT EXISTS predictions_version ON predictions (model_version, id);
+CREATE INDEX IF NOT EXISTS predictions_hash ON predictions (inputs_hash);
+CREATE INDEX IF NOT EXISTS predictions_batch ON predictions (batch_id, row_no);
+CREATE TABLE IF NOT EXISTS batches (
+    batch_id TEXT PRIMARY KEY,
+    ts REAL NOT NULL,
+    user TEXT,
+    model_version TEXT,
+    source TEXT,
+    n_rows INTEGER,
+    n_positive INTEGER,
+    mean_risk REAL
+);
+CREATE INDEX IF NOT EXISTS batches_ts ON batches (ts);
+"""
+
+_STOP = object()
+
+
+def connect(db=None, readonly=False):
+    path = Path(db or DEFAULT_DB)
+    if readonly:
+        con = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=10)
+    else:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        con = sqlite3.connect(path, timeout=30)
+        con.execute("PRAGMA journal_mode=WAL")
+        # مع WAL يكفي NORMAL: لا فساد عند انقطاع مفاجئ، فقط قد تضيع آخر معاملة
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.executescript(SCHEMA)
+    return con
+
+
+# بصمة 64 بت لكل سجل من قيم السمات (float64 بالترتيب المعطى): نفس المدخلات ← نفس البصمة فردياً أو ضمن دفعة
+# تُخزن كعدد صحيح بإشارة لأن INTEGER في SQLite بإشارة
+def inputs_hash(X, feats) -> np.ndarray:
+    values = np.asarray(X[list(feats)] if isinstance(X, pd.DataFrame) else X, dtype=np.float64)
+    values = pd.DataFrame(np.atleast_2d(values))
+    return pd.util.hash_pandas_object(values, index=False).to_numpy().view(np.int64)
+
+
+def format_hash(h) -> str:
+    return f"{int(h) & 0xFFFFFFFFFFFFFFFF:016x}"
+
+
+def parse_hash(text: str) -> int:
+    return int(np.array([int(text, 16)], dtype=np.uint64).view(np.int64)[0])
+
+
+class AuditLog:
+    def __init__(self, db=None, maxsize=None):
+        self.db = Path(db or DEFAULT_DB)
+        self.maxsize = int(maxsize or QUEUE_SIZE)
+        self._lock = threading.Lock()
+        self._stats = {"queued": 0, "dropped": 0, "written_rows": 0, "flushes": 0, "errors": 0}
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        atexit.register(self.close)
+
+    # تنبؤ سجل واحد؛ row = قيم السمات بترتيب feats (مصفوفة/قائمة أو DataFrame بسطر واحد)
+    def log_single(self, row, feats, prediction, proba, user=None, version=None):
+        risk = None if proba is None else float(proba) * 100.0
+        self._put(("single", time.time(), user, version, None, row, feats,
+                   np.array([int(prediction)]), None if risk is None else np.array([risk])))
+
+    # دفعة كاملة: يعيد batch_id فوراً (للعرض وربط النتائج) والكتابة الفعلية في الخلفية
+    # X يُمرر بالمرجع دون نسخ، فلا يُعدَّل بعد التسجيل
+    def log_batch(self, X, feats, predictions, risk_percent, user=None, version=None, source=None):
+        batch_id = uuid.uuid4().hex[:16]
+        self._put(("batch", time.time(), user, version, (batch_id, source), X, feats,
+                   np.asarray(predictions), None if risk_percent is None else np.asarray(risk_percent, dtype=float)))
+        return batch_id
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+        s["pending"] = self._queue.qsize() if self._queue is not None else 0
+        return s
+
+    # تفريغ ما تبقى وإيقاف الكاتب (عند الخروج أو في الاختبارات)
+    def close(self, timeout=10.0):
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    # انتظار حتى يكتب الخيط كل ما وُضع في الطابور حتى الآن (للأدوات والقياس، لا لمسار التنبؤ)
+    def flush(self, timeout=10.0):
+        deadline = time.perf_counter() + timeout
+        while self._queue is not None and self._queue.unfinished_tasks and time.perf_counter() < deadline:
+            time.sleep(0.01)
+
+    def _put(self, item):
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self._stats["dropped"] += 1
+            return
+        with self._lock:
+            self._stats["queued"] += 1
+
+    def _ensure_writer(self):
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid != os.getpid() or self._thread is None:
+                self._pid = os.getpid()
+                self._queue = queue.Queue(maxsize=self.maxsize)
+                self._thread = threading.Thread(target=self._run, name="heart-audit-writer", daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        items = []
+        try:
+            items.append(self._queue.get(timeout=FLUSH_INTERVAL_S))
+        except queue.Empty:
+            return items
+        while len(items) < FLUSH_ITEMS:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        con = connect(self.db)
+        try:
+            while True:
+                items = self._collect()
+                stop = any(it is _STOP for it in items)
+                items = [it for it in items if it is not _STOP]
+                if items:
+                    self._write(con, items)
+                for _ in range(len(items) + stop):
+                    self._queue.task_done()
+                if stop:
+                    return
+        finally:
+            con.close()
+
+    def _write(self, con, items):
+        pred_rows, batch_rows = [], []
+        for kind, ts, user, version, batch, X, feats, preds, risk in items:
+            try:
+                hashes = inputs_hash(X, feats)
+            except Exception:
+                with self._lock:
+                    self._stats["errors"] += 1
+                continue
+            n = len(hashes)
+            batch_id = None
+            if batch is not None:
+                batch_id, source = batch
+                batch_rows.append((batch_id, ts, user, version, source, n, int((preds == 1).sum()),
+                                   None if risk is None or not n else float(risk.mean())))
+            risk_col = [None] * n if risk is None else risk.tolist()
+            pred_rows.extend(zip([ts] * n, [user] * n, [version] * n, [kind] * n, [batch_id] * n,
+                                 range(n) if batch_id else [None] * n, hashes.tolist(), preds.astype(int).tolist(),
+                                 risk_col))
+        try:
+            with con:
+                con.executemany("INSERT INTO predictions (ts, user, model_version, kind, batch_id, row_no, "
+                                "inputs_hash, prediction, risk) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", pred_rows)
+                con.executemany("INSERT OR REPLACE INTO batches VALUES (?, ?, ?, ?, ?, ?, ?, ?)", batch_rows)
+        except sqlite3.Error:
+            with self._lock:
+                self._stats["errors"] += 1
+            return
+        with self._lock:
+            self._stats["written_rows"] += len(pred_rows)
+            self._stats["flushes"] += 1
+
+
+# الشروط المشتركة لاستعلامات السجل؛ كل شرط يطابق فهرساً (user/model_version مع id، ts، inputs_hash)
+def _where(user=None, version=None, kind=None, since=None, until=None, risk_min=None, risk_max=None,
+           inputs=None, batch_id=None):
+    cond, args = [], []
+    for col, val in (("user", user), ("model_version", version), ("kind", kind), ("inputs_hash", inputs),
+                     ("batch_id", batch_id)):
+        if val is not None:
+            cond.append(f"{col} = ?"), args.append(val)
+    if since is not None:
+        cond.append("ts >= ?"), args.append(float(since))
+    if until is not None:
+        cond.append("ts < ?"), args.append(float(until))
+    if risk_min is not None:
+        cond.append("risk >= ?"), args.append(float(risk_min))
+    if risk_max is not None:
+        cond.append("risk <= ?"), args.append(float(risk_max))
+    return (" WHERE " + " AND ".join(cond)) if cond else "", args
+
+
+# صفحة من السجل، الأحدث أولاً؛ الترقيم بالمفتاح (before_id = أصغر id في الصفحة السابقة) بدل OFFSET
+# فتكلفة الصفحة ثابتة مهما بعدت
+def recent(db=None, limit=50, before_id=None, **filters) -> pd.DataFrame:
+    where, args = _where(**filters)
+    if before_id is not None:
+        where += (" AND " if where else " WHERE ") + "id < ?"
+        args.append(int(before_id))
+    path = Path(db or DEFAULT_DB)
+    cols = ["id", "ts", "user", "model_version", "kind", "batch_id", "row_no", "inputs_hash", "prediction", "risk"]
+    if not path.exists():
+        return pd.DataFrame(columns=cols)
+    con = connect(path, readonly=True)
+    try:
+        df = pd.read_sql_query(f"SELECT {', '.join(cols)} FROM predictions{where} ORDER BY id DESC LIMIT ?",
+                               con, params=args + [int(limit)])
+    finally:
+        con.close()
+    df["ts"] = pd.to_datetime(df["ts"], unit="s")
+    df["row_no"] = df["row_no"].astype("Int64")
+    df["inputs_hash"] = df["inputs_hash"].map(format_hash)
+    return df
+
+
+# ملخص حسب النوع: العدد ومتوسط الخطر وأول/آخر وقت، بنفس الشروط
+def summary(db=None, **filters) -> pd.DataFrame:
+    path = Path(db or DEFAULT_DB)
+    if not path.exists():
+        return pd.DataFrame(columns=["kind", "n", "mean_risk", "first_ts", "last_ts"])
+    where, args = _where(**filters)
+    con = connect(path, readonly=True)
+    try:
+        df = pd.read_sql_query(f"SELECT kind, COUNT(*) AS n, AVG(risk) AS mean_risk, MIN(ts) AS first_ts, "
+                               f"MAX(ts) AS last_ts FROM predictions{where} GROUP BY kind", con, params=args)
+    finally:
+        con.close()
+    for c in ("first_ts", "last_ts"):
+        df[c] = pd.to_datetime(df[c], unit="s")
+    return df
+
+
+def list_batches(db=None, user=None, limit=50) -> pd.DataFrame:
+    path = Path(db or DEFAULT_DB)
+    if not path.exists():
+        return pd.DataFrame(columns=["batch_id", "ts", "user", "model_version", "source", "n_rows", "n_positive",
+                                     "mean_risk"])
+    where, args = _where(user=user)
+    con = connect(path, readonly=True)
+    try:
+        df = pd.read_sql_query(f"SELECT * FROM batches{where} ORDER BY ts DESC LIMIT ?", con,
+                               params=args + [int(limit)])
+    finally:
+        con.close()
+    df["ts"] = pd.to_datetime(df["ts"], unit="s")
+    return df
+
+
+# القيم المميزة لعمود (لقوائم التصفية)
+def distinct(column, db=None, limit=200):
+    if column not in ("user", "model_version", "kind"):
+        raise ValueError(f"عمود غير مدعوم: {column}")
+    path = Path(db or DEFAULT_DB)
+    if not path.exists():
+        return []
+    con = connect(path, readonly=True)
+    try:
+        rows = con.execute(f"SELECT DISTINCT {column} FROM predictions WHERE {column} IS NOT NULL LIMIT ?",
+                           (int(limit),)).fetchall()
+    finally:
+        con.close()
+    return sorted(r[0] for r in rows)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="استعراض سجل تدقيق التنبؤات")
+    ap.add_argument("--db", default=None)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("recent", help="آخر التنبؤات")
+    r.add_argument("--limit", type=int, default=20)
+    r.add_argument("--user", default=None)
+    r.add_argument("--version", default=None)
+    r.add_argument("--kind", choices=["single", "batch"], default=None)
+    r.add_argument("--hash", default=None, help="بصمة المدخلات (16 خانة سداسية)")
+    sub.add_parser("summary", help="العدد ومتوسط الخطر حسب النوع")
+    sub.add_parser("batches", help="آخر الدفعات")
+    args = ap.parse_args(argv)
+
+    with pd.option_context("display.width", 200, "display.max_columns", 20):
+        if args.cmd == "recent":
+            t0 = time.perf_counter()
+            df = recent(args.db, args.limit, user=args.user, version=args.version, kind=args.kind,
+                        inputs=None if args.hash is None else parse_hash(args.hash))
+            print(df.to_string(index=False))
+            print(f"⏱️ {(time.perf_counter() - t0) * 1000:.1f} ميلي ثانية")
+        elif args.cmd == "summary":
+            print(summary(args.db).to_string(index=False))
+        else:
+            print(list_batches(args.db).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
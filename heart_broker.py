@@ -0,0 +1,161 @@
+# وسيط تنبؤ بالدُفعات الصغيرة (micro-batching) مشترك بين كل جلسات Streamlit
+# - كل نقرة "تنبؤ" تضع صفاً واحداً في طابور وتنتظر Future خاصاً بها
+# - خيط واحد يجمع الطلبات القادمة من كل الجلسات لبضعة أجزاء من الثانية (max_wait_ms) أو حتى max_batch
+#   ثم ينفذ نداءً متجهاً واحداً للنموذج ويوزع النتائج على أصحابها
+# - الطلبات تُجمع حسب (النموذج، الأعمدة) حتى لا تختلط نتائج نموذجين عند تبديل النموذج أثناء التشغيل
+#
+# قياس سريع للإنتاجية (مباشر مقابل الوسيط):
+#   python heart_broker.py --threads 64 --requests 5000
+import argparse
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+
+from heart_inference import predict_batch, predict_with_spread
+
+DEFAULT_MAX_BATCH = int(os.environ.get("HEART_BROKER_MAX_BATCH", "64"))
+DEFAULT_MAX_WAIT_MS = float(os.environ.get("HEART_BROKER_MAX_WAIT_MS", "5"))
+
+_STOP = object()
+
+
+class PredictionBroker:
+    def __init__(self, max_batch=None, max_wait_ms=None):
+        self.max_batch = int(max_batch or DEFAULT_MAX_BATCH)
+        self.max_wait = (DEFAULT_MAX_WAIT_MS if max_wait_ms is None else float(max_wait_ms)) / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "batches": 0, "max_batch_seen": 0}
+        self._thread = threading.Thread(target=self._run, name="heart-prediction-broker", daemon=True)
+        self._thread.start()
+
+    # إرسال صف واحد (DataFrame بسطر واحد) والحصول على Future يُحل بـ (التصنيف، الاحتمال، تشتت الأشجار أو None)
+    def submit(self, model, X: pd.DataFrame) -> Future:
+        fut = Future()
+        if not self._thread.is_alive():
+            fut.set_exception(RuntimeError("وسيط التنبؤ متوقف"))
+            return fut
+        self._queue.put((model, X, fut))
+        return fut
+
+    def predict(self, model, X: pd.DataFrame, timeout=30.0, with_spread=False):
+        result = self.submit(model, X).result(timeout=timeout)
+        return result if with_spread else result[:2]
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._thread.join(timeout=5)
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+        s["avg_batch"] = s["requests"] / s["batches"] if s["batches"] else 0.0
+        return s
+
+    # تجميع دفعة: ننتظر أول طلب، ثم نجمع ما يصل حتى الامتلاء أو انتهاء المهلة
+    def _collect(self):
+        first = self._queue.get()
+        if first is _STOP:
+            return None
+        items = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(items) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            items.append(item)
+        return items
+
+    def _run(self):
+        while True:
+            items = self._collect()
+            if items is None:
+                return
+            groups = {}
+            for model, X, fut in items:
+                if fut.set_running_or_notify_cancel():
+                    groups.setdefault((id(model), tuple(X.columns)), (model, []))[1].append((X, fut))
+            for model, reqs in groups.values():
+                self._predict_group(model, reqs)
+            with self._lock:
+                self._stats["requests"] += len(items)
+                self._stats["batches"] += 1
+                self._stats["max_batch_seen"] = max(self._stats["max_batch_seen"], len(items))
+
+    def _predict_group(self, model, reqs):
+        try:
+            X = pd.concat([x for x, _ in reqs], ignore_index=True) if len(reqs) > 1 else reqs[0][0]
+            # تشتت الأشجار يأتي من نفس التقييم (للغابات فقط)، فلا يكلف الدفعة شيئاً إضافياً
+            preds, proba, spread = predict_with_spread(model, X)
+        except Exception:
+            # فشل الدفعة كاملة: نعيد كل طلب منفرداً حتى لا يُفسد صف خاطئ نتائج الآخرين
+            for x, fut in reqs:
+                try:
+                    p, pr = predict_batch(model, x)
+                    fut.set_result((p[0], None if pr is None else float(pr[0]), None))
+                except Exception as e:
+                    fut.set_exception(e)
+            return
+        for i, (_, fut) in enumerate(reqs):
+            fut.set_result((preds[i], None if proba is None else float(proba[i]),
+                            None if spread is None else {k: float(v[i]) for k, v in spread.items()}))
+
+
+def _bench(model, X, threads, requests, broker=None):
+    from concurrent.futures import ThreadPoolExecutor
+    rows = [X.iloc[[i % len(X)]].reset_index(drop=True) for i in range(requests)]
+    lat = np.empty(requests)
+
+    def one(i):
+        t = time.perf_counter()
+        if broker is None:
+            predict_batch(model, rows[i])
+        else:
+            broker.predict(model, rows[i])
+        lat[i] = time.perf_counter() - t
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        list(ex.map(one, range(requests)))
+    elapsed = time.perf_counter() - t0
+    return requests / elapsed, np.percentile(lat, 50) * 1000, np.percentile(lat, 99) * 1000
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="قياس إنتاجية التنبؤ المباشر مقابل وسيط الدفعات الصغيرة")
+    ap.add_argument("--model", default="heart_model.pkl")
+    ap.add_argument("--threads", type=int, default=64, help="عدد المستخدمين المتزامنين")
+    ap.add_argument("--requests", type=int, default=5000)
+    ap.add_argument("--max-batch", type=int, default=None)
+    ap.add_argument("--max-wait-ms", type=float, default=None)
+    args = ap.parse_args(argv)
+
+    import joblib
+    from heart_inference import REQUIRED_FEATURES
+    obj = joblib.load(args.model)
+    model = obj["estimator"] if isinstance(obj, dict) and "estimator" in obj else obj
+    feats = obj.get("features") if isinstance(obj, dict) else None
+    from make_heart_data import generate_chunk
+    X = generate_chunk(1000, np.random.default_rng(0))[list(feats or REQUIRED_FEATURES)]
+
+    rps, p50, p99 = _bench(model, X, args.threads, args.requests)
+    print(f"مباشر:  {rps:,.0f} طلب/ث، p50={p50:.1f}ms، p99={p99:.1f}ms")
+    broker = PredictionBroker(args.max_batch, args.max_wait_ms)
+    rps, p50, p99 = _bench(model, X, args.threads, args.requests, broker)
+    s = broker.stats()
+    broker.close()
+    print(f"الوسيط: {rps:,.0f} طلب/ث، p50={p50:.1f}ms، p99={p99:.1f}ms، متوسط الدفعة {s['avg_batch']:.1f}")
+
+
+if __name__ == "__main__":
+    main()
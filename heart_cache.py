@@ -0,0 +1,110 @@
+# ذاكرة مؤقتة دائمة على القرص لنتائج التدريب (النموذج المدرب + تقريره)
+# المفتاح = بصمة محتوى بيانات التدريب المدمجة + إعدادات التدريب، والإخلاء LRU ضمن ميزانية حجم
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import joblib
+import pandas as pd
+import sklearn
+
+DEFAULT_CACHE_DIR = Path(os.environ.get("HEART_TRAIN_CACHE_DIR", str(Path(__file__).parent / ".train_cache")))
+DEFAULT_MAX_MB = float(os.environ.get("HEART_TRAIN_CACHE_MB", "512"))
+# يُرفع عند تغيّر شكل الحمولة/التقرير المخزّن حتى لا تُسترجع مدخلات بصيغة قديمة
+FORMAT_VERSION = 4
+
+
+# بصمة محتوى DataFrame: أسماء الأعمدة وأنواعها ثم تجزئة كل صف بالترتيب
+# (الترتيب مهم لأن train_test_split يعتمد عليه)
+def dataset_fingerprint(df: pd.DataFrame) -> str:
+    h = hashlib.sha256()
+    h.update(json.dumps([[str(c) for c in df.columns], [str(t) for t in df.dtypes]]).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return h.hexdigest()
+
+
+# مفتاح طلب التدريب: بصمة البيانات + الإعدادات + إصدار scikit-learn (لأن الحمولة مرتبطة به)
+def training_key(df: pd.DataFrame, params: dict) -> str:
+    h = hashlib.sha256()
+    h.update(dataset_fingerprint(df).encode("ascii"))
+    h.update(json.dumps(params, sort_keys=True, default=str).encode("utf-8"))
+    h.update(sklearn.__version__.encode("ascii"))
+    h.update(str(FORMAT_VERSION).encode("ascii"))
+    return h.hexdigest()
+
+
+class TrainingCache:
+    def __init__(self, cache_dir=None, max_mb=None):
+        self.cache_dir = Path(cache_dir) if cache_dir else DEFAULT_CACHE_DIR
+        self.max_bytes = int((max_mb if max_mb is not None else DEFAULT_MAX_MB) * 1024 * 1024)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.joblib"
+
+    # استرجاع مدخل؛ تحديث mtime يجعله "الأحدث استخداماً" لسياسة LRU
+    def get(self, key: str):
+        p = self._path(key)
+        if not p.exists():
+            return None
+        try:
+            entry = joblib.load(str(p))
+        except Exception:
+            # ملف تالف (مثلاً من إصدار مكتبة مختلف): نحذفه ونعامله كغياب
+            try:
+                p.unlink()
+            except OSError:
+                pass
+            return None
+        try:
+            os.utime(p, None)
+        except OSError:
+            pass
+        return entry
+
+    # حفظ ذري: الكتابة في ملف مؤقت بنفس المجلد ثم os.replace حتى لا يرى أحد ملفاً نصف مكتوب
+    def put(self, key: str, entry: dict):
+        fd, tmp = tempfile.mkstemp(dir=str(self.cache_dir), suffix=".tmp")
+        os.close(fd)
+        try:
+            joblib.dump(entry, tmp)
+            if os.path.getsize(tmp) > self.max_bytes:
+                # مدخل أكبر من الميزانية بأكملها: لا نخزنه
+                os.remove(tmp)
+                return False
+            os.replace(tmp, self._path(key))
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self.evict()
+        return True
+
+    # إخلاء الأقدم استخداماً حتى يصبح الحجم الكلي ضمن الميزانية
+    def evict(self):
+        files = []
+        for p in self.cache_dir.glob("*.joblib"):
+            try:
+                st_ = p.stat()
+            except OSError:
+                continue
+            files.append((st_.st_mtime, st_.st_size, p))
+        total = sum(size for _, size, _ in files)
+        for _, size, p in sorted(files, key=lambda t: t[0]):
+            if total <= self.max_bytes:
+                break
+            try:
+                p.unlink()
+                total -= size
+            except OSError:
+                pass
+        return total
+
+    def clear(self):
+        for p in self.cache_dir.glob("*.joblib"):
+            try:
+                p.unlink()
+            except OSError:
+                pass
@@ -0,0 +1,173 @@
+# بناء مخططات Plotly المستخدمة في الواجهة (دوال نقية بلا Streamlit)
+# الواجهة تخزّن ناتجها (st.cache_resource أو حالة الجلسة) فلا يُعاد بناء الشكل عند كل إعادة تشغيل
+import plotly.graph_objects as go
+
+RISK_STEPS = [
+    {"range": [0, 30], "color": "#c6f5d9"},
+    {"range": [30, 70], "color": "#fff2cc"},
+    {"range": [70, 100], "color": "#f4c7c3"},
+]
+
+
+# مؤشر نسبة الخطر (Gauge) بلون حسب التصنيف؛ band = (منخفض، مرتفع) يُرسم شريطاً داكناً لفترة عدم اليقين
+def risk_gauge(risk_value: float, color: str, band=None) -> go.Figure:
+    steps = RISK_STEPS if band is None else RISK_STEPS + [
+        {"range": list(band), "color": "rgba(0, 0, 0, 0.25)", "thickness": 0.35}]
+    return go.Figure(go.Indicator(
+        mode="gauge+number",
+        value=risk_value,
+        number={"suffix": "%"},
+        gauge={
+            "axis": {"range": [0, 100]},
+            "bar": {"color": color},
+            "steps": steps,
+            "threshold": {
+                "line": {"color": "black", "width": 4},
+                "thickness": 0.75,
+                "value": risk_value,
+            },
+        },
+    ))
+
+
+# دونات نسبة الخطر مقابل الأمان
+def risk_donut(risk_value: float) -> go.Figure:
+    safe = max(0.0, 100.0 - risk_value)
+    fig = go.Figure(data=[go.Pie(labels=["خطر", "آمن"], values=[risk_value, safe], hole=.6,
+                                 marker_colors=["#e76f51", "#2a9d8f"])])
+    fig.update_layout(showlegend=True)
+    return fig
+
+
+# عدد السجلات لكل فئة متنبأ بها (0/1)
+def class_counts_bar(n_low: int, n_high: int) -> go.Figure:
+    fig = go.Figure(data=[go.Bar(x=["غير خطر (0)", "خطر (1)"], y=[n_low, n_high], marker_color=["#2ecc71", "#e74c3c"])])
+    fig.update_layout(title="عدد السجلات حسب الفئة المتنبأ بها", xaxis_title="الفئة", yaxis_title="العدد")
+    return fig
+
+
+# أهمية السمات بالتبديل مع أشرطة الانحراف المعياري
+def importance_bar(imp: dict) -> go.Figure:
+    names = list(imp["mean"].keys())
+    fig = go.Figure(go.Bar(
+        x=[imp["mean"][n] for n in names],
+        y=names,
+        orientation="h",
+        error_x={"type": "data", "array": [imp.get("std", {}).get(n, 0.0) for n in names]},
+        marker_color="#2a9d8f",
+    ))
+    fig.update_layout(
+        yaxis={"autorange": "reversed"},
+        xaxis_title=f"انخفاض {imp.get('scoring', 'score')} عند خلط السمة",
+        height=40 + 28 * len(names),
+        margin={"t": 10, "b": 40},
+    )
+    return fig
+
+
+def confusion_heatmap(cm) -> go.Figure:
+    fig = go.Figure(data=go.Heatmap(z=cm, colorscale="Blues"))
+    fig.update_layout(xaxis_title="Predicted", yaxis_title="Actual")
+    return fig
+
+
+# منحنيات "ماذا لو" للسمات الرقمية: مخطط صغير لكل سمة ونقطة عند قيمة المريض
+def what_if_curves(df, labels: dict) -> go.Figure:
+    from plotly.subplots import make_subplots
+    feats = list(dict.fromkeys(df["feature"]))
+    cols = min(3, len(feats))
+    rows = -(-len(feats) // cols)
+    fig = make_subplots(rows=rows, cols=cols, subplot_titles=[labels.get(f, f) for f in feats],
+                        shared_yaxes=True, vertical_spacing=0.18)
+    for k, f in enumerate(feats):
+        part = df[df["feature"] == f]
+        cur = part[part["current"]]
+        r, c = k // cols + 1, k % cols + 1
+        fig.add_trace(go.Scatter(x=part["value"], y=part["risk_percent"], mode="lines", line={"color": "#c0392b"},
+                                 showlegend=False, hovertemplate="%{x}: %{y:.1f}%<extra></extra>"), row=r, col=c)
+        fig.add_trace(go.Scatter(x=cur["value"], y=cur["risk_percent"], mode="markers",
+                                 marker={"color": "black", "size": 9}, showlegend=False,
+                                 hovertemplate="القيمة الحالية %{x}: %{y:.1f}%<extra></extra>"), row=r, col=c)
+    fig.update_yaxes(range=[0, 100], ticksuffix="%")
+    fig.update_layout(height=260 * rows, margin={"t": 40, "b": 30})
+    return fig
+
+
+# الخطر تحت كل رمز بديل للسمات الفئوية (العمود الداكن = قيمة المريض)
+def what_if_categories(df, labels: dict) -> go.Figure:
+    x = [[labels.get(f, f) for f in df["feature"]], [str(int(v)) for v in df["value"]]]
+    fig = go.Figure(go.Bar(
+        x=x, y=df["risk_percent"],
+        marker_color=["#264653" if c else "#2a9d8f" for c in df["current"]],
+        hovertemplate="%{x}: %{y:.1f}%<extra></extra>",
+    ))
+    fig.update_layout(yaxis={"range": [0, 100], "ticksuffix": "%"}, height=320, margin={"t": 10, "b": 40})
+    return fig
+
+
+# مساهمة كل سمة في نتيجة سجل واحد (أحمر = ترفع الخطر، أخضر = تخفضه)، مرتبة حسب حجم الأثر
+def contribution_bar(contrib: dict, labels: dict, unit: str) -> go.Figure:
+    names = sorted(contrib, key=lambda f: abs(contrib[f]), reverse=True)
+    fig = go.Figure(go.Bar(
+        x=[contrib[f] for f in names],
+        y=[labels.get(f, f) for f in names],
+        orientation="h",
+        marker_color=["#e74c3c" if contrib[f] > 0 else "#2ecc71" for f in names],
+        hovertemplate="%{y}: %{x:+.3f}<extra></extra>",
+    ))
+    fig.update_layout(
+        yaxis={"autorange": "reversed"},
+        xaxis_title=unit,
+        height=40 + 28 * len(names),
+        margin={"t": 10, "b": 40},
+    )
+    return fig
+
+
+# مدرج تكراري من فئات محسوبة مسبقاً (حدود + أعداد) بدل القيم الخام: حجم الشكل ثابت مهما كان عدد السجلات
+def binned_histogram(edges, counts, title="توزيع نسبة الخطر (%)") -> go.Figure:
+    centers = [(a + b) / 2.0 for a, b in zip(edges[:-1], edges[1:])]
+    widths = [b - a for a, b in zip(edges[:-1], edges[1:])]
+    fig = go.Figure(go.Bar(x=centers, y=list(counts), width=widths, marker_color="#c0392b",
+                           customdata=list(zip(edges[:-1], edges[1:])),
+                           hovertemplate="%{customdata[0]:.0f}–%{customdata[1]:.0f}%: %{y:,}<extra></extra>"))
+    fig.update_layout(title=title, xaxis_title="نسبة الخطر", yaxis_title="عدد السجلات", bargap=0.02)
+    return fig
+
+
+# خريطة حرارية لمقياس شرائح (صفوف × أعمدة) مع عدد السجلات في كل خلية
+def segment_heatmap(values, counts, metric_label: str, rows_label: str, cols_label: str) -> go.Figure:
+    fig = go.Figure(go.Heatmap(
+        z=values.to_numpy(), x=[str(c) for c in values.columns], y=[str(i) for i in values.index],
+        text=counts.to_numpy(), colorscale="Reds", colorbar={"title": metric_label},
+        texttemplate="%{z:.1f}<br>n=%{text:,}",
+        hovertemplate=(f"{rows_label}: %{{y}}<br>{cols_label}: %{{x}}<br>{metric_label}: %{{z:.2f}}"
+                       "<br>n=%{text:,}<extra></extra>"),
+    ))
+    fig.update_layout(xaxis_title=cols_label, yaxis_title=rows_label, height=120 + 45 * len(values.index),
+                      margin={"t": 10, "b": 40})
+    return fig
+
+
+# مخطط صندوقي من ملخص محسوب مسبقاً (risk_summary): الصندوق p25–p75، الوسيط، والطرفان p1 و p99
+def quantile_box(summary: dict, label="نسبة الخطر %") -> go.Figure:
+    fig = go.Figure(go.Box(
+        y=[label], q1=[summary["p25"]], median=[summary["p50"]], q3=[summary["p75"]],
+        lowerfence=[summary["p1"]], upperfence=[summary["p99"]], mean=[summary["mean"]], sd=[summary["std"]],
+        orientation="h", boxmean="sd", marker_color="#c0392b", name=label,
+    ))
+    fig.update_layout(height=200, margin={"t": 10, "b": 30}, showlegend=False)
+    return fig
+
+
+# انتشار عينة من السجلات: الخطر مقابل سمة، ملوّنة بالتصنيف المتنبأ به؛ total = عدد السجلات الكلي للعنوان
+def sampled_scatter(sample, x: str, x_label: str, total: int) -> go.Figure:
+    fig = go.Figure()
+    for cls, color, name in ((0, "#2ecc71", "غير خطر (0)"), (1, "#e74c3c", "خطر (1)")):
+        part = sample[sample["prediction"] == cls]
+        fig.add_trace(go.Scattergl(x=part[x], y=part["risk_percent"], mode="markers", name=name,
+                                   marker={"color": color, "size": 5, "opacity": 0.6},
+                                   hovertemplate=f"{x_label}: %{{x}}<br>الخطر: %{{y:.1f}}%<extra></extra>"))
+    fig.update_layout(title=f"الخطر مقابل {x_label} (عينة {len(sample):,} من {total:,} سجل)",
+                      xaxis_title=x_label, yaxis_title="نسبة الخطر %")
+    return fig
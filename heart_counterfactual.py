@@ -0,0 +1,167 @@
+# بحث "مضاد للواقع" (counterfactual): أصغر تغيير في السمات القابلة للتعديل يُنزل الخطر المتنبأ به تحت حد معين
+# - كل سمة تتحرك في الاتجاهين ضمن حدود واقعية، فالنموذج هو ما يحدد أي اتجاه يُنزل الخطر (النماذج المدربة على
+#   بيانات المشروع قد تتعلم إشارة معاكسة للمتوقع سريرياً لبعض السمات)، والقيم تُقرَّب لخطوة الإدخال في النموذج
+# - المسافة = مجموع |التغيير| / مقياس السمة (مقياس = تغيير "معتبر" سريرياً)، فتغيير سمة واحدة كبير
+#   يُقارن بتغييرات صغيرة في عدة سمات
+# - كل تكرار: دفعة كبيرة من المرشحين تُقيَّم في نداء متجه واحد للنموذج، ثم يُستبعد كل ما ليس أقرب من أفضل حل
+#
+# مثال:
+#   from heart_counterfactual import counterfactuals
+#   res = counterfactuals(model, row, feats, target=0.30)
+import time
+
+import numpy as np
+import pandas as pd
+
+from heart_inference import REQUIRED_FEATURES, predict_batch
+
+# السمة: (أدنى، أعلى، خطوة التقريب، مقياس المسافة)
+MODIFIABLE = {
+    "trtbps": (90.0, 250.0, 1.0, 10.0),
+    "chol": (120.0, 700.0, 1.0, 20.0),
+    "thalachh": (60.0, 220.0, 1.0, 10.0),
+    "exng": (0.0, 1.0, 1.0, 1.0),
+    "oldpeak": (0.0, 10.0, 0.1, 0.5),
+}
+
+# حلقات البحث الأولى حول القيم الحالية (بوحدات المسافة) قبل العثور على أي حل
+RINGS = [(0.0, 1.0), (1.0, 2.0), (2.0, 4.0), (4.0, 8.0), (8.0, 16.0), (16.0, 40.0)]
+
+
+# حدود كل سمة: المدى الواقعي موسعاً ليشمل القيمة الحالية إن كانت خارجه
+# أقصى نبض لا يتجاوز 220 - العمر (الحد التقديري لأقصى نبض ممكن)
+def _bounds(row, names):
+    lo, hi = [], []
+    for f in names:
+        a, b, _, _ = MODIFIABLE[f]
+        if f == "thalachh" and "age" in row:
+            b = min(b, 220.0 - float(row["age"]))
+        x = float(row[f])
+        lo.append(min(a, x)), hi.append(max(b, x))
+    return np.array(lo), np.array(hi)
+
+
+def _snap(X, lo, hi, step):
+    return np.clip(np.round(X / step) * step, lo, hi)
+
+
+# مرشحون عشوائيون على "قشرة" مسافتها بين r_lo و r_hi: مجموعة سمات عشوائية، وتوزيع المسافة عليها بوزن ديريشليه،
+# واتجاه عشوائي (رفع أو خفض) لكل سمة
+def _ring(rng, x0, scale, r_lo, r_hi, n):
+    d = len(x0)
+    mask = rng.random((n, d)) < 0.5
+    mask[np.arange(n), rng.integers(0, d, n)] = True
+    w = rng.gamma(1.0, size=(n, d)) * mask
+    w /= w.sum(axis=1, keepdims=True)
+    r = rng.uniform(r_lo, r_hi, (n, 1))
+    sign = rng.choice([-1.0, 1.0], size=(n, d))
+    return x0 + sign * scale * r * w
+
+
+# تحريك صغير حول أفضل الحلول الحالية: تقليص التغيير ونقل جزء منه بين السمات (الحدود تُفرض لاحقاً)
+def _around(rng, x0, best, scale, n):
+    d = len(x0)
+    picks = best[rng.integers(0, len(best), n)]
+    jitter = rng.normal(0.0, 0.5, (n, d)) * scale * (rng.random((n, d)) < 0.4)
+    shrink = rng.uniform(0.5, 1.0, (n, 1))
+    return x0 + (picks - x0) * shrink + jitter
+
+
+# أصغر تغييرات تُنزل الخطر تحت target (احتمال 0..1)؛ تعيد قاموساً فيه:
+# found، والخطر الحالي، والحلول (أقرب حل لكل مجموعة سمات متغيرة، حتى k حلول مرتبة بالمسافة)،
+# وعدد المرشحين المقيَّمين والزمن
+def counterfactuals(model, row: dict, feats=None, target=0.30, k=3, batch=1024, refine_rounds=4, seed=0):
+    t0 = time.perf_counter()
+    feats = list(feats or REQUIRED_FEATURES)
+    names = [f for f in MODIFIABLE if f in feats]
+    base = np.array([float(row[c]) for c in feats], dtype=np.float64)
+    cols = [feats.index(f) for f in names]
+    x0 = base[cols]
+    step = np.array([MODIFIABLE[f][2] for f in names])
+    scale = np.array([MODIFIABLE[f][3] for f in names])
+    lo, hi = _bounds(row, names)
+    rng = np.random.default_rng(seed)
+    evaluated = 0
+
+    # كل نداء للنموذج = دفعة مرشحين كاملة؛ يعيد المرشحين (بعد التقريب والقص) ومسافاتهم وخطرهم
+    def score(C):
+        nonlocal evaluated
+        C = np.unique(_snap(C, lo, hi, step), axis=0)
+        X = np.repeat(base[None, :], len(C), axis=0)
+        X[:, cols] = C
+        _, proba = predict_batch(model, pd.DataFrame(X, columns=feats))
+        if proba is None:
+            raise ValueError("البحث يحتاج نموذجاً يوفر احتمالات")
+        evaluated += len(C)
+        return C, np.abs(C - x0).dot(1.0 / scale), np.asarray(proba, dtype=float)
+
+    _, _, current = score(x0[None, :])
+    current = float(current[0])
+    result = {"found": False, "current_risk": current, "target": target, "solutions": []}
+    if current < target or not names:
+        result.update(found=current < target, evaluated=evaluated, seconds=time.perf_counter() - t0)
+        return result
+
+    pool_C, pool_d, pool_p = [], [], []
+    best = np.inf
+    lowest = current
+    for r_lo, r_hi in RINGS:
+        C, dist, p = score(_ring(rng, x0, scale, r_lo, r_hi, batch))
+        lowest = min(lowest, float(p.min()))
+        ok = p < target
+        pool_C.append(C[ok]), pool_d.append(dist[ok]), pool_p.append(p[ok])
+        if ok.any():
+            best = dist[ok].min()
+            break
+    if not np.isfinite(best):
+        # الحلقات لم تصل لحل (نماذج الأشجار قد تحتاج قفزات كبيرة): أركان مدى السمات وعينة منتظمة منه كله
+        corners = np.array(np.meshgrid(*zip(lo, hi), indexing="ij")).reshape(len(x0), -1).T
+        C, dist, p = score(np.vstack([corners, lo + (hi - lo) * rng.random((batch, len(x0)))]))
+        ok = p < target
+        if not ok.any():
+            # لا يكفي أي تغيير ضمن الحدود: نعيد أقل خطر بلغه البحث للتوضيح
+            result.update(extreme_risk=min(lowest, float(p.min())), evaluated=evaluated,
+                          seconds=time.perf_counter() - t0)
+            return result
+        pool_C.append(C[ok]), pool_d.append(dist[ok]), pool_p.append(p[ok])
+        best = dist[ok].min()
+
+    # تحسين: مرشحون أقرب من أفضل حل فقط (داخل كرة نصف قطرها best) + تحريكات حول الحلول الحالية
+    for _ in range(refine_rounds):
+        good = np.vstack(pool_C)
+        good = good[np.argsort(np.concatenate(pool_d))[:32]]
+        C = np.vstack([_ring(rng, x0, scale, 0.0, best, batch // 2),
+                       _around(rng, x0, good, scale, batch // 2)])
+        C, dist, p = score(C)
+        keep = (p < target) & (dist < best)
+        if not keep.any():
+            continue
+        pool_C.append(C[keep]), pool_d.append(dist[keep]), pool_p.append(p[keep])
+        best = dist[keep].min()
+
+    # تقليص نهائي على الخط بين القيم الحالية وكل حل مرشح: أصغر نسبة من التغيير ما زالت تكفي
+    C, dist, p = np.vstack(pool_C), np.concatenate(pool_d), np.concatenate(pool_p)
+    top = C[np.argsort(dist)[:16]]
+    alpha = np.linspace(0.0, 1.0, 41)[1:]
+    S, sd, sp = score((x0 + alpha[:, None, None] * (top - x0)[None]).reshape(-1, len(x0)))
+    ok = sp < target
+    C, dist, p = np.vstack([C, S[ok]]), np.concatenate([dist, sd[ok]]), np.concatenate([p, sp[ok]])
+
+    # أقرب حل لكل مجموعة سمات متغيرة، ثم أقرب k منها
+    changed = ~np.isclose(C, x0)
+    order = np.argsort(dist, kind="stable")
+    seen = set()
+    for i in order:
+        support = tuple(np.flatnonzero(changed[i]))
+        if support in seen:
+            continue
+        seen.add(support)
+        result["solutions"].append({
+            "risk": float(p[i]),
+            "distance": float(dist[i]),
+            "changes": {names[j]: (float(x0[j]), float(C[i, j])) for j in support},
+        })
+        if len(result["solutions"]) >= k:
+            break
+    result.update(found=True, evaluated=evaluated, seconds=time.perf_counter() - t0)
+    return result
@@ -0,0 +1,292 @@
+# إحصاءات EDA بمرور واحد على البيانات (أجزاء/chunks) دون تحميلها كاملة في الذاكرة
+# - مراكم قابل للدمج لكل جزء: العدد، القيم الفارغة، min/max، المتوسط والتباين، مصفوفة التغاير
+#   (تُدمج بصيغة Chan المتوازية فتكون النتيجة مطابقة للحساب على كامل البيانات)
+# - الكمّيات (25%/50%/75%) تقريبية من عينة منتظمة قابلة للدمج (أصغر k مفتاح عشوائي)، ودقيقة إن كانت البيانات أصغر من العينة
+# - أجزاء مخزن Parquet أو ملفات CSV تُعالَج بالتوازي ثم تُدمج النتائج
+#
+# أمثلة:
+#   python heart_eda.py --dataset heart --heatmap reports/correlation_heatmap.png
+#   python heart_eda.py --csv "heart (1).csv" heart_comma.csv
+import argparse
+import sys
+import time
+import warnings
+from io import StringIO
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+
+DEFAULT_SAMPLE_ROWS = 20000
+
+
+class StreamingProfile:
+    def __init__(self, sample_rows=DEFAULT_SAMPLE_ROWS, seed=0):
+        self.sample_rows = int(sample_rows)
+        self.rng = np.random.default_rng(seed)
+        self.rows = 0
+        self.columns = None      # كل الأعمدة بالترتيب
+        self.dtypes = {}
+        self.nulls = {}
+        self.memory_bytes = 0
+        self.numeric = None      # الأعمدة الرقمية (أساس المصفوفات أدناه)
+        # مصفوفات k×k على أزواج الأعمدة (الصفوف التي يوجد فيها العمودان معاً، مثل pandas.corr):
+        #   n[i,j] العدد، mean[i,j] متوسط العمود i، m2[i,j] مجموع مربعات انحرافات i، com[i,j] العزم المشترك
+        self.n = self.mean = self.m2 = self.com = None
+        self.vmin = self.vmax = None
+        self.sample = None       # عينة القيم الرقمية للكمّيات
+        self.keys = None         # مفاتيحها العشوائية
+
+    def _init_schema(self, columns, dtypes, numeric):
+        self.columns = list(columns)
+        self.dtypes = dict(dtypes)
+        self.nulls = {c: 0 for c in self.columns}
+        self.numeric = list(numeric)
+        k = len(self.numeric)
+        self.n = np.zeros((k, k))
+        self.mean = np.zeros((k, k))
+        self.m2 = np.zeros((k, k))
+        self.com = np.zeros((k, k))
+        self.vmin = np.full(k, np.inf)
+        self.vmax = np.full(k, -np.inf)
+        self.sample = np.empty((0, k))
+        self.keys = np.empty(0)
+
+    # إضافة جزء: الإحصاءات تُحسب للجزء متجهياً ثم تُدمج مع المراكم
+    def update(self, df: pd.DataFrame):
+        if len(df) == 0:
+            return self
+        df = df.rename(columns=str)
+        if self.columns is None:
+            numeric = [c for c in df.columns
+                       if pd.api.types.is_numeric_dtype(df[c]) and not pd.api.types.is_bool_dtype(df[c])]
+            self._init_schema(df.columns, {c: str(t) for c, t in df.dtypes.items()}, numeric)
+        elif list(df.columns) != self.columns:
+            raise ValueError("أعمدة الجزء لا تطابق أعمدة الأجزاء السابقة")
+        part = StreamingProfile(self.sample_rows)
+        part._init_schema(self.columns, self.dtypes, self.numeric)
+        part.rows = len(df)
+        part.memory_bytes = int(df.memory_usage(index=False).sum())
+        part.nulls = {c: int(v) for c, v in df.isna().sum().items()}
+
+        X = df[self.numeric].to_numpy(dtype=np.float64)
+        M = ~np.isnan(X)
+        Mf = M.astype(np.float64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            counts = Mf.sum(axis=0)
+            shift = np.where(counts > 0, np.nansum(X, axis=0) / np.maximum(counts, 1), 0.0)
+            # إزاحة بمتوسط الجزء ثم حساب العزوم الزوجية بضرب مصفوفات (ثبات عددي + سرعة)
+            D = np.where(M, X - shift, 0.0)
+            n = Mf.T @ Mf
+            s = D.T @ Mf                       # s[i,j] = Σ (x_i - shift_i) حيث i و j موجودان
+            safe = np.maximum(n, 1)
+            part.n = n
+            part.mean = np.where(n > 0, shift[:, None] + s / safe, 0.0)
+            part.m2 = np.where(n > 0, (D * D).T @ Mf - s * s / safe, 0.0)
+            part.com = np.where(n > 0, D.T @ D - s * s.T / safe, 0.0)
+            part.vmin = np.where(M, X, np.inf).min(axis=0)
+            part.vmax = np.where(M, X, -np.inf).max(axis=0)
+        part.keys = self.rng.random(len(X))
+        part.sample = X
+        part._trim_sample()
+        return self.merge(part)
+
+    def _trim_sample(self):
+        if len(self.keys) > self.sample_rows:
+            keep = np.argpartition(self.keys, self.sample_rows - 1)[:self.sample_rows]
+            self.keys = self.keys[keep]
+            self.sample = self.sample[keep]
+
+    # دمج مراكم آخر (من جزء أو عملية عاملة أخرى) في هذا المراكم
+    def merge(self, other: "StreamingProfile"):
+        if other.columns is None:
+            return self
+        if self.columns is None:
+            self._init_schema(other.columns, other.dtypes, other.numeric)
+        elif other.columns != self.columns:
+            raise ValueError("لا يمكن دمج ملفين بأعمدة مختلفة")
+        self.rows += other.rows
+        self.memory_bytes += other.memory_bytes
+        for c, v in other.nulls.items():
+            self.nulls[c] += v
+        nA, nB = self.n, other.n
+        n = nA + nB
+        with np.errstate(invalid="ignore", divide="ignore"):
+            w = nA * nB / np.maximum(n, 1)
+            delta = other.mean - self.mean
+            self.mean = self.mean + delta * nB / np.maximum(n, 1)
+            self.m2 = self.m2 + other.m2 + delta * delta * w
+            self.com = self.com + other.com + delta * delta.T * w
+        self.n = n
+        self.vmin = np.minimum(self.vmin, other.vmin)
+        self.vmax = np.maximum(self.vmax, other.vmax)
+        self.keys = np.concatenate([self.keys, other.keys])
+        self.sample = np.vstack([self.sample, other.sample])
+        self._trim_sample()
+        return self
+
+    # بديل data.isnull().sum()
+    def null_counts(self) -> pd.Series:
+        return pd.Series(self.nulls, dtype="int64")
+
+    # بديل data.describe() للأعمدة الرقمية
+    def describe(self, percentiles=(0.25, 0.5, 0.75)) -> pd.DataFrame:
+        diag = np.arange(len(self.numeric))
+        count = self.n[diag, diag]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            std = np.sqrt(self.m2[diag, diag] / (count - 1))
+        out = {"count": count, "mean": np.where(count > 0, self.mean[diag, diag], np.nan), "std": std,
+               "min": np.where(count > 0, self.vmin, np.nan)}
+        qs = self.quantiles(percentiles)
+        for p in percentiles:
+            out[f"{p * 100:g}%"] = qs.loc[p].to_numpy()
+        out["max"] = np.where(count > 0, self.vmax, np.nan)
+        return pd.DataFrame(out, index=self.numeric).T
+
+    # الكمّيات من العينة (مقصوصة ضمن min/max الدقيقتين)
+    def quantiles(self, q=(0.25, 0.5, 0.75)) -> pd.DataFrame:
+        q = list(q)
+        if len(self.sample) == 0:
+            return pd.DataFrame(np.nan, index=q, columns=self.numeric)
+        with warnings.catch_warnings():
+            # عمود بلا قيم في العينة يعطي NaN مع تحذير
+            warnings.simplefilter("ignore", RuntimeWarning)
+            vals = np.nanquantile(self.sample, q, axis=0)
+        vals = np.clip(vals, self.vmin, self.vmax)
+        return pd.DataFrame(vals, index=q, columns=self.numeric)
+
+    # بديل data.cov() / data.corr() (أزواج كاملة كما في pandas)
+    def cov(self) -> pd.DataFrame:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            c = np.where(self.n > 1, self.com / (self.n - 1), np.nan)
+        return pd.DataFrame(c, index=self.numeric, columns=self.numeric)
+
+    def corr(self) -> pd.DataFrame:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            c = self.com / np.sqrt(self.m2 * self.m2.T)
+        c = np.where(self.n > 1, c, np.nan)
+        np.fill_diagonal(c, np.where(np.diag(self.m2) > 0, 1.0, np.nan))
+        return pd.DataFrame(np.clip(c, -1.0, 1.0), index=self.numeric, columns=self.numeric)
+
+    # بديل data.info(): نص بنفس المعلومات الأساسية
+    def info(self) -> str:
+        buf = StringIO()
+        buf.write(f"RangeIndex: {self.rows} entries\n")
+        buf.write(f"Data columns (total {len(self.columns or [])} columns):\n")
+        buf.write(f" #   {'Column':<12} {'Non-Null Count':>16}  Dtype\n")
+        for i, c in enumerate(self.columns or []):
+            buf.write(f" {i:<3} {c:<12} {self.rows - self.nulls[c]:>9} non-null  {self.dtypes[c]}\n")
+        buf.write(f"memory usage (uncompressed): {self.memory_bytes / 1024 / 1024:.1f} MB\n")
+        return buf.getvalue()
+
+
+def _profile_chunks(chunks, sample_rows, seed):
+    prof = StreamingProfile(sample_rows, seed)
+    for chunk in chunks:
+        prof.update(chunk)
+    return prof
+
+
+def _merge_all(profiles, sample_rows, seed):
+    total = StreamingProfile(sample_rows, seed)
+    for p in profiles:
+        total.merge(p)
+    return total
+
+
+# ملف DataFrame موجود في الذاكرة (على أجزاء حتى لا تُنشأ نسخ float64 كاملة)
+def profile_frame(df: pd.DataFrame, chunk_rows=500_000, sample_rows=DEFAULT_SAMPLE_ROWS, seed=0):
+    return _profile_chunks((df.iloc[i:i + chunk_rows] for i in range(0, max(len(df), 1), chunk_rows)),
+                           sample_rows, seed)
+
+
+def _profile_parquet(path, columns, batch_rows, sample_rows, seed):
+    import pyarrow.parquet as pq
+    pf = pq.ParquetFile(path)
+    return _profile_chunks((b.to_pandas() for b in pf.iter_batches(batch_size=batch_rows, columns=columns)),
+                           sample_rows, seed)
+
+
+def _profile_csv_file(path, batch_rows, sample_rows, seed):
+    with open(path, "r", encoding="utf-8-sig") as f:
+        first = f.readline()
+    sep = ";" if first.count(";") > first.count(",") else ","
+
+    def chunks():
+        for chunk in pd.read_csv(path, sep=sep, chunksize=batch_rows):
+            chunk.columns = chunk.columns.str.strip()
+            yield chunk
+    return _profile_chunks(chunks(), sample_rows, seed)
+
+
+# مجموعة في مخزن Parquet: كل جزء في عملية عاملة، ثم دمج
+def profile_dataset(dataset="heart", root=None, columns=None, n_jobs=-1, batch_rows=250_000,
+                    sample_rows=DEFAULT_SAMPLE_ROWS, seed=0):
+    from heart_store import dataset_dir, read_manifest
+    manifest = read_manifest(dataset, root)
+    if manifest is None:
+        raise FileNotFoundError(f"المجموعة '{dataset}' غير موجودة في المخزن")
+    ddir = dataset_dir(dataset, root)
+    parts = manifest["partitions"]
+    profiles = Parallel(n_jobs=n_jobs if len(parts) > 1 else 1)(
+        delayed(_profile_parquet)(str(ddir / p["file"]), columns, batch_rows, sample_rows, seed + i)
+        for i, p in enumerate(parts)
+    )
+    return _merge_all(profiles, sample_rows, seed)
+
+
+# ملفات CSV: كل ملف يُقرأ على أجزاء في عملية عاملة، ثم دمج
+def profile_csv(paths, n_jobs=-1, batch_rows=250_000, sample_rows=DEFAULT_SAMPLE_ROWS, seed=0):
+    paths = [str(p) for p in paths]
+    profiles = Parallel(n_jobs=n_jobs if len(paths) > 1 else 1)(
+        delayed(_profile_csv_file)(p, batch_rows, sample_rows, seed + i) for i, p in enumerate(paths)
+    )
+    return _merge_all(profiles, sample_rows, seed)
+
+
+# خريطة الحرارة من مصفوفة الارتباط المتراكمة (تُحفظ كصورة)
+def save_heatmap(profile: StreamingProfile, path):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    plt.figure(figsize=(12, 10))
+    sns.heatmap(profile.corr(), annot=True, cmap='Reds')
+    plt.title("خريطة الحرارة للمتغيرات")
+    plt.savefig(path, bbox_inches="tight")
+    plt.close()
+    return str(path)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="إحصاءات EDA بمرور واحد على مجموعة بيانات كبيرة")
+    src = ap.add_mutually_exclusive_group()
+    src.add_argument("--dataset", default="heart", help="اسم مجموعة في مخزن البيانات")
+    src.add_argument("--csv", nargs="+", default=None, help="ملفات CSV بدلاً من المخزن")
+    ap.add_argument("--root", default=None, help="مجلد المخزن")
+    ap.add_argument("--n-jobs", type=int, default=-1)
+    ap.add_argument("--sample-rows", type=int, default=DEFAULT_SAMPLE_ROWS, help="حجم عينة الكمّيات")
+    ap.add_argument("--heatmap", default="reports/correlation_heatmap.png")
+    args = ap.parse_args(argv)
+
+    t0 = time.perf_counter()
+    if args.csv:
+        prof = profile_csv(args.csv, n_jobs=args.n_jobs, sample_rows=args.sample_rows)
+    else:
+        prof = profile_dataset(args.dataset, args.root, n_jobs=args.n_jobs, sample_rows=args.sample_rows)
+    elapsed = time.perf_counter() - t0
+    print(prof.info())
+    print(prof.null_counts())
+    print(prof.describe())
+    if args.heatmap:
+        print(f"خريطة الحرارة: {save_heatmap(prof, args.heatmap)}")
+    print(f"✅ {prof.rows} سجل خلال {elapsed:.2f} ث")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
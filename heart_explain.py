@@ -0,0 +1,383 @@
+# تفسير التنبؤات: مساهمة كل سمة في نتيجة كل سجل (بدون مكتبات إضافية)
+# - LogisticRegression: المعامل × القيمة بعد المعالجة (المقيّسة)، على مقياس log-odds؛ الأساس = الثابت
+# - RandomForest: TreeSHAP الدقيق المعتمد على المسار (path-dependent) من مصفوفات عقد الأشجار،
+#   على مقياس الاحتمال؛ الأساس = متوسط تنبؤ الغابة على بيانات التدريب (حسب تغطية العقد)
+# في الحالتين: الأساس + مجموع المساهمات = مخرج النموذج للسجل (log-odds أو الاحتمال)
+# مساهمات أعمدة OneHotEncoder تُجمع على السمة الأصلية
+#
+# مثال:
+#   python heart_explain.py --model heart_model.pkl --csv examples/heart_sample.csv
+import argparse
+import os
+import time
+from math import factorial
+
+import numpy as np
+import pandas as pd
+
+from heart_inference import REQUIRED_FEATURES
+
+SCALE_LOGIT = "log-odds"
+SCALE_PROBA = "probability"
+# عدد أنماط (ورقة، واحد/صفر) في كل استدعاء لجدول المساهمات: يحد ذاكرة مصفوفاته الوسيطة مع الأشجار العميقة
+PATTERN_BLOCK = 65536
+# حتى هذا العدد من الأنماط يُحسب الجدول بنداء واحد (الأوراق محشوة حتى أعمق مسار) بدل نداء لكل عمق
+SMALL_PATTERNS = 4096
+# ميزانية ذاكرة المصفوفات الوسيطة لكل خيط أثناء تفسير غابة؛ منها ومن حجم الأشجار يُشتق عدد السجلات في كل دفعة
+MEMORY_BUDGET_MB = float(os.environ.get("HEART_EXPLAIN_MEMORY_MB", "256"))
+# ثوانٍ تقريبية على نواة واحدة لكل (سجل × ورقة × مربع عمق الشجرة)، لتقدير الكلفة قبل البدء
+# (معايرة على غابات بيانات المشروع وغابة عميقة بأعمدة OneHot؛ الفرق بينهما ~10%)
+SECONDS_PER_UNIT = 3.5e-9
+
+
+# لكل عمود ناتج عن ColumnTransformer: رقم السمة الأصلية التي جاء منها (None إن كان التحويل غير مدعوم)
+def _output_groups(pre, feats):
+    index = {c: i for i, c in enumerate(feats)}
+    groups = []
+    for name, trans, cols in pre.transformers_:
+        if trans == "drop" or (name == "remainder" and trans == "drop"):
+            continue
+        cols = [cols] if isinstance(cols, str) else list(cols)
+        if any(c not in index for c in cols):
+            return None
+        if trans == "passthrough" or type(trans).__name__ == "StandardScaler":
+            groups += [index[c] for c in cols]
+        elif type(trans).__name__ == "OneHotEncoder":
+            for c, cats in zip(cols, trans.categories_):
+                n = len(cats) - (0 if trans.drop is None else 1)
+                groups += [index[c]] * n
+        else:
+            return None
+    return np.asarray(groups, dtype=np.intp)
+
+
+def _split_pipeline(model, feats):
+    steps = getattr(model, "named_steps", None)
+    if steps and "pre" in steps and len(steps) == 2:
+        pre, clf = steps["pre"], model.steps[-1][1]
+        groups = _output_groups(pre, feats)
+        if groups is None:
+            raise ValueError("تحويلات المعالجة في هذا النموذج غير مدعومة في التفسير")
+        return pre, clf, groups
+    return None, model, np.arange(len(feats))
+
+
+def _dense(Xt):
+    return np.asarray(Xt.toarray() if hasattr(Xt, "toarray") else Xt, dtype=np.float64)
+
+
+# جمع مساهمات الأعمدة المحوَّلة على السمات الأصلية
+def _fold(contrib_t, groups, n_feats):
+    out = np.zeros((contrib_t.shape[0], n_feats))
+    for j, g in enumerate(groups):
+        out[:, g] += contrib_t[:, j]
+    return out
+
+
+# ---------------------------------------------------------------- الخطي
+
+def _linear(clf, Xt):
+    coef = np.asarray(clf.coef_, dtype=np.float64)
+    if coef.shape[0] != 1:
+        raise ValueError("التفسير الخطي يدعم التصنيف الثنائي فقط")
+    return Xt * coef[0], float(np.asarray(clf.intercept_).reshape(-1)[0])
+
+
+# ---------------------------------------------------------------- TreeSHAP
+
+# أوزان شابلي لمجموعة حجمها s من مسار فيه d سمة فريدة: s!(d-s-1)!/d!
+_WEIGHTS = {}
+
+
+def _shapley_weights(d):
+    w = _WEIGHTS.get(d)
+    if w is None:
+        w = _WEIGHTS[d] = np.array([factorial(s) * factorial(d - s - 1) / factorial(d) for s in range(d)])
+    return w
+
+
+# بنية شجرة مجهزة مرة واحدة (لا تعتمد على السجلات): لكل ورقة سماتها الفريدة على المسار ("خانات")،
+# وكسر الصفر لكل خانة (حاصل ضرب نسب التغطية لعقد تلك السمة)، وشروط العقد التي تحدد كسر الواحد
+class _TreePlan:
+    def __init__(self, tree):
+        left, right = tree.children_left, tree.children_right
+        cover = tree.weighted_n_node_samples
+        value = tree.value[:, 0, :]
+        value = value[:, 1] / value.sum(axis=1) if value.shape[1] > 1 else value[:, 0]
+        is_leaf = left == -1
+        self.base = float(np.dot(value[is_leaf], cover[is_leaf]) / cover[0])
+        internal = np.flatnonzero(~is_leaf)
+        self.feature = tree.feature[internal]
+        self.threshold = tree.threshold[internal]
+        slot_of_node = np.full(tree.node_count, -1)
+        slot_of_node[internal] = np.arange(len(internal))
+        ni = len(internal)
+
+        entries, starts, slot_feat, slot_j, slot_leaf, zs, leaf_d, values = [], [], [], [], [], [], [], []
+        stack = [(0, [])]
+        while stack:
+            node, path = stack.pop()
+            if not is_leaf[node]:
+                f = int(tree.feature[node])
+                k = slot_of_node[node]
+                stack.append((left[node], path + [(k, f, cover[left[node]] / cover[node])]))
+                stack.append((right[node], path + [(k + ni, f, cover[right[node]] / cover[node])]))
+                continue
+            feats = list(dict.fromkeys(f for _, f, _ in path))
+            if not feats:
+                continue
+            leaf = len(values)
+            values.append(float(value[node]))
+            leaf_d.append(len(feats))
+            for j, f in enumerate(feats):
+                starts.append(len(entries))
+                z = 1.0
+                for col, g, ratio in path:
+                    if g == f:
+                        entries.append(col)
+                        z *= ratio
+                slot_feat.append(f)
+                slot_j.append(j)
+                slot_leaf.append(leaf)
+                zs.append(z)
+        entries = np.asarray(entries, dtype=np.intp)
+        starts = np.asarray(starts, dtype=np.intp)
+        counts = np.diff(np.r_[starts, len(entries)])
+        # ترتيب الخانات حسب السمة حتى تُجمع مساهماتها على أعمدة المدخلات بـ reduceat على صفوف متجاورة
+        order = np.argsort(slot_feat, kind="stable")
+        starts, counts = starts[order], counts[order]
+        slot_feat, slot_j, slot_leaf, zs = (np.asarray(a)[order] for a in (slot_feat, slot_j, slot_leaf, zs))
+        # شرط العقدة الأولى لكل خانة، ثم طبقات الشروط الإضافية (سمة تكررت على المسار) تُدمج بـ AND
+        self.first = entries[starts]
+        self.more = [(np.flatnonzero(counts > r), entries[starts[counts > r] + r]) for r in range(1, counts.max(initial=1))]
+        self.slot_feat = np.asarray(slot_feat, dtype=np.intp)
+        self.slot_j = np.asarray(slot_j, dtype=np.int32)
+        self.slot_leaf = np.asarray(slot_leaf, dtype=np.intp)
+        self.values = np.asarray(values)
+        self.dmax = max(leaf_d, default=0)
+        n_slots, n_leaves = len(slot_feat), len(values)
+        # grid[j, ورقة] = رقم الخانة j للورقة (أو خانة "صفرية" إضافية للحشو) لبناء رقم النمط بـ dmax خطوة
+        self.grid = np.full((self.dmax, n_leaves), n_slots)
+        self.grid[self.slot_j, self.slot_leaf] = np.arange(n_slots)
+        # كسور الصفر لكل ورقة (الخانات بعد عدد سماتها غير مستخدمة)، وعدد سمات مسارها
+        self.z = np.ones((n_leaves, self.dmax))
+        self.z[self.slot_leaf, self.slot_j] = zs
+        self.depth = np.asarray(leaf_d, dtype=np.intp)
+        # بايتات المصفوفات الوسيطة لكل سجل في _tree_shap (أسوأ حالة: كل نمط فريد): شروط العقد، كسور الواحد،
+        # المفاتيح ومواضعها، الفهارس والقيم لكل خانة، وجدول المساهمات
+        self.row_bytes = 3 * ni + 13 * n_slots + (20 + 8 * self.dmax) * n_leaves
+        self.feat_starts = np.flatnonzero(np.r_[True, self.slot_feat[1:] != self.slot_feat[:-1]]) if n_slots else None
+        self.feat_ids = self.slot_feat[self.feat_starts] if n_slots else None
+
+
+# جدول المساهمات لكل (ورقة، نمط "واحد/صفر") موجود فعلاً بين السجلات، لكل الأوراق دفعة واحدة
+# z, ones: (صفوف × d)؛ مساهمة السمة i = v (o_i - z_i) Σ_s w(s) · [t^s] Π_{k≠i} (z_k + o_k t)
+def _pattern_table(v, z, ones):
+    u, d = ones.shape
+    w = _shapley_weights(d)
+    # كثير الحدود الكامل Π_k (z_k + o_k t) ثم "فك" عامل السمة i منه (القسمة التركيبية كما في TreeSHAP)
+    full = np.zeros((u, d + 1))
+    full[:, 0] = 1.0
+    for k in range(d):
+        full[:, 1:] = full[:, 1:] * z[:, k, None] + full[:, :-1] * ones[:, k, None]
+        full[:, 0] *= z[:, k]
+    total = np.zeros((u, d))
+    # o_i = 1: القسمة على (z_i + t) من الدرجة العليا نزولاً
+    q = full[:, d, None] * np.ones((1, d))
+    total += w[d - 1] * q
+    for m in range(d - 1, 0, -1):
+        q = full[:, m, None] - z * q
+        total += w[m - 1] * q
+    # o_i = 0: القسمة على z_i فقط
+    zero = (full[:, :d] @ w)[:, None] / z
+    return v[:, None] * (ones - z) * np.where(ones > 0, total, zero)
+
+
+# يضيف مساهمات شجرة واحدة إلى phi (سمات × سجلات) ويعيد قيمتها الأساسية
+def _tree_shap(plan, XT, phi):
+    if plan.dmax == 0:
+        return plan.base
+    # المصفوفات بالشكل (عقد/خانات × سجلات) حتى تكون العمليات على ذاكرة متصلة
+    # sklearn يقارن القيم بعد تحويلها إلى float32، و XT بهذا النوع حتى لا تختلف القيم القريبة من العتبة
+    goes_left = XT[plan.feature] <= plan.threshold[:, None]
+    both = np.concatenate([goes_left, ~goes_left], axis=0)
+    # كسر الواحد لكل خانة = تحقق كل شروط عقد سمتها على المسار؛ الصف الأخير صفري لخانات الحشو
+    ones = np.zeros((len(plan.first) + 1, XT.shape[1]), dtype=bool)
+    ones[:-1] = both[plan.first]
+    for slots, cond in plan.more:
+        ones[slots] &= both[cond]
+    # نمط كل ورقة كرقم ثنائي، ثم مفتاح عام (ورقة، نمط) int64 لحساب الجدول للأنماط الموجودة فقط
+    n_leaves = len(plan.values)
+    key = np.repeat((np.arange(n_leaves, dtype=np.int64) << plan.dmax)[:, None], XT.shape[1], axis=1)
+    for j in range(plan.dmax):
+        key |= ones[plan.grid[j]].astype(np.int64) << j
+    # موضع كل مفتاح في الجدول: فهرسة مباشرة عبر bincount ما دام فضاء المفاتيح صغيراً مقارنة بعددها،
+    # وإلا تجميع بالفرز (np.unique) حتى لا تتبع التكلفة والذاكرة حجم الشجرة (أوراق × 2^dmax) بدل عدد السجلات
+    space = n_leaves << plan.dmax
+    if space <= max(4 * key.size, 1 << 16):
+        seen = np.bincount(key.ravel(), minlength=space)
+        present = np.flatnonzero(seen)
+        pos = np.cumsum(seen > 0, dtype=np.intp)[key] - 1
+    else:
+        present, pos = np.unique(key.ravel(), return_inverse=True)
+        pos = pos.reshape(key.shape)
+    leaf = present >> plan.dmax
+    depth = plan.depth[leaf]
+    if len(present) <= SMALL_PATTERNS:
+        # أنماط قليلة (سجلات قليلة): نداء واحد بعد حشو كل ورقة حتى dmax بسمات "وهمية" (z=1، o=1)
+        # لا تغيّر قيم شابلي
+        bits = ((present[:, None] >> np.arange(plan.dmax)) & 1) | (np.arange(plan.dmax) >= depth[:, None])
+        table = _pattern_table(plan.values[leaf], plan.z[leaf], bits.astype(np.float64))
+    else:
+        # الجدول لكل عمق مسار على حدة (كلفة النمط ~ d² لا dmax²) وعلى كتل من الأنماط
+        table = np.zeros((len(present), plan.dmax))
+        for d in np.unique(depth):
+            sel = np.flatnonzero(depth == d)
+            for start in range(0, len(sel), PATTERN_BLOCK):
+                b = sel[start:start + PATTERN_BLOCK]
+                bits = ((present[b, None] >> np.arange(d)) & 1).astype(np.float64)
+                table[b, :d] = _pattern_table(plan.values[leaf[b]], plan.z[leaf[b], :d], bits)
+    # فهارس int32 ما دام الجدول يتسع لها (مصفوفة idx بحجم خانات × سجلات)
+    row = pos.astype(np.int32 if len(present) * plan.dmax < 2 ** 31 else np.int64) * plan.dmax
+    idx = row[plan.slot_leaf]
+    idx += plan.slot_j[:, None]
+    phi[plan.feat_ids] += np.add.reduceat(table.ravel()[idx], plan.feat_starts, axis=0)
+    return plan.base
+
+
+# خطط الأشجار تُبنى مرة لكل نموذج (مرتبطة بهوية كائن الشجرة)
+_PLANS = {}
+
+
+def _plans(trees):
+    key = tuple(id(t) for t in trees)
+    plans = _PLANS.get(key)
+    if plans is None:
+        _PLANS.clear()
+        plans = _PLANS[key] = [_TreePlan(t) for t in trees]
+    return plans
+
+
+def _trees(clf):
+    return [e.tree_ for e in getattr(clf, "estimators_", [clf])]
+
+
+# عدد السجلات في كل دفعة لغابة: ميزانية الذاكرة ÷ (أكبر حجم لكل سجل بين أشجارها × عدد الخيوط العاملة معاً)
+def _forest_batch_rows(clf, n_jobs=1, budget_mb=None):
+    plans = _plans(_trees(clf))
+    per_row = max(p.row_bytes for p in plans) * min(len(plans), _n_workers(n_jobs))
+    return max(1, int((budget_mb or MEMORY_BUDGET_MB) * 2 ** 20 // max(per_row, 1)))
+
+
+def _forest(clf, Xt, n_jobs=1):
+    if len(getattr(clf, "classes_", [])) != 2:
+        raise ValueError("تفسير الأشجار يدعم التصنيف الثنائي فقط")
+    plans = _plans(_trees(clf))
+    XT = np.ascontiguousarray(Xt.T, dtype=np.float32)
+    chunks = np.array_split(np.arange(len(plans)), max(1, min(len(plans), _n_workers(n_jobs))))
+
+    def run(ids):
+        phi = np.zeros((Xt.shape[1], Xt.shape[0]))
+        for i in ids:
+            _tree_shap(plans[i], XT, phi)
+        return phi
+
+    if len(chunks) > 1:
+        # عمليات numpy تحرر GIL فتكفي الخيوط ولا حاجة لنسخ النموذج إلى عمليات أخرى
+        from joblib import Parallel, delayed
+        parts = Parallel(n_jobs=len(chunks), prefer="threads")(delayed(run)(ids) for ids in chunks)
+    else:
+        parts = [run(chunks[0])]
+    base = sum(p.base for p in plans) / len(plans)
+    return sum(parts).T / len(plans), base
+
+
+def _n_workers(n_jobs):
+    return (os.cpu_count() or 1) if n_jobs in (None, -1) else max(1, n_jobs)
+
+
+# ---------------------------------------------------------------- الواجهة العامة
+
+def _is_forest(clf):
+    return hasattr(clf, "tree_") or (hasattr(clf, "estimators_") and hasattr(clf.estimators_[0], "tree_"))
+
+
+# تقدير كلفة تفسير n_rows سجل قبل البدء من بنية الأشجار فقط: (وحدات = سجلات × مجموع أوراق الأشجار،
+# ثوانٍ تقريبية موزعة على الخيوط)؛ كلفة الورقة تتناسب مع مربع عمق مسارها. النموذج الخطي كلفته مهملة
+def explain_cost(model, n_rows, feats=None, n_jobs=1):
+    _, clf, _ = _split_pipeline(model, list(feats or REQUIRED_FEATURES))
+    if not _is_forest(clf):
+        return 0, 0.0
+    trees = _trees(clf)
+    units = int(n_rows) * sum(int(t.n_leaves) for t in trees)
+    work = int(n_rows) * sum(int(t.n_leaves) * int(t.max_depth) ** 2 for t in trees)
+    return units, work * SECONDS_PER_UNIT / min(len(trees), _n_workers(n_jobs))
+
+
+# مساهمات السمات لكل سجل: (DataFrame بنفس أعمدة الميزات، القيمة الأساسية، المقياس)
+# الحساب على دفعات batch_rows حتى تبقى الذاكرة محدودة مع الملفات الكبيرة؛ للغابات يُشتق افتراضياً من
+# MEMORY_BUDGET_MB وحجم الأشجار (الأشجار العميقة = دفعات أصغر)، وللخطي 5000
+def explain(model, X: pd.DataFrame, feats=None, batch_rows=None, n_jobs=1):
+    feats = list(feats or REQUIRED_FEATURES)
+    pre, clf, groups = _split_pipeline(model, feats)
+    if hasattr(clf, "coef_"):
+        kind, scale = _linear, SCALE_LOGIT
+    elif _is_forest(clf):
+        kind, scale = (lambda c, Xt: _forest(c, Xt, n_jobs)), SCALE_PROBA
+    else:
+        raise ValueError(f"التفسير غير مدعوم لهذا النوع من النماذج: {type(clf).__name__}")
+    if batch_rows is None:
+        batch_rows = _forest_batch_rows(clf, n_jobs) if scale == SCALE_PROBA else 5000
+    parts, base = [], 0.0
+    for start in range(0, len(X), batch_rows):
+        chunk = X[feats].iloc[start:start + batch_rows]
+        Xt = _dense(pre.transform(chunk)) if pre is not None else chunk.to_numpy(dtype=np.float64)
+        contrib_t, base = kind(clf, Xt)
+        parts.append(_fold(contrib_t, groups, len(feats)))
+    values = np.vstack(parts) if parts else np.zeros((0, len(feats)))
+    return pd.DataFrame(values, columns=feats, index=X.index), base, scale
+
+
+# أعمدة مساهمات جاهزة لإلحاقها بنتائج التنبؤ الدفعي (contrib_<سمة>) + أهم ثلاث سمات رافعة للخطر
+def contribution_columns(model, X: pd.DataFrame, feats=None, top=3, batch_rows=None, n_jobs=1):
+    contrib, base, scale = explain(model, X, feats, batch_rows, n_jobs)
+    cols = contrib.round(4).add_prefix("contrib_")
+    order = np.argsort(-contrib.to_numpy(), axis=1)[:, :top]
+    names = np.asarray(contrib.columns)
+    positive = np.take_along_axis(contrib.to_numpy(), order, axis=1) > 0
+    cols["top_factors"] = [";".join(names[o][p]) for o, p in zip(order, positive)]
+    return cols, base, scale
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="مساهمات السمات لتنبؤات ملف CSV")
+    ap.add_argument("--model", default="heart_model.pkl")
+    ap.add_argument("--csv", default=None, help="ملف السجلات (افتراضياً بيانات اصطناعية)")
+    ap.add_argument("--rows", type=int, default=100000, help="عدد السجلات الاصطناعية عند غياب --csv")
+    ap.add_argument("--out", default=None, help="حفظ النتائج مع أعمدة المساهمات")
+    ap.add_argument("--n-jobs", type=int, default=-1, help="خيوط حساب الأشجار (-1 = كل الأنوية)")
+    args = ap.parse_args(argv)
+
+    from heart_inference import load_payload, predict_batch
+    payload = load_payload(args.model)
+    model, feats = payload["estimator"], payload["features"] or REQUIRED_FEATURES
+    if args.csv:
+        df = pd.read_csv(args.csv, sep=None, engine="python")
+    else:
+        from make_heart_data import generate_chunk
+        df = generate_chunk(args.rows, np.random.default_rng(0))
+    t0 = time.perf_counter()
+    contrib, base, scale = explain(model, df, feats, n_jobs=args.n_jobs)
+    elapsed = time.perf_counter() - t0
+    _, proba = predict_batch(model, df[feats])
+    total = base + contrib.sum(axis=1).to_numpy()
+    target = proba if scale == SCALE_PROBA else np.log(proba / (1 - proba))
+    print(f"✅ {len(df):,} سجل خلال {elapsed:.2f} ث ({scale})، أقصى فرق عن مخرج النموذج {np.abs(total - target).max():.2e}")
+    print(contrib.abs().mean().sort_values(ascending=False).round(4).to_string())
+    if args.out:
+        cols, _, _ = contribution_columns(model, df, feats, n_jobs=args.n_jobs)
+        pd.concat([df, cols], axis=1).to_csv(args.out, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+# دوال تنبؤ مشتركة بين الواجهة وخدمات التنبؤ (بدون اعتماد على Streamlit)
+import time
+
+import numpy as np
+import pandas as pd
+
+# ميزات مطلوبة افتراضياً للاستخدام كأسماء أعمدة عند غياب model_features
+REQUIRED_FEATURES = [
+    "age", "sex", "cp", "trtbps", "chol", "fbs", "restecg", "thalachh", "exng", "oldpeak", "slp", "caa", "thall"
+]
+
+# سجل واقعي (نفس مثال README) للإحماء؛ الأصفار قد تقع خارج فئات OneHotEncoder فلا تمر بكل المسارات
+WARMUP_ROW = {
+    "age": 63, "sex": 1, "cp": 3, "trtbps": 145, "chol": 233, "fbs": 1, "restecg": 0,
+    "thalachh": 150, "exng": 0, "oldpeak": 2.3, "slp": 0, "caa": 0, "thall": 1,
+}
+
+
+# تحويل مصفوفة مدخلات إلى DataFrame بأسماء أعمدة النموذج (ليستطيع ColumnTransformer الفهرسة بالأسماء)
+def to_frame(arr, feats=None) -> pd.DataFrame:
+    arr = np.atleast_2d(np.asarray(arr))
+    if isinstance(feats, (list, tuple)) and len(feats) == arr.shape[1]:
+        cols = list(feats)
+    elif len(REQUIRED_FEATURES) == arr.shape[1]:
+        cols = REQUIRED_FEATURES
+    else:
+        raise ValueError("تعذر مطابقة أسماء الميزات مع مدخلات النموذج. تحقّق من توافق النموذج مع الخصائص الأساسية أو أعد التدريب.")
+    X = pd.DataFrame(arr, columns=cols)
+    # تحويل إجباري للأرقام
+    for c in X.columns:
+        X[c] = pd.to_numeric(X[c], errors='coerce')
+    if X.isna().any().any():
+        raise ValueError("المدخلات تحتوي قيماً غير رقمية/ناقصة بعد التحويل. رجاءً صحح القيم.")
+    return X
+
+
+# تنبؤ متجه لعدة صفوف: يعيد (التصنيفات، الاحتمالات أو None)
+# مع predict_proba نشتق التصنيف من الاحتمال نفسه (نداء واحد للنموذج بدلاً من اثنين)
+def predict_batch(model, X: pd.DataFrame):
+    # نموذج بعيد (خادم النموذج عبر المقبس): نداء واحد يعيد التصنيف والاحتمال معاً
+    remote = getattr(model, "remote_predict", None)
+    if remote is not None:
+        return remote(X)
+    proba = None
+    if hasattr(model, "predict_proba"):
+        try:
+            P = model.predict_proba(X)
+            classes = getattr(model, "classes_", None)
+            if classes is not None and P.shape[1] == len(classes):
+                return np.asarray(classes).take(P.argmax(axis=1)), P[:, 1] if P.shape[1] > 1 else None
+            proba = P[:, 1] if P.shape[1] > 1 else None
+        except Exception:
+            proba = None
+    prediction = np.asarray(model.predict(X))
+    if proba is None:
+        try:
+            if hasattr(model, "decision_function"):
+                val = np.asarray(model.decision_function(X), dtype=np.float64).reshape(len(X), -1)[:, -1]
+                proba = 1.0 / (1.0 + np.exp(-val))
+        except Exception:
+            proba = None
+    return prediction, proba
+
+
+# حدود فترة عدم اليقين من توزيع احتمالات الأشجار (5% و 95%)
+SPREAD_QUANTILES = (0.05, 0.95)
+
+# احتمال الفئة الموجبة لكل ورقة في كل شجرة، يُحسب مرة لكل غابة (نفس تطبيع predict_proba في الشجرة)
+# تُحفظ للغابة الحالية فقط حتى لا يُبقي التبديل بين النسخ الغابات السابقة في الذاكرة
+_LEAF_PROBA = {}
+
+
+# (المعالجة، الغابة، احتمالات الأوراق) إن كان النموذج غابة أشجار ثنائية التصنيف؛ وإلا None
+def _forest_parts(model):
+    steps = getattr(model, "steps", None)
+    clf = steps[-1][1] if steps else model
+    trees = getattr(clf, "estimators_", None)
+    if not isinstance(trees, list) or not trees or not hasattr(trees[0], "tree_"):
+        return None
+    if len(getattr(clf, "classes_", [])) != 2:
+        return None
+    cached = _LEAF_PROBA.get(id(clf))
+    if cached is None or cached[0] is not clf:
+        leaf = []
+        for t in trees:
+            v = t.tree_.value[:, 0, :]
+            total = v.sum(axis=1)
+            leaf.append(v[:, 1] / np.where(total == 0, 1.0, total))
+        _LEAF_PROBA.clear()
+        cached = _LEAF_PROBA[id(clf)] = (clf, leaf)
+    return (model[:-1] if steps and len(steps) > 1 else None), clf, cached[1]
+
+
+# تنبؤ مع تشتت الأشجار في نفس المرور: احتمال كل شجرة لكل سجل يُحسب مرة واحدة، ومنه المتوسط
+# (= predict_proba للغابة) والانحراف المعياري وفترة الكميات؛ يعيد (التصنيفات، الاحتمالات، التشتت أو None)
+# التشتت قاموس مصفوفات: std و low و high (احتمالات 0..1)؛ None لغير الغابات وللنموذج البعيد
+def predict_with_spread(model, X: pd.DataFrame, quantiles=SPREAD_QUANTILES, batch_rows=10000):
+    parts = None if getattr(model, "remote_predict", None) is not None else _forest_parts(model)
+    if parts is None:
+        prediction, proba = predict_batch(model, X)
+        return prediction, proba, None
+    pre, clf, leaf = parts
+    Xt = pre.transform(X) if pre is not None else X
+    Xt = np.ascontiguousarray(Xt.toarray() if hasattr(Xt, "toarray") else Xt, dtype=np.float32)
+    n = len(Xt)
+    proba, std = np.empty(n), np.empty(n)
+    bounds = np.empty((2, n))
+    # دفعات من السجلات حتى تبقى مصفوفة (أشجار × سجلات) محدودة الحجم مع الملفات الكبيرة
+    for start in range(0, n, batch_rows):
+        chunk = Xt[start:start + batch_rows]
+        per_tree = np.empty((len(leaf), len(chunk)))
+        for j, t in enumerate(clf.estimators_):
+            per_tree[j] = leaf[j][t.tree_.apply(chunk)]
+        end = start + len(chunk)
+        proba[start:end] = per_tree.mean(axis=0)
+        std[start:end] = per_tree.std(axis=0)
+        bounds[:, start:end] = np.quantile(per_tree, quantiles, axis=0)
+    prediction = np.asarray(clf.classes_).take((proba > 0.5).astype(int))
+    return prediction, proba, {"std": std, "low": bounds[0], "high": bounds[1]}
+
+
+# تحميل ملف النموذج بالشكلين المدعومين: نموذج خام، أو قاموس يحوي estimator والميتاداتا
+def load_payload(path) -> dict:
+    import joblib
+    obj = joblib.load(str(path))
+    if not (isinstance(obj, dict) and "estimator" in obj):
+        return {"estimator": obj, "features": None, "metrics": None, "target_mapping": None, "importance": None}
+    payload = dict(obj)
+    est = payload["estimator"]
+    feats = payload.get("features")
+    # إن لم تتوفر الميزات في الحمولة، حاول استخراجها من الـ Pipeline
+    if not feats:
+        try:
+            if hasattr(est, "named_steps") and "pre" in est.named_steps:
+                pre = est.named_steps["pre"]
+                if hasattr(pre, "feature_names_in_"):
+                    feats = list(pre.feature_names_in_)
+        except Exception:
+            feats = None
+    payload["features"] = feats
+    for k in ("metrics", "target_mapping", "importance"):
+        payload.setdefault(k, None)
+    return payload
+
+
+# تنبؤ دفعي لجدول كامل بنفس دلالات صفحة "رفع ملف CSV":
+# يضيف prediction و risk_percent (مقربة لمنزلتين) و risk_std/low/high للغابات، ويعيد أيضاً هل الاحتمال حقيقي أم مشتق من التصنيف
+def score_frame(model, df: pd.DataFrame, feats=None):
+    cols = list(feats) if feats else REQUIRED_FEATURES
+    missing = [c for c in cols if c not in df.columns]
+    if missing:
+        raise ValueError("الأعمدة الناقصة: " + ", ".join(missing))
+    y_pred, y_proba, spread = predict_with_spread(model, df[cols])
+    has_proba = y_proba is not None
+    if not has_proba:
+        y_proba = np.asarray(y_pred, dtype=float)
+    out = df.copy()
+    out["prediction"] = np.asarray(y_pred).astype(int)
+    out["risk_percent"] = np.round(np.asarray(y_proba, dtype=float) * 100.0, 2)
+    # للغابات: عدم اتفاق الأشجار (بنفس نقاط مئوية) من نفس التقييم، دون نداءات إضافية للنموذج
+    if spread is not None:
+        out["risk_std"] = np.round(spread["std"] * 100.0, 2)
+        out["risk_low"] = np.round(spread["low"] * 100.0, 2)
+        out["risk_high"] = np.round(spread["high"] * 100.0, 2)
+    return out, has_proba
+
+
+# إحماء: تنبؤات تجريبية عبر نفس مسار الطلب الحقيقي (predict تستقبل مصفوفة سطر واحد)
+# أول نداء يدفع كلفة التهيئة الكسولة داخل sklearn/numpy؛ يعيد زمن كل نداء بالثواني
+def warm_up(predict, feats=None, rounds=3):
+    row = np.array([[WARMUP_ROW.get(c, 0.0) for c in (feats or REQUIRED_FEATURES)]], dtype=np.float64)
+    timings = []
+    for _ in range(max(1, int(rounds))):
+        t0 = time.perf_counter()
+        predict(row)
+        timings.append(time.perf_counter() - t0)
+    return timings
+
+
+# مُقيّم سريع لسطر واحد للنماذج الخطية الثنائية (Pipeline: ColumnTransformer[StandardScaler/passthrough/OneHotEncoder] ثم
+# LogisticRegression): التقييس يُدمج مسبقاً في الأوزان، والترميز الأحادي يصبح جدول وزن لكل فئة،
+# فيصير التنبؤ ضرباً نقطياً واحداً بلا pandas ولا تحقق sklearn (أجزاء من الميلي ثانية)
+class LinearScorer:
+    def __init__(self, feats, weights, bias, lookups, classes):
+        self.features = list(feats)
+        self.weights = weights
+        self.bias = bias
+        self.lookups = lookups
+        self.classes = classes
+
+    # سطر واحد بترتيب الميزات → (التصنيف، الاحتمال)
+    def predict_row(self, row):
+        x = np.asarray(row, dtype=np.float64).reshape(-1)
+        z = self.bias + float(x @ self.weights)
+        for i, table in self.lookups:
+            z += table.get(x[i], 0.0)
+        p = 1.0 / (1.0 + np.exp(-z))
+        return self.classes[int(z > 0)], float(p)
+
+
+# محاولة تحويل نموذج إلى LinearScorer؛ يعيد None إن لم يكن بالشكل المدعوم (مثل الغابة العشوائية)
+def compile_linear(model, feats=None):
+    steps = getattr(model, "named_steps", None)
+    if not steps or "pre" not in steps or len(steps) != 2:
+        return None
+    pre, clf = steps["pre"], model.steps[-1][1]
+    coef = getattr(clf, "coef_", None)
+    classes = getattr(clf, "classes_", None)
+    if coef is None or coef.shape[0] != 1 or classes is None or len(classes) != 2 or not hasattr(clf, "predict_proba"):
+        return None
+    # feature_names_in_ مصفوفة numpy فلا تُختبر قيمتها المنطقية مباشرة
+    if feats is None:
+        feats = getattr(pre, "feature_names_in_", None)
+    feats = list(feats) if feats is not None and len(feats) else REQUIRED_FEATURES
+    index = {c: i for i, c in enumerate(feats)}
+    coef = np.asarray(coef[0], dtype=np.float64)
+    weights = np.zeros(len(feats))
+    bias = float(np.asarray(clf.intercept_).reshape(-1)[0])
+    lookups = []
+    pos = 0
+    try:
+        for name, trans, cols in pre.transformers_:
+            if name == "remainder" and trans == "drop":
+                continue
+            cols = [cols] if isinstance(cols, str) else list(cols)
+            if any(c not in index for c in cols):
+                return None
+            if trans == "passthrough":
+                weights[[index[c] for c in cols]] += coef[pos:pos + len(cols)]
+                pos += len(cols)
+            elif type(trans).__name__ == "StandardScaler":
+                w = coef[pos:pos + len(cols)]
+                mean = trans.mean_ if trans.with_mean else np.zeros(len(cols))
+                scale = trans.scale_ if trans.with_std else np.ones(len(cols))
+                weights[[index[c] for c in cols]] += w / scale
+                bias -= float(np.sum(w * mean / scale))
+                pos += len(cols)
+            elif type(trans).__name__ == "OneHotEncoder" and trans.drop is None:
+                for c, cats in zip(cols, trans.categories_):
+                    table = {float(v): float(coef[pos + k]) for k, v in enumerate(cats)}
+                    lookups.append((index[c], table))
+                    pos += len(cats)
+            else:
+                return None
+    except (TypeError, ValueError, AttributeError):
+        return None
+    if pos != coef.shape[0]:
+        return None
+    return LinearScorer(feats, weights, bias, lookups, np.asarray(classes))
+
+
+# تحليل "ماذا لو": كل البدائل في جدول واحد ثم نداء متجه واحد للنموذج
+# numeric: {ميزة: (أدنى، أعلى، نصف عرض النافذة)} → شبكة من points قيمة حول قيمة المريض ضمن الحدود
+# categorical: {ميزة: [الرموز الممكنة]} → سطر لكل رمز بديل
+# يعيد DataFrame بالأعمدة feature, value, current (هل هي قيمة المريض), risk_percent (أو None بلا احتمالات)
+def what_if(model, row: dict, feats, numeric=None, categorical=None, points=21):
+    feats = list(feats or REQUIRED_FEATURES)
+    base = np.array([float(row[c]) for c in feats], dtype=np.float64)
+    blocks, names, values = [], [], []
+    for f, (lo, hi, span) in (numeric or {}).items():
+        if f not in feats:
+            continue
+        x0 = float(row[f])
+        grid = np.unique(np.append(np.linspace(max(lo, x0 - span), min(hi, x0 + span), points), x0))
+        blocks.append((feats.index(f), grid))
+        names += [f] * len(grid)
+        values.append(grid)
+    for f, codes in (categorical or {}).items():
+        if f not in feats:
+            continue
+        grid = np.asarray(sorted(set(codes) | {row[f]}), dtype=np.float64)
+        blocks.append((feats.index(f), grid))
+        names += [f] * len(grid)
+        values.append(grid)
+    if not blocks:
+        return pd.DataFrame(columns=["feature", "value", "current", "risk_percent"])
+    X = np.repeat(base[None, :], len(names), axis=0)
+    start = 0
+    for j, grid in blocks:
+        X[start:start + len(grid), j] = grid
+        start += len(grid)
+    _, proba = predict_batch(model, pd.DataFrame(X, columns=feats))
+    value = np.concatenate(values)
+    out = pd.DataFrame({"feature": names, "value": value})
+    out["current"] = np.isclose(value, base[[feats.index(f) for f in names]])
+    out["risk_percent"] = None if proba is None else np.asarray(proba, dtype=float) * 100.0
+    return out
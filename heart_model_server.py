@@ -0,0 +1,316 @@
+# خادم نموذج منفصل عبر Unix domain socket حتى لا تحمّل كل نسخة من Streamlit النموذج بنفسها
+# - الخادم يحمّل heart_model.pkl مرة واحدة ويجمع طلبات السجل الواحد من كل الاتصالات في دفعات (heart_broker)
+# - الواجهة تستخدم ModelClient (مجمع اتصالات) و RemoteModel بدلاً من النموذج نفسه عند ضبط HEART_MODEL_SOCKET
+#
+# البروتوكول (ثنائي مختصر، big-endian للترويسات):
+#   إطار = MAGIC(4) + رمز(1) + طول الحمولة(4) + الحمولة
+#   الطلب: الرمز = العملية (PING / META / PREDICT / RELOAD)، والرد: الرمز = الحالة (OK / ERROR)
+#   PREDICT: عدد الصفوف(4) + عدد الأعمدة(2) + القيم float64 little-endian بترتيب ميزات النموذج
+#   الرد:    عدد الصفوف(4) + هل يوجد احتمال(1) + التصنيفات int64 + الاحتمالات float64
+#   META: الرد JSON (الميزات، المقاييس، خريطة الهدف، أهمية السمات)
+#
+# أمثلة:
+#   python heart_model_server.py --socket /tmp/heart_model.sock
+#   HEART_MODEL_SOCKET=/tmp/heart_model.sock streamlit run heart_web.py
+import argparse
+import json
+import os
+import queue
+import signal
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+
+import numpy as np
+
+MAGIC = b"HRT1"
+HEADER = struct.Struct("!4sBI")
+ROWS = struct.Struct("!IH")
+RESULT = struct.Struct("!IB")
+MAX_FRAME = 256 * 1024 * 1024
+
+OP_PING, OP_META, OP_PREDICT, OP_RELOAD = 1, 2, 3, 4
+STATUS_OK, STATUS_ERROR = 0, 1
+
+DEFAULT_SOCKET = os.environ.get("HEART_MODEL_SOCKET") or "/tmp/heart_model.sock"
+
+
+def _recv_exact(sock, n):
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        k = sock.recv_into(view[got:], n - got)
+        if k == 0:
+            raise ConnectionError("انقطع الاتصال")
+        got += k
+    return bytes(buf)
+
+
+def send_frame(sock, code, payload=b""):
+    sock.sendall(HEADER.pack(MAGIC, code, len(payload)) + payload)
+
+
+def recv_frame(sock):
+    magic, code, length = HEADER.unpack(_recv_exact(sock, HEADER.size))
+    if magic != MAGIC:
+        raise ConnectionError("إطار غير صالح")
+    if length > MAX_FRAME:
+        raise ConnectionError("إطار أكبر من الحد المسموح")
+    return code, _recv_exact(sock, length) if length else b""
+
+
+def encode_rows(X) -> bytes:
+    X = np.ascontiguousarray(np.atleast_2d(np.asarray(X, dtype="<f8")))
+    return ROWS.pack(X.shape[0], X.shape[1]) + X.tobytes()
+
+
+def decode_rows(payload) -> np.ndarray:
+    n, k = ROWS.unpack_from(payload)
+    return np.frombuffer(payload, dtype="<f8", count=n * k, offset=ROWS.size).reshape(n, k)
+
+
+def encode_result(preds, proba) -> bytes:
+    n = len(preds)
+    body = np.asarray(preds, dtype="<i8").tobytes()
+    if proba is not None:
+        body += np.asarray(proba, dtype="<f8").tobytes()
+    return RESULT.pack(n, proba is not None) + body
+
+
+def decode_result(payload):
+    n, has_proba = RESULT.unpack_from(payload)
+    preds = np.frombuffer(payload, dtype="<i8", count=n, offset=RESULT.size)
+    proba = np.frombuffer(payload, dtype="<f8", count=n, offset=RESULT.size + 8 * n) if has_proba else None
+    return preds, proba
+
+
+def _jsonable(o):
+    if isinstance(o, np.generic):
+        return o.item()
+    if isinstance(o, np.ndarray):
+        return o.tolist()
+    return str(o)
+
+
+# ---------------------------------------------------------------- الخادم
+
+class _ServedModel:
+    def __init__(self, path, version=None):
+        import pandas as pd
+        from heart_inference import REQUIRED_FEATURES, load_payload, predict_batch, warm_up
+        self.path = str(path)
+        self.version = version
+        t0 = time.perf_counter()
+        payload = load_payload(path)
+        self.estimator = payload["estimator"]
+        self.features = list(payload.get("features") or REQUIRED_FEATURES)
+        load_s = time.perf_counter() - t0
+        # إحماء قبل أن يصبح هذا النموذج هو المخدوم، فلا يدفع أول طلب بعد التشغيل أو إعادة التحميل كلفة التهيئة
+        warm = warm_up(lambda row: predict_batch(self.estimator, pd.DataFrame(row, columns=self.features)), self.features)
+        self.timings = {"load_s": round(load_s, 3), "first_predict_ms": round(warm[0] * 1000, 2),
+                        "warm_predict_ms": round(warm[-1] * 1000, 2)}
+        meta = {k: payload.get(k) for k in ("metrics", "target_mapping", "importance")}
+        meta.update({"features": self.features, "version": version, "path": self.path, "loaded_at": time.time(),
+                     "timings": self.timings})
+        self.meta_json = json.dumps(meta, ensure_ascii=False, default=_jsonable).encode("utf-8")
+
+
+class ModelServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    # model_path=None: النسخة الفعالة في سجل النماذج مع متابعة المؤشر وإعادة التحميل تلقائياً
+    def __init__(self, socket_path, model_path=None):
+        from heart_broker import PredictionBroker
+        self.socket_path = str(socket_path)
+        self.model_path = None if model_path is None else str(model_path)
+        self._reload_lock = threading.Lock()
+        self.model = None
+        self.reload()
+        self.broker = PredictionBroker()
+        self.watcher = None
+        if self.model_path is None:
+            from heart_registry import ModelWatcher
+            self.watcher = ModelWatcher(lambda version, path: self.reload())
+            self.watcher.start()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        super().__init__(self.socket_path, _Handler)
+        os.chmod(self.socket_path, 0o660)
+
+    # إعادة التحميل: النموذج الجديد يُحمّل كاملاً ثم يُبدَّل بإسناد واحد، فالطلبات الجارية تكمل بالقديم
+    def reload(self):
+        with self._reload_lock:
+            if self.model_path is None:
+                from heart_registry import resolve
+                version, path = resolve()
+            else:
+                version, path = None, self.model_path
+            self.model = _ServedModel(path, version)
+        return self.model
+
+    def predict(self, X: np.ndarray):
+        import pandas as pd
+        from heart_inference import predict_batch
+        model = self.model
+        # القيم تصل float64 جاهزة، فيكفي التحقق من الشكل ومن عدم وجود قيم ناقصة بدلاً من تحويل كل عمود
+        if X.shape[1] != len(model.features):
+            raise ValueError(f"عدد الأعمدة {X.shape[1]} لا يطابق ميزات النموذج ({len(model.features)})")
+        if not np.isfinite(X).all():
+            raise ValueError("المدخلات تحتوي قيماً غير رقمية/ناقصة.")
+        frame = pd.DataFrame(X, columns=model.features)
+        if len(frame) == 1:
+            pred, proba = self.broker.predict(model.estimator, frame)
+            return [pred], None if proba is None else [proba]
+        return predict_batch(model.estimator, frame)
+
+    def server_close(self):
+        super().server_close()
+        if self.watcher is not None:
+            self.watcher.stop()
+        self.broker.close()
+        try:
+            os.unlink(self.socket_path)
+        except OSError:
+            pass
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        sock = self.request
+        server = self.server
+        while True:
+            try:
+                op, payload = recv_frame(sock)
+            except (ConnectionError, OSError, struct.error):
+                return
+            try:
+                if op == OP_PING:
+                    send_frame(sock, STATUS_OK)
+                elif op == OP_META:
+                    send_frame(sock, STATUS_OK, server.model.meta_json)
+                elif op == OP_PREDICT:
+                    preds, proba = server.predict(decode_rows(payload))
+                    send_frame(sock, STATUS_OK, encode_result(preds, proba))
+                elif op == OP_RELOAD:
+                    send_frame(sock, STATUS_OK, server.reload().meta_json)
+                else:
+                    send_frame(sock, STATUS_ERROR, f"عملية غير معروفة: {op}".encode("utf-8"))
+            except (ConnectionError, OSError):
+                return
+            except Exception as e:
+                send_frame(sock, STATUS_ERROR, f"{type(e).__name__}: {e}".encode("utf-8"))
+
+
+# ---------------------------------------------------------------- العميل
+
+class ModelServerError(RuntimeError):
+    pass
+
+
+# عميل بمجمع اتصالات: كل استدعاء يستعير اتصالاً مفتوحاً (أو يفتح جديداً ضمن الحد) ثم يعيده
+class ModelClient:
+    def __init__(self, socket_path=None, pool_size=8, timeout=30.0):
+        self.socket_path = str(socket_path or DEFAULT_SOCKET)
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._meta = None
+        self._meta_at = 0.0
+
+    def _connect(self):
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        s.settimeout(self.timeout)
+        s.connect(self.socket_path)
+        return s
+
+    def _call(self, op, payload=b""):
+        with self._slots:
+            # محاولة ثانية باتصال جديد إن كان الاتصال المستعار قد انقطع (مثلاً بعد إعادة تشغيل الخادم)
+            for attempt in range(2):
+                try:
+                    sock = self._idle.get_nowait()
+                except queue.Empty:
+                    sock = self._connect()
+                try:
+                    send_frame(sock, op, payload)
+                    status, body = recv_frame(sock)
+                except (ConnectionError, OSError, struct.error):
+                    sock.close()
+                    if attempt:
+                        raise
+                    continue
+                self._idle.put(sock)
+                if status != STATUS_OK:
+                    raise ModelServerError(body.decode("utf-8", "replace"))
+                return body
+
+    def ping(self):
+        t0 = time.perf_counter()
+        self._call(OP_PING)
+        return time.perf_counter() - t0
+
+    # الميتاداتا تُخزَّن لبضع ثوانٍ فقط حتى تظهر النسخة الجديدة بعد إعادة تحميل الخادم
+    def meta(self, refresh=False, max_age=5.0):
+        if self._meta is None or refresh or time.monotonic() - self._meta_at > max_age:
+            self._meta = json.loads(self._call(OP_META))
+            self._meta_at = time.monotonic()
+        return self._meta
+
+    def reload(self):
+        self._meta = json.loads(self._call(OP_RELOAD))
+        self._meta_at = time.monotonic()
+        return self._meta
+
+    def predict(self, X):
+        return decode_result(self._call(OP_PREDICT, encode_rows(X)))
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+# بديل خفيف للنموذج داخل الواجهة: predict_batch في heart_inference يستدعي remote_predict مباشرة
+class RemoteModel:
+    def __init__(self, client: ModelClient):
+        self.client = client
+        self.features = client.meta()["features"]
+
+    def remote_predict(self, X):
+        arr = X[self.features] if hasattr(X, "columns") else X
+        return self.client.predict(np.asarray(arr, dtype=np.float64))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="خادم نموذج أمراض القلب عبر Unix domain socket")
+    ap.add_argument("--socket", default=DEFAULT_SOCKET, help="مسار ملف المقبس")
+    ap.add_argument("--model", default=None, help="مسار ملف نموذج ثابت (افتراضياً النسخة الفعالة في سجل النماذج مع إعادة تحميل تلقائية)")
+    args = ap.parse_args(argv)
+    if not hasattr(socket, "AF_UNIX"):
+        raise SystemExit("هذا النظام لا يدعم Unix domain sockets؛ استخدم heart_service.py بدلاً منه.")
+
+    t0 = time.perf_counter()
+    server = ModelServer(args.socket, args.model)
+    t = server.model.timings
+    print(f"✅ خادم النموذج جاهز خلال {time.perf_counter() - t0:.2f} ث (تحميل {t['load_s']:.2f} ث، "
+          f"أول تنبؤ {t['first_predict_ms']:.1f}ms ثم {t['warm_predict_ms']:.1f}ms) على {args.socket}", flush=True)
+    # SIGTERM يوقف الحلقة بشكل نظيف فيُحذف ملف المقبس
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown, daemon=True).start())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,60 +1,182 @@
-#%% بيانات واستيراد المكتبات
-import pandas as pd
-import numpy as np
-import seaborn as sns
-import matplotlib.pyplot as plt
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import accuracy_score, confusion_matrix, classification_report
-import joblib
+# سكربت تدريب قابل لإعادة الاستخدام يعمل دون تدخل (مثلاً على خوادم البناء)
+# - يقرأ الإعدادات من ملف JSON (مصدر البيانات، الخوارزمية، المعاملات، n_jobs، حجم عينة EDA)
+# - يكتب نفس صيغة الحمولة التي تفهمها load_model في التطبيق: estimator, features, metrics
+# - يسجّل زمن كل مرحلة في الحمولة تحت "timings"
+#
+# أمثلة:
+#   python heart_model_updated.py --dataset heart
+#   python heart_model_updated.py --data heart_comma.csv --algo RandomForest --n-jobs -1 --output heart_model.pkl
+#   python heart_model_updated.py --config train_config.json
+import argparse
+import json
+import os
 import sys
+import time
+from pathlib import Path
+
+import joblib
+import pandas as pd
+
+from heart_training import train_model
+
+DEFAULT_CONFIG = {
+    # source: "store" (مخزن Parquet) أو "csv"
+    "data": {"source": "store", "dataset": "heart", "path": None, "max_rows": None},
+    "target": "output",
+    # None = كل الأعمدة ما عدا الهدف
+    "features": None,
+    "algo": "RandomForest",
+    # معاملات المصنّف لكل خوارزمية (تُستخدم معاملات الخوارزمية المختارة فقط)
+    "params": {"RandomForest": {"n_estimators": 100}, "LogisticRegression": {}},
+    "test_size": 0.2,
+    "random_state": 42,
+    "class_weight_balanced": False,
+    "scale_features": True,
+    "cv_folds": 5,
+    "importance_repeats": 5,
+    "n_jobs": -1,
+    # EDA بمرور واحد (heart_eda.py)؛ sample_rows = حجم عينة الكمّيات التقريبية، والرسم يُحفظ كملف
+    "eda": {"enabled": True, "sample_rows": 20000, "out_dir": "reports"},
+    "output": "heart_model.pkl",
+    # نشر النموذج كنسخة في سجل النماذج (heart_registry.py)؛ "activate" تجعلها الفعالة لكل العمليات فوراً
+    "publish": {"enabled": False, "activate": False, "note": None},
+}
+
+
+def load_config(path=None):
+    cfg = json.loads(json.dumps(DEFAULT_CONFIG))
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            user = json.load(f)
+        for k, v in user.items():
+            if isinstance(v, dict) and isinstance(cfg.get(k), dict):
+                cfg[k].update(v)
+            else:
+                cfg[k] = v
+    return cfg
+
+
+def load_data(data_cfg):
+    if data_cfg.get("source") == "csv":
+        path = data_cfg["path"]
+        with open(path, "r", encoding="utf-8-sig") as f:
+            first = f.readline()
+        sep = ";" if first.count(";") > first.count(",") else ","
+        df = pd.read_csv(path, sep=sep, nrows=data_cfg.get("max_rows"))
+        df.columns = df.columns.str.strip()
+        return df
+    from heart_store import read_dataset
+    return read_dataset(data_cfg.get("dataset", "heart"), limit=data_cfg.get("max_rows"))
+
 
-#%% قراءة البيانات الجديدة
-data = pd.read_csv("C:/Users/Elite/Downloads/heart_comma_updated.csv", sep=';')
-print("أول 5 صفوف من البيانات:")
-print(data.head())
+# EDA بمرور واحد متوازٍ على أجزاء المصدر نفسه (بدلاً من info/describe/corr على كامل البيانات في الذاكرة)
+def run_eda(data_cfg, eda_cfg, n_jobs=-1, random_state=42):
+    from heart_eda import profile_csv, profile_dataset, save_heatmap
+    sample_rows = eda_cfg.get("sample_rows") or 20000
+    if data_cfg.get("source") == "csv":
+        prof = profile_csv([data_cfg["path"]], n_jobs=n_jobs, sample_rows=sample_rows, seed=random_state)
+    else:
+        prof = profile_dataset(data_cfg.get("dataset", "heart"), n_jobs=n_jobs, sample_rows=sample_rows,
+                               seed=random_state)
+    print(prof.info())
+    print(prof.null_counts())
+    print(prof.describe())
+    out_dir = Path(eda_cfg.get("out_dir") or "reports")
+    return save_heatmap(prof, out_dir / "correlation_heatmap.png")
 
-#%% معلومات عن البيانات
-print(data.info())
 
-#%% عدد القيم الفارغة في كل عمود
-print(data.isnull().sum())
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="تدريب نموذج أمراض القلب وحفظه بصيغة حمولة التطبيق")
+    ap.add_argument("--config", default=None, help="ملف إعدادات JSON (يُدمج فوق الإعدادات الافتراضية)")
+    ap.add_argument("--data", default=None, help="مسار CSV (يتجاوز مصدر البيانات في الإعدادات)")
+    ap.add_argument("--dataset", default=None, help="اسم مجموعة في مخزن البيانات")
+    ap.add_argument("--algo", choices=["LogisticRegression", "RandomForest"], default=None)
+    ap.add_argument("--n-jobs", type=int, default=None)
+    ap.add_argument("--eda-sample", type=int, default=None, help="حجم عينة الكمّيات في EDA")
+    ap.add_argument("--no-eda", action="store_true")
+    ap.add_argument("--output", default=None, help="مسار ملف النموذج الناتج")
+    ap.add_argument("--publish", action="store_true", help="نشر النموذج كنسخة جديدة في سجل النماذج")
+    ap.add_argument("--activate", action="store_true", help="مع --publish: تفعيل النسخة الجديدة")
+    args = ap.parse_args(argv)
 
-#%% إحصاءات وصفية للأعمدة الرقمية
-print(data.describe())
+    cfg = load_config(args.config)
+    if args.data:
+        cfg["data"].update({"source": "csv", "path": args.data})
+    if args.dataset:
+        cfg["data"].update({"source": "store", "dataset": args.dataset})
+    if args.algo:
+        cfg["algo"] = args.algo
+    if args.n_jobs is not None:
+        cfg["n_jobs"] = args.n_jobs
+    if args.eda_sample is not None:
+        cfg["eda"]["sample_rows"] = args.eda_sample
+    if args.no_eda:
+        cfg["eda"]["enabled"] = False
+    if args.output:
+        cfg["output"] = args.output
+    if args.publish:
+        cfg["publish"]["enabled"] = True
+    if args.activate:
+        cfg["publish"]["activate"] = True
 
-#%% خريطة الحرارة للمتغيرات
-plt.figure(figsize=(12,10))
-sns.heatmap(data.corr(), annot=True, cmap='Reds')
-plt.title("خريطة الحرارة للمتغيرات")
-plt.show()
+    timings = {}
+    t0 = time.perf_counter()
+    data = load_data(cfg["data"])
+    timings["load"] = time.perf_counter() - t0
+    print(f"تم تحميل {len(data)} سجل، {data.shape[1]} عمود")
 
-#%% تقسيم البيانات إلى خصائص وهدف
-X = data.drop('output', axis=1)
-y = data['output']
+    if cfg["eda"].get("enabled"):
+        t0 = time.perf_counter()
+        heatmap = run_eda(cfg["data"], cfg["eda"], cfg["n_jobs"], cfg["random_state"])
+        timings["eda"] = time.perf_counter() - t0
+        print(f"خريطة الحرارة: {heatmap}")
 
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y, test_size=0.2, random_state=42
-)
+    target = cfg["target"]
+    features = cfg["features"] or [c for c in data.columns if c != target]
+    payload, report = train_model(
+        data, target, features, algo=cfg["algo"], test_size=cfg["test_size"],
+        random_state=cfg["random_state"], class_weight_balanced=cfg["class_weight_balanced"],
+        scale_features=cfg["scale_features"], cv_folds=cfg["cv_folds"], n_jobs=cfg["n_jobs"],
+        importance_repeats=cfg["importance_repeats"], params=cfg["params"].get(cfg["algo"]),
+    )
+    timings.update(report["timings"])
 
-print("حجم بيانات التدريب:", X_train.shape)
-print("حجم بيانات الاختبار:", X_test.shape)
+    print("\nدقة النموذج على مجموعة الاختبار:", report["accuracy"])
+    if report.get("cv"):
+        acc = report["cv"]["accuracy"]
+        print(f"دقة k-fold: {acc['mean']:.4f} (فترة الثقة {acc['ci_low']:.4f} – {acc['ci_high']:.4f})")
+    print("\nمصفوفة الالتباس:")
+    print(report["confusion_matrix"])
+    print("\nالتقرير التفصيلي:")
+    print(report["classification_report"])
 
-#%% تدريب نموذج عشوائي الغابة
-model = RandomForestClassifier(n_estimators=100, random_state=42)
-model.fit(X_train, y_train)
+    # حفظ ذري للنموذج المدرب (ملف مؤقت ثم إعادة تسمية) حتى لا يقرأ التطبيق ملفاً نصف مكتوب
+    t0 = time.perf_counter()
+    out = Path(cfg["output"])
+    out.parent.mkdir(parents=True, exist_ok=True)
+    payload["timings"] = timings
+    payload["config"] = cfg
+    tmp = out.with_name(out.name + ".tmp")
+    joblib.dump(payload, tmp)
+    os.replace(tmp, out)
+    neighbors = None
+    if report.get("neighbor_index") is not None:
+        from heart_neighbors import save_index
+        neighbors = save_index(report["neighbor_index"], out)
+    timings["save"] = time.perf_counter() - t0
 
-#%% تقييم النموذج
-y_pred = model.predict(X_test)
-print("\nدقة النموذج على مجموعة الاختبار:", accuracy_score(y_test, y_pred))
-print("\nمصفوفة الالتباس:")
-print(confusion_matrix(y_test, y_pred))
-print("\nالتقرير التفصيلي:")
-print(classification_report(y_test, y_pred))
+    print("\nزمن المراحل (ث):")
+    print(json.dumps({k: round(v, 3) for k, v in timings.items()}, ensure_ascii=False, indent=1))
+    print(f"✅ تم حفظ النموذج في {out}" + (f" وفهرس المرضى المشابهين في {neighbors}" if neighbors else ""))
+    if cfg["publish"].get("enabled"):
+        from heart_neighbors import index_path
+        from heart_registry import MODEL_FILE, publish
+        attachments = {index_path(MODEL_FILE).name: neighbors} if neighbors else None
+        version = publish(source=out, activate=cfg["publish"].get("activate"), note=cfg["publish"].get("note"),
+                          attachments=attachments)
+        print(f"✅ نُشر كنسخة {version}" + (" وأصبحت الفعالة" if cfg["publish"].get("activate") else ""))
+    return 0
 
-#%% حفظ النموذج المدرب
-joblib.dump(model, "C:/Users/Elite/Downloads/heart_model_updated.pkl")
-print("✅ تم حفظ النموذج بنجاح في Downloads!")
 
-#%% عرض مسار البايثون الحالي
-print("مسار بايثون الحالي:", sys.executable)
+if __name__ == "__main__":
+    sys.exit(main())
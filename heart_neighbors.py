@@ -0,0 +1,200 @@
+# فهرس "المرضى المشابهين": أقرب k سجلات من بيانات التدريب لسجل جديد، مع نتائجها الفعلية
+# - المسافة إقليدية على السمات بعد تقييسها (متوسط/انحراف بيانات التدريب) حتى لا يطغى الكوليسترول على البقية
+# - حتى EXACT_MAX_ROWS سجل: KDTree دقيق من sklearn
+# - فوق ذلك (عشرات الملايين): فهرس IVF مكمّم — عناقيد KMeans كقوائم مقلوبة، والمتجهات المقيسة مخزنة int8
+#   (بايت لكل سمة)؛ الاستعلام يفحص أقرب n_probe عناقيد فقط
+# يُبنى وقت التدريب ويُحفظ بجانب ملف النموذج: heart_model.pkl → heart_model_neighbors.pkl
+# (وفي سجل النماذج: versions/<نسخة>/model_neighbors.pkl)
+#
+# أمثلة:
+#   python heart_neighbors.py build --model heart_model.pkl --data heart_comma.csv
+#   python heart_neighbors.py query --model heart_model.pkl --csv examples/heart_sample.csv --k 5
+import argparse
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+INDEX_SUFFIX = "_neighbors.pkl"
+EXACT_MAX_ROWS = 2_000_000
+# مدى التكميم بوحدات الانحراف المعياري: [-6، 6] على 255 مستوى (دقة ~0.05 انحراف معياري)
+QUANT_RANGE = 6.0
+
+
+def index_path(model_path) -> Path:
+    model_path = Path(model_path)
+    return model_path.with_name(model_path.stem + INDEX_SUFFIX)
+
+
+class NeighborIndex:
+    def __init__(self, X, y, feats, exact_max_rows=EXACT_MAX_ROWS, n_lists=None, seed=0):
+        X = np.asarray(X, dtype=np.float64)
+        self.features = list(feats)
+        self.n_rows = len(X)
+        self.mean = X.mean(axis=0)
+        std = X.std(axis=0)
+        self.scale = np.where(std > 0, std, 1.0)
+        # القيم الأصلية للعرض: float16 إن كانت تُمثَّل بدقة (أعداد صحيحة صغيرة كالعمر والضغط)، وإلا float32
+        half = X.astype(np.float16)
+        self.rows = half if np.array_equal(half.astype(np.float64), X) else X.astype(np.float32)
+        self.outcome = np.asarray(y).astype(np.int8)
+        Z = self._standardize(X)
+        if self.n_rows <= exact_max_rows:
+            from sklearn.neighbors import KDTree
+            self.kind = "kdtree"
+            self.tree = KDTree(Z)
+        else:
+            self.kind = "ivf"
+            self._build_ivf(Z, n_lists, seed)
+
+    def _standardize(self, X):
+        return (np.asarray(X, dtype=np.float64) - self.mean) / self.scale
+
+    # قوائم مقلوبة: العناقيد تُتعلم من عينة، ثم يُسند كل سجل لأقرب مركز على دفعات، وتُرتب السجلات حسب العنقود
+    def _build_ivf(self, Z, n_lists, seed, batch_rows=1_000_000):
+        from sklearn.cluster import MiniBatchKMeans
+        n_lists = int(n_lists or min(4096, max(16, int(4 * np.sqrt(len(Z))))))
+        rng = np.random.default_rng(seed)
+        sample = Z[rng.choice(len(Z), size=min(len(Z), 50 * n_lists), replace=False)]
+        km = MiniBatchKMeans(n_clusters=n_lists, random_state=seed, n_init=1, batch_size=4096).fit(sample)
+        self.centroids = km.cluster_centers_
+        labels = np.concatenate([km.predict(Z[s:s + batch_rows]) for s in range(0, len(Z), batch_rows)])
+        self.order = np.argsort(labels, kind="stable")
+        self.offsets = np.r_[0, np.cumsum(np.bincount(labels, minlength=n_lists))]
+        self.step = 2 * QUANT_RANGE / 254
+        self.codes = np.clip(np.round(Z[self.order] / self.step), -127, 127).astype(np.int8)
+
+    # أقرب n_probe عناقيد لكل استعلام: ‖z‖² − 2·z·c + ‖c‖² بضرب مصفوفات على كتل من الاستعلامات،
+    # فالذاكرة (كتلة × عناقيد) لا (استعلامات × عناقيد × سمات)
+    def _probes(self, Z, n_probe, block=4096):
+        c_sq = (self.centroids ** 2).sum(axis=1)
+        n_probe = min(n_probe, len(self.centroids))
+        out = np.empty((len(Z), n_probe), dtype=np.int64)
+        for s in range(0, len(Z), block):
+            zb = Z[s:s + block]
+            d_c = (zb ** 2).sum(axis=1)[:, None] - 2.0 * zb @ self.centroids.T + c_sq[None]
+            part = np.argpartition(d_c, n_probe - 1, axis=1)[:, :n_probe] if n_probe < d_c.shape[1] else \
+                np.broadcast_to(np.arange(d_c.shape[1]), d_c.shape)
+            order = np.argsort(np.take_along_axis(d_c, part, axis=1), axis=1)
+            out[s:s + block] = np.take_along_axis(part, order, axis=1)
+        return out
+
+    def _query_ivf(self, Z, k, n_probe):
+        dist = np.empty((len(Z), k))
+        ind = np.empty((len(Z), k), dtype=np.int64)
+        probes = self._probes(Z, n_probe)
+        sizes = np.diff(self.offsets)
+        for i, z in enumerate(Z):
+            lists = probes[i]
+            if sizes[lists].sum() < k:
+                # العناقيد المفحوصة فيها أقل من k سجل: نضيف التالية بترتيب القرب حتى تكفي
+                # (فلا تُحشى النتيجة بأرقام -1 تقرأ نتيجة آخر سجل تدريب)
+                near = np.argsort(((self.centroids - z) ** 2).sum(axis=1))
+                lists = near[:int(np.searchsorted(np.cumsum(sizes[near]), k)) + 1]
+            spans = [np.arange(self.offsets[c], self.offsets[c + 1]) for c in lists]
+            cand = np.concatenate(spans)
+            d = ((self.codes[cand].astype(np.float32) * self.step - z) ** 2).sum(axis=1)
+            kk = min(k, len(cand))
+            top = np.argpartition(d, kk - 1)[:kk] if kk < len(cand) else np.arange(len(cand))
+            top = top[np.argsort(d[top])]
+            dist[i, :kk], ind[i, :kk] = np.sqrt(d[top]), self.order[cand[top]]
+            dist[i, kk:], ind[i, kk:] = np.inf, -1
+        return dist, ind
+
+    # (المسافات، أرقام السجلات) بالشكل (استعلامات × k)، مرتبة من الأقرب
+    def query(self, X, k=5, n_probe=8):
+        if isinstance(X, pd.DataFrame):
+            X = X[self.features].to_numpy(dtype=np.float64)
+        Z = self._standardize(np.atleast_2d(X))
+        k = min(k, self.n_rows)
+        if self.kind == "kdtree":
+            return self.tree.query(Z, k=k)
+        return self._query_ivf(Z, k, n_probe)
+
+    # جدول الجيران لسجل واحد: قيمهم الأصلية، النتيجة الفعلية، والمسافة
+    def neighbors(self, row, k=5):
+        dist, ind = self.query(row, k)
+        out = pd.DataFrame(np.round(self.rows[ind[0]].astype(np.float64), 4), columns=self.features)
+        out["outcome"] = self.outcome[ind[0]]
+        out["distance"] = dist[0]
+        return out
+
+    # أعمدة ملخصة لتنبؤ دفعي: نسبة الجيران المصابين ومتوسط المسافة إليهم
+    def summarize(self, X, k=5, batch_rows=50000):
+        pos, mean_d = [], []
+        for s in range(0, len(X), batch_rows):
+            dist, ind = self.query(X.iloc[s:s + batch_rows] if isinstance(X, pd.DataFrame) else X[s:s + batch_rows], k)
+            pos.append((self.outcome[ind] == 1).mean(axis=1) * 100.0)
+            mean_d.append(dist.mean(axis=1))
+        return pd.DataFrame({
+            "similar_positive_pct": np.round(np.concatenate(pos), 1) if pos else [],
+            "similar_distance": np.round(np.concatenate(mean_d), 3) if mean_d else [],
+        }, index=X.index if isinstance(X, pd.DataFrame) else None)
+
+
+# بناء الفهرس من بيانات التدريب؛ None إن كانت هناك سمات غير رقمية (لا معنى للتقييس عليها)
+def build_index(X: pd.DataFrame, y, feats=None, **kwargs):
+    feats = list(feats or X.columns)
+    if not all(np.issubdtype(X[c].dtype, np.number) for c in feats):
+        return None
+    return NeighborIndex(X[feats].to_numpy(dtype=np.float64), y, feats, **kwargs)
+
+
+def save_index(index, model_path):
+    import joblib
+    path = index_path(model_path)
+    tmp = path.with_name(path.name + ".tmp")
+    joblib.dump(index, tmp)
+    os.replace(tmp, path)
+    return path
+
+
+def load_index(model_path):
+    import joblib
+    path = index_path(model_path)
+    return joblib.load(path) if path.exists() else None
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="فهرس المرضى المشابهين (أقرب الجيران في بيانات التدريب)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="بناء الفهرس لنموذج موجود من بيانات تدريبه")
+    b.add_argument("--model", default="heart_model.pkl")
+    b.add_argument("--data", required=True, help="ملف CSV لبيانات التدريب")
+    b.add_argument("--target", default="output")
+    q = sub.add_parser("query", help="أقرب الجيران لسجلات ملف CSV")
+    q.add_argument("--model", default="heart_model.pkl")
+    q.add_argument("--csv", required=True)
+    q.add_argument("--k", type=int, default=5)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "build":
+        from heart_inference import REQUIRED_FEATURES, load_payload
+        from heart_training import encode_target
+        feats = load_payload(args.model)["features"] or REQUIRED_FEATURES
+        df = pd.read_csv(args.data, sep=None, engine="python")
+        df.columns = df.columns.str.strip()
+        work = df[list(feats) + [args.target]].dropna()
+        y, _ = encode_target(work[args.target])
+        t0 = time.perf_counter()
+        index = build_index(work, y, feats)
+        if index is None:
+            raise SystemExit("الفهرس يحتاج سمات رقمية فقط")
+        path = save_index(index, args.model)
+        print(f"✅ {index.n_rows:,} سجل ({index.kind}) خلال {time.perf_counter() - t0:.2f} ث → {path}")
+        return
+    index = load_index(args.model)
+    if index is None:
+        raise SystemExit(f"لا يوجد فهرس: {index_path(args.model)}")
+    df = pd.read_csv(args.csv, sep=None, engine="python")
+    t0 = time.perf_counter()
+    out = index.summarize(df, args.k)
+    elapsed = time.perf_counter() - t0
+    print(pd.concat([df[index.features], out], axis=1).head(20).to_string())
+    print(f"⏱️ {len(df):,} استعلام خلال {elapsed * 1000:.1f} ميلي ثانية")
+
+
+if __name__ == "__main__":
+    main()
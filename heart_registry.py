@@ -0,0 +1,321 @@
+# سجل نماذج بنسخ ثابتة لا تُعدَّل + مؤشر "CURRENT" يُحدَّث بإعادة تسمية ذرّية
+# البنية: <root>/versions/<version>/model.pkl + meta.json، و <root>/CURRENT (اسم النسخة الفعالة)، و <root>/HISTORY
+# - النشر: الملف يُكتب كاملاً في ملف مؤقت ثم يُنقل لمكانه، فلا يرى أي قارئ ملفاً نصف مكتوب
+# - التفعيل والتراجع: تغيير المؤشر فقط (os.replace)، والنسخ السابقة تبقى كما هي
+# - ModelWatcher / LiveModel: كل عملية تراقب المؤشر وتبدّل النموذج في الخلفية دون إيقاف التنبؤات الجارية
+#
+# أمثلة:
+#   python heart_registry.py publish heart_model.pkl --note "النموذج الأصلي"
+#   python heart_registry.py list
+#   python heart_registry.py activate 20250101-120000-ab12cd34
+#   python heart_registry.py rollback
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+
+DEFAULT_ROOT = Path(os.environ.get("HEART_MODEL_REGISTRY", str(Path(__file__).parent / "models")))
+POINTER = "CURRENT"
+HISTORY = "HISTORY"
+MODEL_FILE = "model.pkl"
+META_FILE = "meta.json"
+# مسارات ملف النموذج القديم عندما يكون السجل فارغاً
+LEGACY_PATHS = [Path(__file__).parent / "heart_model.pkl", Path.cwd() / "heart_model.pkl"]
+
+
+def _root(root=None) -> Path:
+    return Path(root or DEFAULT_ROOT)
+
+
+def _atomic_write_text(path: Path, text: str):
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def version_path(version, root=None) -> Path:
+    return _root(root) / "versions" / version / MODEL_FILE
+
+
+def current_version(root=None):
+    p = _root(root) / POINTER
+    try:
+        return p.read_text(encoding="utf-8").strip() or None
+    except FileNotFoundError:
+        return None
+
+
+# بصمة المؤشر الحالية (تتغير مع كل تفعيل)؛ المراقبون يقارنونها دورياً بدلاً من قراءة الملف
+def pointer_stamp(root=None):
+    try:
+        st_ = (_root(root) / POINTER).stat()
+    except FileNotFoundError:
+        return None
+    return (st_.st_mtime_ns, st_.st_size, st_.st_ino)
+
+
+# النسخة الفعالة ومسارها؛ إن كان السجل فارغاً نعود لملف heart_model.pkl القديم (النسخة = None)
+def resolve(root=None, fallback=None):
+    version = current_version(root)
+    if version is not None:
+        p = version_path(version, root)
+        if p.exists():
+            return version, p
+    for p in (fallback or LEGACY_PATHS):
+        if Path(p).exists():
+            return None, Path(p)
+    raise FileNotFoundError("لم يتم العثور على ملف النموذج heart_model.pkl. ضع الملف في مجلد التطبيق.")
+
+
+def read_meta(version, root=None) -> dict:
+    p = _root(root) / "versions" / version / META_FILE
+    try:
+        with open(p, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"version": version}
+
+
+def list_versions(root=None):
+    vdir = _root(root) / "versions"
+    if not vdir.exists():
+        return []
+    out = [read_meta(p.name, root) for p in sorted(vdir.iterdir()) if (p / MODEL_FILE).exists()]
+    return sorted(out, key=lambda m: m.get("version", ""))
+
+
+def _jsonable(o):
+    # قيم numpy (أعداد ومصفوفات) إلى أنواع JSON
+    return o.tolist() if hasattr(o, "tolist") else str(o)
+
+
+def _sha256(path, block=1024 * 1024):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(block), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# نشر نسخة جديدة من حمولة (قاموس) أو من ملف موجود؛ النسخة لا تُعدَّل بعد نشرها
+# attachments: ملفات مرافقة تُحفظ في مجلد النسخة قبل ظهور model.pkl ({الاسم: كائن أو مسار ملف})
+def publish(payload=None, source=None, root=None, activate=True, note=None, attachments=None):
+    import joblib
+    root = _root(root)
+    vroot = root / "versions"
+    vroot.mkdir(parents=True, exist_ok=True)
+    tmp = vroot / f".incoming-{uuid.uuid4().hex}.pkl"
+    try:
+        if source is not None:
+            with open(source, "rb") as src, open(tmp, "wb") as dst:
+                for chunk in iter(lambda: src.read(1024 * 1024), b""):
+                    dst.write(chunk)
+                dst.flush()
+                os.fsync(dst.fileno())
+            if payload is None:
+                payload = joblib.load(str(tmp))
+        else:
+            joblib.dump(payload, tmp)
+        digest = _sha256(tmp)
+        version = f"{time.strftime('%Y%m%d-%H%M%S')}-{digest[:8]}"
+        vdir = vroot / version
+        if (vdir / MODEL_FILE).exists():
+            # نفس المحتوى نُشر في نفس الثانية: النسخة موجودة بالفعل
+            return activate_version(version, root) if activate else version
+        vdir.mkdir(exist_ok=True)
+        for name, obj in (attachments or {}).items():
+            if obj is None:
+                continue
+            if isinstance(obj, (str, Path)):
+                shutil.copyfile(obj, vdir / name)
+            else:
+                joblib.dump(obj, vdir / name)
+        meta = {"version": version, "sha256": digest, "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "size": os.path.getsize(tmp), "note": note}
+        if isinstance(payload, dict):
+            meta["features"] = payload.get("features")
+            metrics = payload.get("metrics") or {}
+            meta["accuracy"] = metrics.get("accuracy")
+            meta["cv_accuracy"] = ((metrics.get("cv") or {}).get("accuracy") or {}).get("mean")
+            # نسخة من الميتاداتا تكفي الصفحات التي تعرض المقاييس فقط دون فك حمولة النموذج (واستيراد sklearn)
+            for k in ("metrics", "target_mapping", "importance"):
+                meta[k] = payload.get(k)
+        _atomic_write_text(vdir / META_FILE, json.dumps(meta, ensure_ascii=False, indent=1, default=_jsonable))
+        os.replace(tmp, vdir / MODEL_FILE)
+        os.chmod(vdir / MODEL_FILE, 0o444)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    if activate:
+        activate_version(version, root)
+    return version
+
+
+# تفعيل نسخة: كتابة اسمها في ملف مؤقت ثم os.replace على CURRENT، وتسجيل التغيير في HISTORY
+def activate_version(version, root=None, _rollback=False):
+    root = _root(root)
+    if not version_path(version, root).exists():
+        raise FileNotFoundError(f"النسخة غير موجودة في السجل: {version}")
+    previous = current_version(root)
+    _atomic_write_text(root / POINTER, version + "\n")
+    entry = {"at": time.strftime("%Y-%m-%dT%H:%M:%S"), "from": previous, "to": version}
+    if _rollback:
+        entry["rollback"] = True
+    with open(root / HISTORY, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+    return version
+
+
+# سلسلة التفعيلات بعد استبعاد ما تم التراجع عنه (آخر عنصر = النسخة الفعالة)
+def _activation_stack(root):
+    try:
+        lines = (root / HISTORY).read_text(encoding="utf-8").splitlines()
+    except FileNotFoundError:
+        return []
+    stack = []
+    for line in lines:
+        entry = json.loads(line)
+        if entry.get("rollback"):
+            if stack:
+                stack.pop()
+        else:
+            stack.append(entry["to"])
+    return stack
+
+
+# التراجع إلى النسخة التي كانت فعالة قبل الحالية (تكرار التراجع يعود خطوة أخرى للخلف)
+def rollback(root=None):
+    root = _root(root)
+    stack = _activation_stack(root)
+    while len(stack) >= 2:
+        target = stack[-2]
+        if version_path(target, root).exists():
+            return activate_version(target, root, _rollback=True)
+        stack.pop(-2)
+    raise ValueError("لا توجد نسخة سابقة للتراجع إليها")
+
+
+# خيط يراقب المؤشر (بالاستطلاع الدوري لبصمته) ويستدعي on_change(version, path) عند تغيّره
+class ModelWatcher(threading.Thread):
+    def __init__(self, on_change, root=None, interval=1.0, fallback=None):
+        super().__init__(name="heart-model-watcher", daemon=True)
+        self.on_change = on_change
+        self.root = root
+        self.fallback = fallback
+        self.interval = float(interval)
+        self.stamp = pointer_stamp(root)
+        self._halt = threading.Event()
+
+    def run(self):
+        while not self._halt.wait(self.interval):
+            stamp = pointer_stamp(self.root)
+            if stamp == self.stamp:
+                continue
+            try:
+                version, path = resolve(self.root, self.fallback)
+                self.on_change(version, path)
+                self.stamp = stamp
+            except Exception as e:
+                # نبقي النموذج الحالي ونعيد المحاولة في الدورة التالية
+                print(f"[heart_registry] تعذر تحميل النسخة الجديدة: {e}", flush=True)
+
+    def stop(self):
+        self._halt.set()
+
+
+# النموذج الحي لعملية واحدة: الحمولة الحالية تُبدَّل بإسناد واحد بعد تحميل الجديدة كاملة،
+# فمن أخذ مرجع الحمولة القديمة يكمل تنبؤه بها
+class LiveModel:
+    def __init__(self, root=None, fallback=None, interval=None, watch=True):
+        from heart_inference import load_payload
+        self._load_payload = load_payload
+        self.root = root
+        self.fallback = fallback
+        version, path = resolve(root, fallback)
+        self._state = (version, path, load_payload(path), time.time())
+        self.watcher = None
+        interval = float(os.environ.get("HEART_MODEL_WATCH_SECONDS", "1")) if interval is None else interval
+        if watch and interval > 0:
+            self.watcher = ModelWatcher(self._swap, root, interval, fallback)
+            self.watcher.start()
+
+    def _swap(self, version, path):
+        if (version, str(path)) == (self._state[0], str(self._state[1])):
+            return
+        payload = self._load_payload(path)
+        self._state = (version, path, payload, time.time())
+
+    # فحص فوري (مثلاً بعد التفعيل من نفس العملية) دون انتظار دورة المراقبة
+    def refresh(self):
+        version, path = resolve(self.root, self.fallback)
+        self._swap(version, path)
+        if self.watcher is not None:
+            self.watcher.stamp = pointer_stamp(self.root)
+        return self.version
+
+    @property
+    def payload(self) -> dict:
+        return self._state[2]
+
+    @property
+    def version(self):
+        return self._state[0]
+
+    @property
+    def path(self):
+        return self._state[1]
+
+    @property
+    def loaded_at(self):
+        return self._state[3]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="سجل نسخ نموذج أمراض القلب")
+    ap.add_argument("--root", default=None, help="مجلد السجل (افتراضياً models/ أو HEART_MODEL_REGISTRY)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p_pub = sub.add_parser("publish", help="نشر ملف نموذج كنسخة جديدة وتفعيلها")
+    p_pub.add_argument("path")
+    p_pub.add_argument("--note", default=None)
+    p_pub.add_argument("--no-activate", action="store_true")
+    sub.add_parser("list", help="عرض النسخ")
+    sub.add_parser("current", help="النسخة الفعالة")
+    p_act = sub.add_parser("activate", help="تفعيل نسخة")
+    p_act.add_argument("version")
+    sub.add_parser("rollback", help="التراجع للنسخة السابقة")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "publish":
+        v = publish(source=args.path, root=args.root, activate=not args.no_activate, note=args.note)
+        print(f"✅ تم نشر النسخة {v}" + ("" if args.no_activate else " وتفعيلها"))
+    elif args.cmd == "list":
+        current = current_version(args.root)
+        for m in list_versions(args.root):
+            mark = "*" if m.get("version") == current else " "
+            acc = m.get("cv_accuracy") or m.get("accuracy")
+            print(f"{mark} {m['version']}  {m.get('created', '')}  "
+                  f"{'' if acc is None else f'acc={acc:.4f}'}  {m.get('note') or ''}")
+    elif args.cmd == "current":
+        print(current_version(args.root) or "(لا توجد نسخة فعالة؛ يُستخدم heart_model.pkl)")
+    elif args.cmd == "activate":
+        try:
+            print(f"✅ النسخة الفعالة: {activate_version(args.version, args.root)}")
+        except FileNotFoundError as e:
+            raise SystemExit(str(e))
+    else:
+        try:
+            print(f"✅ تم التراجع إلى: {rollback(args.root)}")
+        except ValueError as e:
+            raise SystemExit(str(e))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+# مخزن نتائج التنبؤ الدفعي: كل دفعة مُقيَّمة تُحفظ كمجموعة Parquet في heart_store باسم batch_id
+# (نفس رقم الدفعة في سجل التدقيق heart_audit)، فيمكن الاستعلام عنها لاحقاً دون إعادة رفع الملف أو التنبؤ
+# - كل جزء يُرتب تنازلياً حسب risk_percent قبل الكتابة، فتصير إحصاءات min/max لكل row group ضيقة
+#   وتتخطى شروط نطاق الخطر معظم البيانات دون قراءتها
+# - عمود row_no (رقم السطر في الملف الأصلي) وعمود age_band (رمز الفئة العمرية) يُضافان عند الحفظ
+# - الاستعلام عبر pyarrow.dataset: قراءة أعمدة الشروط فقط، عدّ وتجميع متجه، وصفحات بالمفتاح
+#   (risk_percent تنازلياً ثم row_no) بدل OFFSET، ثم قراءة الأعمدة الكاملة لسجلات الصفحة فقط
+#
+# أمثلة:
+#   python heart_results.py score --csv big.csv --model heart_model.pkl
+#   python heart_results.py list
+#   python heart_results.py query --batch <id> --risk-min 70 --sex 1 --cp 0 2
+#   python heart_results.py agg --batch <id> --by age_band sex
+import argparse
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from heart_store import append_frame, dataset_dir, list_datasets, partition_files, read_manifest
+
+DEFAULT_ROOT = Path(os.environ.get("HEART_RESULTS_DIR", str(Path(__file__).parent / "data" / "results")))
+BATCH_META = "_batch.json"
+
+# حدود الفئات العمرية (بداية كل فئة) ورموزها المخزنة في age_band
+AGE_EDGES = [40, 50, 60, 70]
+AGE_BANDS = ["<40", "40-49", "50-59", "60-69", "70+"]
+
+
+def age_band(age) -> np.ndarray:
+    return np.searchsorted(AGE_EDGES, np.asarray(age, dtype=float), side="right").astype(np.int64)
+
+
+def new_batch_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def _root(root):
+    return Path(root or DEFAULT_ROOT)
+
+
+def batch_dir(batch_id, root=None) -> Path:
+    return dataset_dir(batch_id, _root(root))
+
+
+def _prepare(out: pd.DataFrame, first_row=0) -> pd.DataFrame:
+    df = out.reset_index(drop=True)
+    df.insert(0, "row_no", np.arange(first_row, first_row + len(df), dtype=np.int64))
+    df["age_band"] = age_band(df["age"])
+    order = np.lexsort((df["row_no"].to_numpy(), -df["risk_percent"].to_numpy()))
+    return df.take(order)
+
+
+# حفظ جزء من نتائج دفعة (يمكن استدعاؤه عدة مرات لملف كبير يُقيَّم على أجزاء؛ first_row = رقم أول سطر في الجزء)
+def append_results(out: pd.DataFrame, batch_id, first_row=0, root=None, row_group_size=32_768):
+    append_frame(_prepare(out, first_row), batch_id, _root(root), row_group_size=row_group_size)
+
+
+def write_batch_meta(batch_id, root=None, **meta):
+    ddir = batch_dir(batch_id, root)
+    ddir.mkdir(parents=True, exist_ok=True)
+    meta = {"batch_id": batch_id, "created": time.strftime("%Y-%m-%dT%H:%M:%S"), **meta}
+    tmp = ddir / f"{BATCH_META}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, ddir / BATCH_META)
+
+
+# حفظ نتائج دفعة كاملة دفعة واحدة؛ يعيد batch_id (يُولّد إن لم يُعطَ)
+def save_results(out: pd.DataFrame, batch_id=None, root=None, **meta):
+    batch_id = batch_id or new_batch_id()
+    append_results(out, batch_id, root=root)
+    write_batch_meta(batch_id, root, n_rows=int(len(out)), **meta)
+    return batch_id
+
+
+def read_batch_meta(batch_id, root=None):
+    p = batch_dir(batch_id, root) / BATCH_META
+    if not p.exists():
+        return None
+    with open(p, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# الدفعات المحفوظة، الأحدث أولاً (الدفعة التي لم يكتمل حفظها بلا ميتاداتا فلا تظهر)
+def list_batches(root=None) -> list:
+    metas = [read_batch_meta(name, root) for name in list_datasets(_root(root))]
+    return sorted((m for m in metas if m), key=lambda m: m.get("created", ""), reverse=True)
+
+
+def batch_columns(batch_id, root=None) -> list:
+    manifest = read_manifest(batch_id, _root(root))
+    return list(manifest["schema"]) if manifest else []
+
+
+# الشروط: قائمة (col, op, value) بصيغة heart_store؛ الأجزاء تُتخطى بإحصاءات المانيفست ثم row groups بإحصاءات Parquet
+def _dataset(batch_id, filters, root):
+    files, arrow_filters = partition_files(batch_id, filters, _root(root))
+    expr = pq.filters_to_expression(arrow_filters) if arrow_filters else None
+    return (ds.dataset(files, format="parquet") if files else None), expr
+
+
+def count(batch_id, filters=None, root=None) -> int:
+    data, expr = _dataset(batch_id, filters, root)
+    return 0 if data is None else int(data.count_rows(filter=expr))
+
+
+# نطاق الخطر [min، max] لكل row group من تذييل ملف Parquet (دون قراءة البيانات)
+def _risk_ranges(frag):
+    md = frag.metadata
+    j = md.schema.names.index("risk_percent")
+    return [(md.row_group(i).column(j).statistics.min, md.row_group(i).column(j).statistics.max)
+            for i in range(md.num_row_groups)]
+
+
+# المرحلة الأولى من الصفحة: (risk_percent، row_no) لأفضل k سجلات مطابقة، والـ row groups التي قُرئت
+# row groups (المرتبة داخلياً بالخطر) تُقرأ من الأعلى خطراً حسب إحصاءاتها، ويتوقف المسح عندما لا تستطيع
+# أي مجموعة متبقية أن تتجاوز k-ي أفضل سجل، فالصفحة الأولى تقرأ بضع row groups لا الدفعة كلها
+# risk_range = حدود الخطر من الشروط والمؤشر، تُستبعد بها المجموعات خارج النطاق دون قراءتها
+def _top_keys(data, expr, k, risk_range=(-np.inf, np.inf)):
+    groups = []
+    for frag in data.get_fragments():
+        for i, (lo, hi) in enumerate(_risk_ranges(frag)):
+            if hi >= risk_range[0] and lo <= risk_range[1]:
+                groups.append((hi, frag, i))
+    groups.sort(key=lambda g: -g[0])
+    order = [("risk_percent", "descending"), ("row_no", "ascending")]
+    best, visited = None, []
+    for top, frag, i in groups:
+        if best is not None and best.num_rows >= k and top < best["risk_percent"][k - 1].as_py():
+            break
+        rg = frag.subset(row_group_ids=[i])
+        t = rg.to_table(columns=["risk_percent", "row_no"], filter=expr)
+        if t.num_rows == 0:
+            continue
+        visited.append(rg)
+        best = t if best is None else pa.concat_tables([best, t])
+        best = pc.take(best, pc.sort_indices(best, order)) if best.num_rows <= k else \
+            pc.take(best, pc.select_k_unstable(best, k, order))
+    return best, visited
+
+
+# صفحة من السجلات المطابقة مرتبة بالخطر تنازلياً؛ after = (risk_percent، row_no) لآخر سجل في الصفحة السابقة
+def page(batch_id, filters=None, after=None, page_size=50, columns=None, root=None) -> pd.DataFrame:
+    data, expr = _dataset(batch_id, filters, root)
+    if data is None:
+        return pd.DataFrame(columns=columns or batch_columns(batch_id, root))
+    risk, row = pc.field("risk_percent"), pc.field("row_no")
+    lo = max([v for c, o, v in filters or [] if c == "risk_percent" and o in (">", ">=")], default=-np.inf)
+    hi = min([v for c, o, v in filters or [] if c == "risk_percent" and o in ("<", "<=")], default=np.inf)
+    if after is not None:
+        r, n = float(after[0]), int(after[1])
+        cursor = (risk < r) | ((risk == r) & (row > n))
+        expr = cursor if expr is None else expr & cursor
+        hi = min(hi, r)
+    keys, visited = _top_keys(data, expr, page_size, (lo, hi))
+    if keys is None:
+        return pd.DataFrame(columns=columns or batch_columns(batch_id, root))
+    # المرحلة الثانية: الأعمدة الكاملة لسجلات الصفحة من الـ row groups التي قُرئت فقط
+    fetch = row.isin(keys["row_no"]) & (risk >= pc.min(keys["risk_percent"]))
+    df = pa.concat_tables([rg.to_table(columns=columns, filter=fetch) for rg in visited]).to_pandas()
+    return df.sort_values(["risk_percent", "row_no"], ascending=[False, True], ignore_index=True)
+
+
+# تجميع حسب أعمدة (رموز فئوية عادةً): العدد، عدد الإيجابيين، متوسط/أدنى/أعلى الخطر
+def aggregate(batch_id, by, filters=None, root=None) -> pd.DataFrame:
+    by = list(by)
+    cols = ["n", "n_positive", "mean_risk", "min_risk", "max_risk"]
+    data, expr = _dataset(batch_id, filters, root)
+    if data is None:
+        return pd.DataFrame(columns=by + cols)
+    t = data.to_table(columns=list(dict.fromkeys(by + ["risk_percent", "prediction"])), filter=expr)
+    if not by:
+        t = t.append_column("_all", pa.array(np.zeros(t.num_rows, dtype=np.int8)))
+    g = t.group_by(by or ["_all"]).aggregate([
+        ("risk_percent", "count"), ("prediction", "sum"), ("risk_percent", "mean"),
+        ("risk_percent", "min"), ("risk_percent", "max"),
+    ]).to_pandas()
+    g = g.rename(columns={"risk_percent_count": "n", "prediction_sum": "n_positive", "risk_percent_mean": "mean_risk",
+                          "risk_percent_min": "min_risk", "risk_percent_max": "max_risk"})
+    g = g.drop(columns=["_all"], errors="ignore")[by + cols]
+    g["positive_pct"] = np.round(g["n_positive"] / g["n"] * 100.0, 1)
+    g["mean_risk"] = np.round(g["mean_risk"], 2)
+    return g.sort_values(by, ignore_index=True) if by else g
+
+
+# توزيع الخطر للسجلات المطابقة: مدرج (حدود، أعداد) على مدى القيم وملخص نقاط مئوية؛ يُقرأ عمود الخطر وحده
+def risk_distribution(batch_id, filters=None, bins=40, root=None):
+    from heart_segments import risk_summary
+    data, expr = _dataset(batch_id, filters, root)
+    risk = np.empty(0) if data is None else \
+        data.to_table(columns=["risk_percent"], filter=expr).column(0).to_numpy()
+    if not len(risk):
+        return np.linspace(0.0, 100.0, bins + 1), np.zeros(bins, np.int64), risk_summary(risk)
+    counts, edges = np.histogram(risk, bins=bins)
+    return edges, counts, risk_summary(risk)
+
+
+# عينة عشوائية ثابتة من السجلات المطابقة (بحد أقصى n) لمخطط انتشار؛ تُقرأ الأعمدة المطلوبة فقط
+def sample_points(batch_id, columns, filters=None, n=None, seed=0, root=None) -> pd.DataFrame:
+    from heart_segments import SAMPLE_ROWS, sample_index
+    data, expr = _dataset(batch_id, filters, root)
+    if data is None:
+        return pd.DataFrame(columns=list(columns))
+    t = data.to_table(columns=list(columns), filter=expr)
+    return t.take(sample_index(t.num_rows, n or SAMPLE_ROWS, seed)).to_pandas()
+
+
+# شروط الاستعلام من قيم لوحة التصفية؛ القوائم الفارغة/None تعني "الكل"
+def build_filters(risk_min=None, risk_max=None, age_bands=None, sex=None, cp=None, exng=None, prediction=None):
+    filters = []
+    if risk_min is not None:
+        filters.append(("risk_percent", ">=", float(risk_min)))
+    if risk_max is not None:
+        filters.append(("risk_percent", "<=", float(risk_max)))
+    for col, values in (("age_band", age_bands), ("sex", sex), ("cp", cp), ("exng", exng), ("prediction", prediction)):
+        if values:
+            filters.append((col, "in", [int(v) for v in values]))
+    return filters
+
+
+# تقييم ملف CSV كبير على أجزاء وحفظ نتائجه (لا يُحمَّل الملف كاملاً في الذاكرة)، مع مكعب الشرائح مجمّعاً من الأجزاء
+def score_csv(path, model_path="heart_model.pkl", root=None, chunk_rows=500_000, batch_id=None):
+    from heart_inference import REQUIRED_FEATURES, load_payload, score_frame
+    from heart_segments import SegmentCube, build_cube, save_cube
+    payload = load_payload(model_path)
+    feats = list(payload.get("features") or REQUIRED_FEATURES)
+    batch_id = batch_id or new_batch_id()
+    rows = positive = 0
+    risk_sum = 0.0
+    cube = SegmentCube.empty()
+    for chunk in pd.read_csv(path, sep=None, engine="python", chunksize=chunk_rows):
+        chunk.columns = chunk.columns.str.strip()
+        out, has_proba = score_frame(payload["estimator"], chunk, feats)
+        append_results(out, batch_id, first_row=rows, root=root)
+        cube = cube + build_cube(out)
+        rows += len(out)
+        positive += int(out["prediction"].sum())
+        risk_sum += float(out["risk_percent"].sum())
+    save_cube(cube, batch_id, root)
+    write_batch_meta(batch_id, root, n_rows=rows, source=str(path), model_version=None, user=None,
+                     n_positive=positive, mean_risk=round(risk_sum / rows, 2) if rows else None)
+    return batch_id, rows
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="مخزن نتائج التنبؤ الدفعي والاستعلام عنها")
+    ap.add_argument("--root", default=None, help="مجلد النتائج (افتراضياً data/results أو HEART_RESULTS_DIR)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("score", help="تقييم ملف CSV على أجزاء وحفظ النتائج")
+    s.add_argument("--csv", required=True)
+    s.add_argument("--model", default="heart_model.pkl")
+    s.add_argument("--chunk-rows", type=int, default=500_000)
+    sub.add_parser("list", help="الدفعات المحفوظة")
+    for name in ("query", "agg"):
+        q = sub.add_parser(name, help="صفحة من السجلات المطابقة" if name == "query" else "تجميع حسب أعمدة")
+        q.add_argument("--batch", required=True)
+        q.add_argument("--risk-min", type=float, default=None)
+        q.add_argument("--risk-max", type=float, default=None)
+        q.add_argument("--age-band", type=int, nargs="*", default=None, help="رموز الفئات العمرية 0..4")
+        q.add_argument("--sex", type=int, nargs="*", default=None)
+        q.add_argument("--cp", type=int, nargs="*", default=None)
+        q.add_argument("--exng", type=int, nargs="*", default=None)
+        if name == "query":
+            q.add_argument("--limit", type=int, default=20)
+        else:
+            q.add_argument("--by", nargs="+", default=["age_band"])
+    args = ap.parse_args(argv)
+
+    if args.cmd == "score":
+        t0 = time.perf_counter()
+        batch_id, rows = score_csv(args.csv, args.model, args.root, args.chunk_rows)
+        print(f"✅ {rows:,} سجل خلال {time.perf_counter() - t0:.1f} ث → الدفعة {batch_id}")
+        return
+    if args.cmd == "list":
+        for m in list_batches(args.root):
+            print(f"{m['batch_id']}  {m.get('created', '')}  {m.get('n_rows', 0):>12,} سجل  {m.get('source') or ''}")
+        return
+    filters = build_filters(args.risk_min, args.risk_max, args.age_band, args.sex, args.cp, args.exng)
+    t0 = time.perf_counter()
+    with pd.option_context("display.width", 200, "display.max_columns", 30):
+        if args.cmd == "query":
+            n = count(args.batch, filters, args.root)
+            print(page(args.batch, filters, page_size=args.limit, root=args.root).to_string(index=False))
+            print(f"{n:,} سجل مطابق")
+        else:
+            print(aggregate(args.batch, args.by, filters, args.root).to_string(index=False))
+    print(f"⏱️ {(time.perf_counter() - t0) * 1000:.0f} ميلي ثانية")
+
+
+if __name__ == "__main__":
+    main()
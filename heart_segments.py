@@ -0,0 +1,170 @@
+# مكعب الشرائح لنتائج دفعة: الفئة العمرية × الجنس × cp × exng (5×2×4×2 = 80 خلية)
+# - يُبنى وقت التقييم بمرور متجه واحد: رمز خلية مضغوط لكل سجل ثم np.bincount للعدد والإيجابيين ومجموع الخطر
+#   ومجموع مربعاته، ومدرج تكراري للخطر (20 فئة بعرض 5%) لكل خلية
+# - كل عروض التفصيل (جدول/خريطة حرارية حسب بعدين، مدرج شريحة) تُحسب بجمع محاور المكعب، دون إعادة مسح السجلات
+# - المكعبات قابلة للجمع (+) فملف كبير يُقيَّم على أجزاء يبني مكعبه جزءاً جزءاً، ويُحفظ مع النتائج (npz)
+import numpy as np
+import pandas as pd
+
+from heart_results import AGE_BANDS, age_band, batch_dir
+
+# البعد: تسميات رموزه (الرمز = موضع التسمية)
+DIMENSIONS = {
+    "age_band": AGE_BANDS,
+    "sex": ["أنثى", "ذكر"],
+    "cp": ["0", "1", "2", "3"],
+    "exng": ["لا", "نعم"],
+}
+HIST_BINS = 20
+HIST_EDGES = np.linspace(0.0, 100.0, HIST_BINS + 1)
+CUBE_FILE = "_cube.npz"
+SUMMARY_QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+SAMPLE_ROWS = 5000
+
+
+class SegmentCube:
+    def __init__(self, counts, positives, risk_sum, risk_sq, hist, n_excluded=0):
+        self.dims = list(DIMENSIONS)
+        self.counts = counts
+        self.positives = positives
+        self.risk_sum = risk_sum
+        self.risk_sq = risk_sq
+        self.hist = hist
+        self.n_excluded = int(n_excluded)
+
+    @classmethod
+    def empty(cls):
+        shape = tuple(len(v) for v in DIMENSIONS.values())
+        return cls(np.zeros(shape, np.int64), np.zeros(shape, np.int64), np.zeros(shape), np.zeros(shape),
+                   np.zeros(shape + (HIST_BINS,), np.int64))
+
+    @property
+    def n_rows(self):
+        return int(self.counts.sum())
+
+    def __add__(self, other):
+        return SegmentCube(self.counts + other.counts, self.positives + other.positives,
+                           self.risk_sum + other.risk_sum, self.risk_sq + other.risk_sq, self.hist + other.hist,
+                           self.n_excluded + other.n_excluded)
+
+    # where = {بعد: [رموز]} يحصر الخلايا؛ الأبعاد غير المذكورة تبقى كاملة
+    def _cells(self, arrays, where):
+        index = tuple(sorted(set(int(v) for v in where[d])) if where and where.get(d) else slice(None)
+                      for d in self.dims)
+        out = arrays
+        # فهرسة كل محور على حدة (np.ix_ لا يقبل slice)
+        for axis, idx in enumerate(index):
+            if not isinstance(idx, slice):
+                out = [np.take(a, idx, axis=axis) for a in out]
+        return out
+
+    # جدول حسب أبعاد by (بعد أو اثنان عادةً): العدد، الإيجابيون ونسبتهم، متوسط الخطر وانحرافه المعياري
+    # (مستويات الفهرس بترتيب أبعاد المكعب)
+    def table(self, by, where=None) -> pd.DataFrame:
+        by = list(by)
+        counts, pos, rsum, rsq = self._cells([self.counts, self.positives, self.risk_sum, self.risk_sq], where)
+        axes = tuple(i for i, d in enumerate(self.dims) if d not in by)
+        n, p, s, q = (a.sum(axis=axes) for a in (counts, pos, rsum, rsq))
+        kept = [d for d in self.dims if d in by]
+        labels = [self._labels(d, where) for d in kept]
+        index = pd.MultiIndex.from_product(labels, names=kept) if kept else pd.RangeIndex(1)
+        n, p, s, q = (np.atleast_1d(a).reshape(-1) for a in (n, p, s, q))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = s / n
+            std = np.sqrt(np.maximum(q / n - mean ** 2, 0.0))
+        return pd.DataFrame({"n": n, "n_positive": p, "positive_pct": np.round(p / np.maximum(n, 1) * 100.0, 1),
+                             "mean_risk": np.round(mean, 2), "std_risk": np.round(std, 2)}, index=index)
+
+    def _labels(self, dim, where):
+        codes = sorted(set(int(v) for v in where[dim])) if where and where.get(dim) else range(len(DIMENSIONS[dim]))
+        return [DIMENSIONS[dim][c] for c in codes]
+
+    # مصفوفة (صفوف × أعمدة) لقيمة metric ("mean_risk" أو "positive_pct" أو "n") وعدد السجلات لكل خلية
+    def pivot(self, rows, cols, metric="mean_risk", where=None):
+        t = self.table([rows, cols], where)
+        # unstack يرتب التسميات أبجدياً؛ نعيدها لترتيب الرموز (<40 قبل 40-49)
+        order = {"index": self._labels(rows, where), "columns": self._labels(cols, where)}
+        return t[metric].unstack(cols).reindex(**order), t["n"].unstack(cols).reindex(**order)
+
+    # المدرج التكراري للخطر لشريحة: (حدود الفئات، العدد في كل فئة)
+    def histogram(self, where=None):
+        (hist,) = self._cells([self.hist], where)
+        return HIST_EDGES, hist.reshape(-1, HIST_BINS).sum(axis=0)
+
+    def save(self, path):
+        np.savez_compressed(path, counts=self.counts, positives=self.positives, risk_sum=self.risk_sum,
+                            risk_sq=self.risk_sq, hist=self.hist, n_excluded=self.n_excluded)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as z:
+            return cls(z["counts"], z["positives"], z["risk_sum"], z["risk_sq"], z["hist"], int(z["n_excluded"]))
+
+
+# رموز بعد واحد كأعداد صحيحة، وقناع السجلات ذات الرمز الصالح (0..size-1)
+def _dim_codes(values, size):
+    values = np.asarray(values)
+    if not np.issubdtype(values.dtype, np.integer):
+        values = np.asarray(values, dtype=float)
+        whole = np.isfinite(values) & (values == np.floor(values))
+        values = np.where(whole, values, -1).astype(np.int64)
+    valid = (values >= 0) & (values < size)
+    return np.where(valid, values, 0), valid
+
+
+# بناء المكعب من نتائج مُقيَّمة (أعمدة age/sex/cp/exng و prediction و risk_percent)
+# السجلات ذات الرموز خارج المدى المعروف (مثل cp=4) تُستبعد وتُعدّ في n_excluded
+def build_cube(out: pd.DataFrame) -> SegmentCube:
+    shape = tuple(len(v) for v in DIMENSIONS.values())
+    parts = [out["age_band"].to_numpy() if "age_band" in out.columns else age_band(out["age"])]
+    parts += [out[d].to_numpy() if pd.api.types.is_numeric_dtype(out[d]) else
+              pd.to_numeric(out[d], errors="coerce").to_numpy() for d in list(DIMENSIONS)[1:]]
+    code = np.zeros(len(out), dtype=np.int64)
+    valid = np.ones(len(out), dtype=bool)
+    for values, size in zip(parts, shape):
+        c, ok = _dim_codes(values, size)
+        code = code * size + c
+        valid &= ok
+    if not valid.all():
+        code = code[valid]
+    risk = out["risk_percent"].to_numpy(dtype=float)
+    pos = out["prediction"].to_numpy() == 1
+    if not valid.all():
+        risk, pos = risk[valid], pos[valid]
+    cells = int(np.prod(shape))
+    b = np.minimum((risk * (HIST_BINS / 100.0)).astype(np.int64), HIST_BINS - 1)
+    return SegmentCube(
+        np.bincount(code, minlength=cells).reshape(shape),
+        np.bincount(code[pos], minlength=cells).reshape(shape),
+        np.bincount(code, weights=risk, minlength=cells).reshape(shape),
+        np.bincount(code, weights=risk * risk, minlength=cells).reshape(shape),
+        np.bincount(code * HIST_BINS + b, minlength=cells * HIST_BINS).reshape(shape + (HIST_BINS,)),
+        n_excluded=int(len(valid) - valid.sum()),
+    )
+
+
+# المكعب يُحفظ بجانب أجزاء الدفعة في مخزن النتائج
+def save_cube(cube: SegmentCube, batch_id, root=None):
+    cube.save(batch_dir(batch_id, root) / CUBE_FILE)
+
+
+def load_cube(batch_id, root=None):
+    path = batch_dir(batch_id, root) / CUBE_FILE
+    return SegmentCube.load(path) if path.exists() else None
+
+
+# ملخص توزيع الخطر بأرقام قليلة: العدد، المتوسط، الانحراف المعياري، الأدنى والأعلى، ونقاط مئوية (p1، p5، ... p99)
+def risk_summary(risk) -> dict:
+    risk = np.asarray(risk, dtype=float)
+    if not len(risk):
+        return {"n": 0}
+    q = np.quantile(risk, SUMMARY_QUANTILES)
+    return {"n": int(len(risk)), "mean": float(risk.mean()), "std": float(risk.std()), "min": float(risk.min()),
+            **{f"p{int(round(p * 100))}": float(v) for p, v in zip(SUMMARY_QUANTILES, q)}, "max": float(risk.max())}
+
+
+# مواضع عينة عشوائية ثابتة (ببذرة) من n سجل بحد أقصى k، مرتبة تصاعدياً
+def sample_index(n, k=SAMPLE_ROWS, seed=0) -> np.ndarray:
+    if n <= k:
+        return np.arange(n)
+    return np.sort(np.random.default_rng(seed).choice(n, size=k, replace=False))
@@ -0,0 +1,332 @@
+# خدمة HTTP محلية خفيفة للتنبؤ (بدون Streamlit) لتستدعيها الأنظمة الأخرى برمجياً
+# - تحمّل نفس ملف النموذج الذي تحمّله load_model في التطبيق
+# - نقاط النهاية:
+#     GET  /healthz              العملية تعمل
+#     GET  /readyz               النموذج محمّل وجاهز (503 قبل ذلك)
+#     GET  /v1/model             الميزات والمقاييس
+#     POST /v1/predict           JSON لسجل واحد → {"prediction": 0/1, "risk_percent": 48.49}
+#     POST /v1/predict/batch     NDJSON (سجل في كل سطر) أو CSV → نفس الصيغة مع prediction و risk_percent
+# - كل تنبؤ يُسجَّل في سجل التدقيق (heart_audit) باسم المستخدم من ترويسة X-User (افتراضياً "api")؛ HEART_AUDIT=0 لتعطيله
+# - عدة عمليات عاملة (prefork): النموذج يُحمَّل مرة في العملية الأم ثم تتقاسمه العمليات عبر fork
+#   (على Windows تعمل عملية واحدة متعددة الخيوط)
+#
+# أمثلة:
+#   python heart_service.py --port 8600 --workers 4
+#   curl -s localhost:8600/v1/predict -d '{"age":63,"sex":1,"cp":3,"trtbps":145,"chol":233,"fbs":1,"restecg":0,"thalachh":150,"exng":0,"oldpeak":2.3,"slp":0,"caa":0,"thall":1}'
+#   curl -s localhost:8600/v1/predict/batch -H "Content-Type: text/csv" --data-binary @examples/heart_sample.csv
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+
+from heart_audit import AuditLog
+from heart_inference import REQUIRED_FEATURES, load_payload, predict_batch, score_frame, to_frame, warm_up
+
+MAX_BODY_BYTES = int(os.environ.get("HEART_SERVICE_MAX_BODY_MB", "64")) * 1024 * 1024
+
+
+class LoadedModel:
+    def __init__(self, path, version=None):
+        t0 = time.perf_counter()
+        self.payload = load_payload(path)
+        self.features = list(self.payload.get("features") or REQUIRED_FEATURES)
+        self.estimator = self.payload["estimator"]
+        self.version = version
+        self.load_seconds = time.perf_counter() - t0
+        # تنبؤات تجريبية: تتأكد أن النموذج يعمل وتُحمّي المسارات قبل إعلان الجاهزية
+        self.warmup = warm_up(lambda row: predict_batch(self.estimator, to_frame(row, self.features)), self.features)
+
+    def timings(self):
+        return {"load_s": round(self.load_seconds, 3), "first_predict_ms": round(self.warmup[0] * 1000, 2),
+                "warm_predict_ms": round(self.warmup[-1] * 1000, 2)}
+
+
+class ModelState:
+    def __init__(self):
+        # كل طلب يأخذ مرجع current مرة واحدة؛ إعادة التحميل تبدّله بإسناد واحد فلا يتأثر طلب جارٍ
+        self.current = None
+        self.broker = None
+        self.watcher = None
+        # خيط الكاتب يبدأ عند أول تسجيل داخل كل عملية عاملة، فإنشاؤه قبل fork آمن
+        self.audit = AuditLog() if os.environ.get("HEART_AUDIT", "1") != "0" else None
+
+    @property
+    def ready(self):
+        return self.current is not None
+
+    def load(self, path, version=None):
+        self.current = LoadedModel(path, version)
+
+    # عند عدم تحديد ملف نموذج صريح: متابعة مؤشر سجل النماذج وإعادة التحميل عند تفعيل نسخة جديدة
+    def watch_registry(self):
+        from heart_registry import ModelWatcher, resolve
+        self.watcher = ModelWatcher(lambda version, path: self.load(path, version))
+        # عملية عاملة أُعيد إنشاؤها قد ترث نموذجاً أقدم من النسخة الفعالة الآن
+        version, path = resolve()
+        if self.current is None or self.current.version != version:
+            self.load(path, version)
+        self.watcher.start()
+
+    # الوسيط (خيط) يُنشأ داخل كل عملية عاملة بعد fork، لأن الخيوط لا تنتقل عبر fork
+    def start_broker(self):
+        if os.environ.get("HEART_BROKER", "1") != "0":
+            from heart_broker import PredictionBroker
+            self.broker = PredictionBroker()
+
+
+STATE = ModelState()
+
+
+# نفس قاعدة score_frame في المسارات الدفعية: دون احتمالات يُستخدم التصنيف (0 أو 100) مرجعاً تقريبياً
+def _single_result(pred, proba):
+    return {"prediction": int(pred), "risk_percent": round(float(pred if proba is None else proba) * 100.0, 2)}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "HeartService/1.0"
+
+    def log_message(self, fmt, *args):
+        if os.environ.get("HEART_SERVICE_ACCESS_LOG") == "1":
+            super().log_message(fmt, *args)
+
+    def _send(self, status, body, content_type="application/json; charset=utf-8"):
+        if not isinstance(body, (bytes, bytearray)):
+            body = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, message):
+        self._send(status, {"error": message})
+
+    def _user(self):
+        return self.headers.get("X-User") or "api"
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            raise OverflowError(f"حجم الطلب أكبر من الحد المسموح ({MAX_BODY_BYTES // (1024 * 1024)}MB)")
+        return self.rfile.read(length) if length else b""
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/healthz":
+            self._send(200, {"status": "ok", "pid": os.getpid()})
+        elif path == "/readyz":
+            cur = STATE.current
+            body = {"ready": cur is not None}
+            if cur is not None:
+                body.update(version=cur.version, **cur.timings())
+            self._send(200 if cur is not None else 503, body)
+        elif path == "/v1/model":
+            if not STATE.ready:
+                return self._error(503, "النموذج غير جاهز بعد")
+            cur = STATE.current
+            self._send(200, {"version": cur.version, "features": cur.features, "metrics": cur.payload.get("metrics"),
+                             "target_mapping": cur.payload.get("target_mapping")})
+        else:
+            self._error(404, "مسار غير موجود")
+
+    def do_POST(self):
+        path = self.path.split("?", 1)[0]
+        if not STATE.ready:
+            return self._error(503, "النموذج غير جاهز بعد")
+        try:
+            body = self._read_body()
+        except OverflowError as e:
+            self.close_connection = True
+            return self._error(413, str(e))
+        try:
+            if path == "/v1/predict":
+                self._predict_single(body)
+            elif path == "/v1/predict/batch":
+                self._predict_batch(body)
+            else:
+                self._error(404, "مسار غير موجود")
+        except (ValueError, KeyError, TypeError) as e:
+            self._error(400, str(e))
+        except Exception as e:
+            self._error(500, f"{type(e).__name__}: {e}")
+
+    # سجل واحد: كائن JSON بأسماء الميزات، أو {"features": [قيم بالترتيب]}
+    def _predict_single(self, body):
+        cur = STATE.current
+        data = json.loads(body or b"{}")
+        if isinstance(data, dict) and isinstance(data.get("features"), list):
+            values = data["features"]
+        elif isinstance(data, dict):
+            missing = [c for c in cur.features if c not in data]
+            if missing:
+                raise ValueError("الأعمدة الناقصة: " + ", ".join(missing))
+            values = [data[c] for c in cur.features]
+        else:
+            raise ValueError("المتوقع كائن JSON لسجل واحد")
+        X = to_frame([values], cur.features)
+        model = cur.estimator
+        if STATE.broker is not None:
+            pred, proba = STATE.broker.predict(model, X)
+        else:
+            preds, probas = predict_batch(model, X)
+            pred, proba = preds[0], None if probas is None else probas[0]
+        if STATE.audit is not None:
+            STATE.audit.log_single(X.to_numpy()[0], cur.features, pred, proba, self._user(), cur.version)
+        self._send(200, _single_result(pred, proba))
+
+    # دفعة: CSV (يُعاد CSV بنفس الأعمدة + prediction و risk_percent، و risk_std/low/high للغابات) أو NDJSON (سطر نتيجة لكل سطر إدخال)
+    def _predict_batch(self, body):
+        cur = STATE.current
+        ctype = (self.headers.get("Content-Type") or "").split(";")[0].strip().lower()
+        text = body.decode("utf-8-sig")
+        if ctype in ("text/csv", "application/csv"):
+            df = pd.read_csv(StringIO(text), sep=None, engine="python")
+            df.columns = df.columns.str.strip()
+            out, has_proba = score_frame(cur.estimator, _numeric(df, cur.features), cur.features)
+            self._audit_batch(out, has_proba, cur, "csv")
+            buf = StringIO()
+            out.to_csv(buf, index=False)
+            return self._send(200, buf.getvalue().encode("utf-8"), "text/csv; charset=utf-8")
+        records = [json.loads(line) for line in text.splitlines() if line.strip()]
+        if not records:
+            return self._send(200, b"", "application/x-ndjson")
+        df = pd.DataFrame.from_records(records)
+        out, has_proba = score_frame(cur.estimator, _numeric(df, cur.features), cur.features)
+        self._audit_batch(out, has_proba, cur, "ndjson")
+        cols = ["risk_percent"] + [c for c in ("risk_std", "risk_low", "risk_high") if c in out.columns]
+        values = out[cols].to_numpy(dtype=float)
+        lines = [json.dumps({"prediction": int(p), **dict(zip(cols, map(float, v)))})
+                 for p, v in zip(out["prediction"].to_numpy(), values)]
+        self._send(200, ("\n".join(lines) + "\n").encode("utf-8"), "application/x-ndjson")
+
+    def _audit_batch(self, out, has_proba, cur, source):
+        if STATE.audit is not None:
+            STATE.audit.log_batch(out, cur.features, out["prediction"], out["risk_percent"] if has_proba else None,
+                                  self._user(), cur.version, source)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # طابور اتصالات أطول من الافتراضي (5) حتى لا تُرفض الاتصالات تحت الحمل
+    request_queue_size = 256
+
+
+# تحويل أعمدة الميزات إلى أرقام ورفض القيم الناقصة (مع رقم أول سطر خاطئ)
+def _numeric(df: pd.DataFrame, feats):
+    missing = [c for c in feats if c not in df.columns]
+    if missing:
+        raise ValueError("الأعمدة الناقصة: " + ", ".join(missing))
+    df = df.copy()
+    for c in feats:
+        df[c] = pd.to_numeric(df[c], errors="coerce")
+    bad = df[feats].isna().any(axis=1).to_numpy()
+    if bad.any():
+        raise ValueError(f"قيم غير رقمية/ناقصة في السطر {int(np.argmax(bad)) + 1}")
+    return df
+
+
+def _serve(server, watch=False):
+    STATE.start_broker()
+    if watch:
+        STATE.watch_registry()
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+# العملية الأم: تفتح المنفذ وتحمّل النموذج ثم تنشئ العمليات العاملة وتعيد تشغيل أي عملية تتوقف
+def run(host="127.0.0.1", port=8600, workers=1, model_path=None):
+    server = _Server((host, port), Handler)
+    # بدون --model نتبع سجل النماذج ونعيد التحميل تلقائياً عند تفعيل نسخة جديدة
+    watch = model_path is None
+    version = None
+    if watch:
+        from heart_registry import resolve
+        version, model_path = resolve()
+
+    def load():
+        t0 = time.perf_counter()
+        STATE.load(model_path, version)
+        t = STATE.current.timings()
+        print(f"✅ النموذج جاهز خلال {time.perf_counter() - t0:.2f} ث (تحميل {t['load_s']:.2f} ث، "
+              f"أول تنبؤ {t['first_predict_ms']:.1f}ms ثم {t['warm_predict_ms']:.1f}ms) — "
+              f"http://{host}:{port} ({workers} عملية)", flush=True)
+
+    if workers <= 1 or not hasattr(os, "fork"):
+        # عملية واحدة: نبدأ الاستماع فوراً (/healthz يعمل و /readyz يعيد 503) والتحميل يجري في الخلفية
+        def load_then_watch():
+            load()
+            if watch:
+                STATE.watch_registry()
+        threading.Thread(target=load_then_watch, daemon=True).start()
+        try:
+            _serve(server)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    # عدة عمليات: التحميل قبل fork حتى تتقاسم العمليات ذاكرة النموذج
+    load()
+
+    children = set()
+    stopping = threading.Event()
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                _serve(server, watch)
+            finally:
+                os._exit(0)
+        children.add(pid)
+
+    def stop(*_):
+        stopping.set()
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+    while children:
+        try:
+            pid, _ = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        children.discard(pid)
+        if not stopping.is_set():
+            spawn()
+    server.server_close()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="خدمة HTTP للتنبؤ بأمراض القلب")
+    ap.add_argument("--host", default=os.environ.get("HEART_SERVICE_HOST", "127.0.0.1"))
+    ap.add_argument("--port", type=int, default=int(os.environ.get("HEART_SERVICE_PORT", "8600")))
+    ap.add_argument("--workers", type=int, default=int(os.environ.get("HEART_SERVICE_WORKERS", str(os.cpu_count() or 1))))
+    ap.add_argument("--model", default=None, help="مسار ملف نموذج ثابت (افتراضياً النسخة الفعالة في سجل النماذج مع إعادة تحميل تلقائية)")
+    args = ap.parse_args(argv)
+    run(args.host, args.port, args.workers, args.model)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
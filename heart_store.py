@@ -0,0 +1,327 @@
+# مخزن بيانات محلي بصيغة Parquet مقسّمة بدلاً من ملفات CSV المتفرقة
+# البنية: <root>/<dataset>/part-XXXXX.parquet + _manifest.json (المخطط، عدد الصفوف، إحصاءات min/max لكل جزء)
+# - ingest: تحويل ملفات CSV (بفاصل "," أو ";") مرة واحدة فقط
+# - read_dataset: قراءة مع اختيار الأعمدة (projection) وتمرير الشروط (predicate pushdown)
+#   على مستويين: تخطّي الأجزاء كلياً بإحصاءات المانيفست، ثم تصفية row groups داخل Parquet
+#
+# أمثلة:
+#   python heart_store.py ingest "heart (1).csv" heart_comma.csv --dataset heart
+#   python heart_store.py list
+#   python heart_store.py info --dataset heart
+import argparse
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+DEFAULT_ROOT = Path(os.environ.get("HEART_STORE_DIR", str(Path(__file__).parent / "data" / "store")))
+MANIFEST = "_manifest.json"
+
+_OPS = {"==", "=", "!=", "<", "<=", ">", ">=", "in", "not in"}
+
+
+def dataset_dir(dataset="heart", root=None) -> Path:
+    return Path(root or DEFAULT_ROOT) / dataset
+
+
+def read_manifest(dataset="heart", root=None):
+    p = dataset_dir(dataset, root) / MANIFEST
+    if not p.exists():
+        return None
+    with open(p, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# نسخة المانيفست (تتغير مع كل كتابة) لاستخدامها كمفتاح للذاكرة المؤقتة في الواجهة
+def manifest_version(dataset="heart", root=None):
+    p = dataset_dir(dataset, root) / MANIFEST
+    return p.stat().st_mtime_ns if p.exists() else None
+
+
+def list_datasets(root=None):
+    root = Path(root or DEFAULT_ROOT)
+    if not root.exists():
+        return []
+    return sorted(p.name for p in root.iterdir() if (p / MANIFEST).exists())
+
+
+def _write_manifest(ddir: Path, manifest: dict):
+    tmp = ddir / f"{MANIFEST}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, ddir / MANIFEST)
+
+
+# قفل بسيط على مستوى المجموعة حتى لا يضيع تحديث مانيفست عند كتابتين متزامنتين
+class _DatasetLock:
+    def __init__(self, ddir: Path):
+        self.path = ddir / "_lock"
+
+    def __enter__(self):
+        self.f = open(self.path, "a+")
+        if fcntl is not None:
+            fcntl.flock(self.f.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self.f.fileno(), fcntl.LOCK_UN)
+        self.f.close()
+
+
+# تطبيع أنواع الأعمدة: int64 / float64 / string
+def _normalize(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    df.columns = [str(c).strip() for c in df.columns]
+    for c in df.columns:
+        if pd.api.types.is_bool_dtype(df[c]) or pd.api.types.is_integer_dtype(df[c]):
+            df[c] = df[c].astype("int64")
+        elif pd.api.types.is_float_dtype(df[c]):
+            df[c] = df[c].astype("float64")
+        else:
+            df[c] = df[c].astype("string")
+    return df
+
+
+def _schema_of(df: pd.DataFrame):
+    return {c: str(t) for c, t in df.dtypes.items()}
+
+
+# مواءمة جزء جديد مع مخطط المجموعة (ترقية int→float مسموحة فقط إذا كان المخطط float)
+def _conform(df: pd.DataFrame, schema: dict) -> pd.DataFrame:
+    missing = [c for c in schema if c not in df.columns]
+    extra = [c for c in df.columns if c not in schema]
+    if missing or extra:
+        raise ValueError(f"المخطط غير متطابق. أعمدة ناقصة: {missing}، أعمدة زائدة: {extra}")
+    df = df[list(schema)]
+    for c, t in schema.items():
+        if str(df[c].dtype) != t:
+            if t == "float64" and str(df[c].dtype) == "int64":
+                df[c] = df[c].astype("float64")
+            elif t == "int64" and str(df[c].dtype) == "float64" and np.all(np.mod(df[c].dropna(), 1) == 0):
+                df[c] = df[c].astype("int64")
+            else:
+                raise ValueError(f"نوع العمود {c} ({df[c].dtype}) لا يطابق مخطط المجموعة ({t})")
+    return df
+
+
+def _column_stats(df: pd.DataFrame):
+    stats = {}
+    for c in df.columns:
+        s = df[c]
+        entry = {"nulls": int(s.isna().sum())}
+        if pd.api.types.is_numeric_dtype(s) and s.notna().any():
+            entry["min"] = float(s.min())
+            entry["max"] = float(s.max())
+        stats[c] = entry
+    return stats
+
+
+def _new_manifest(dataset, schema):
+    return {"dataset": dataset, "schema": schema, "partitions": [], "sources": [], "total_rows": 0,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+# كتابة جزء إلى ملف مؤقت داخل المجموعة دون اعتماده: (المسار المؤقت، مدخل المانيفست بلا اسم الملف)
+def _stage_part(ddir: Path, df: pd.DataFrame, row_group_size):
+    tmp = ddir / f"_staged-{uuid.uuid4().hex}.parquet.tmp"
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp, row_group_size=row_group_size)
+    return tmp, {"rows": int(len(df)), "stats": _column_stats(df)}
+
+
+# اعتماد أجزاء مجهزة (داخل _DatasetLock): تسميتها بأسمائها النهائية ثم كتابة واحدة للمانيفست مع المصدر إن وُجد؛
+# انقطاع قبل كتابة المانيفست يترك ملفات غير مُدرجة فيه لا يراها القراء
+def _commit_parts(ddir: Path, manifest: dict, staged, source=None):
+    names = []
+    for tmp, entry in staged:
+        name = f"part-{len(manifest['partitions']):05d}-{uuid.uuid4().hex[:8]}.parquet"
+        os.replace(tmp, ddir / name)
+        manifest["partitions"].append({"file": name, **entry})
+        manifest["total_rows"] = int(manifest["total_rows"] + entry["rows"])
+        names.append(name)
+    if source is not None:
+        manifest["sources"].append(source)
+    manifest["updated"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    _write_manifest(ddir, manifest)
+    return names
+
+
+# إضافة DataFrame كجزء جديد إلى المجموعة؛ الكتابة ذرّية والمانيفست يُحدَّث أخيراً
+def append_frame(df: pd.DataFrame, dataset="heart", root=None, row_group_size=100_000):
+    ddir = dataset_dir(dataset, root)
+    ddir.mkdir(parents=True, exist_ok=True)
+    df = _normalize(df)
+    with _DatasetLock(ddir):
+        manifest = read_manifest(dataset, root) or _new_manifest(dataset, _schema_of(df))
+        staged = [_stage_part(ddir, _conform(df, manifest["schema"]), row_group_size)]
+        try:
+            return _commit_parts(ddir, manifest, staged)[0]
+        finally:
+            staged[0][0].unlink(missing_ok=True)
+
+
+def _sniff_sep(path):
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        line = f.readline()
+    return ";" if line.count(";") > line.count(",") else ","
+
+
+def _source_id(path):
+    st_ = os.stat(path)
+    return {"path": str(Path(path).resolve()), "size": int(st_.st_size), "mtime": int(st_.st_mtime)}
+
+
+def _source_key(source):
+    return source["path"], source["size"], source["mtime"]
+
+
+# تحويل ملفات CSV إلى أجزاء Parquet مرة واحدة؛ الملف الذي سبق إدخاله (نفس المسار والحجم والتاريخ) يُتخطّى
+# أجزاء كل ملف تُجهَّز كملفات مؤقتة ثم تُعتمد مع مدخل المصدر في كتابة مانيفست واحدة: ملف فشل أو انقطع في منتصفه
+# لا يترك شيئاً معتمداً، فإعادة الإدخال لا تكرر صفوفه
+def ingest_csv(paths, dataset="heart", root=None, chunk_rows=500_000, row_group_size=100_000):
+    ddir = dataset_dir(dataset, root)
+    added = {}
+    for path in paths:
+        sid = _source_id(path)
+        manifest = read_manifest(dataset, root) or {}
+        if _source_key(sid) in {_source_key(s) for s in manifest.get("sources", [])}:
+            added[str(path)] = 0
+            continue
+        ddir.mkdir(parents=True, exist_ok=True)
+        schema = manifest.get("schema")
+        staged, rows = [], 0
+        try:
+            for chunk in pd.read_csv(path, sep=_sniff_sep(path), chunksize=chunk_rows):
+                chunk = _normalize(chunk)
+                schema = schema or _schema_of(chunk)
+                staged.append(_stage_part(ddir, _conform(chunk, schema), row_group_size))
+                rows += len(chunk)
+            with _DatasetLock(ddir):
+                manifest = read_manifest(dataset, root) or _new_manifest(dataset, schema)
+                if _source_key(sid) in {_source_key(s) for s in manifest["sources"]}:
+                    # أُدخل من عملية أخرى أثناء التجهيز
+                    rows = 0
+                elif manifest["schema"] != schema:
+                    raise ValueError("تغير مخطط المجموعة أثناء الإدخال؛ أعد المحاولة.")
+                else:
+                    _commit_parts(ddir, manifest, staged, sid)
+        finally:
+            for tmp, _ in staged:
+                tmp.unlink(missing_ok=True)
+        added[str(path)] = rows
+    return added
+
+
+# هل يمكن أن يحقق الجزء الشرط اعتماداً على min/max فقط؟ (False = تخطَّ الجزء دون قراءته)
+def _may_match(stats: dict, flt) -> bool:
+    col, op, val = flt
+    s = stats.get(col)
+    if not s or "min" not in s:
+        return True
+    lo, hi = s["min"], s["max"]
+    if op in ("==", "="):
+        return lo <= val <= hi
+    if op == "<":
+        return lo < val
+    if op == "<=":
+        return lo <= val
+    if op == ">":
+        return hi > val
+    if op == ">=":
+        return hi >= val
+    if op == "in":
+        return any(lo <= v <= hi for v in val)
+    return True
+
+
+def _check_filters(manifest, filters):
+    filters = [tuple(f) for f in (filters or [])]
+    for col, op, _ in filters:
+        if col not in manifest["schema"]:
+            raise KeyError(f"عمود غير معروف في الشرط: {col}")
+        if op not in _OPS:
+            raise ValueError(f"عامل غير مدعوم: {op}")
+    return filters
+
+
+# مسارات الأجزاء التي قد تحقق الشروط (المستوى الأول من التمرير: إحصاءات المانيفست)
+# لمن يقرأ الأجزاء بنفسه (مثل pyarrow.dataset)، مع الشروط بصيغة pyarrow
+def partition_files(dataset="heart", filters=None, root=None):
+    manifest = read_manifest(dataset, root)
+    if manifest is None:
+        raise FileNotFoundError(f"المجموعة '{dataset}' غير موجودة في المخزن {Path(root or DEFAULT_ROOT)}")
+    ddir = dataset_dir(dataset, root)
+    filters = _check_filters(manifest, filters)
+    files = [str(ddir / part["file"]) for part in manifest["partitions"]
+             if all(_may_match(part.get("stats", {}), f) for f in filters)]
+    return files, [(c, "==" if o == "=" else o, v) for c, o, v in filters]
+
+
+# قراءة المجموعة: columns لاختيار الأعمدة، filters قائمة شروط (col, op, value) مرتبطة بـ AND
+# مثال: read_dataset("heart", columns=["age", "chol"], filters=[("age", ">=", 50), ("sex", "==", 1)])
+def read_dataset(dataset="heart", columns=None, filters=None, root=None, limit=None) -> pd.DataFrame:
+    manifest = read_manifest(dataset, root)
+    files, arrow_filters = partition_files(dataset, filters, root)
+
+    tables = []
+    rows = 0
+    for path in files:
+        t = pq.read_table(path, columns=columns, filters=arrow_filters or None)
+        tables.append(t)
+        rows += t.num_rows
+        if limit is not None and rows >= limit:
+            break
+    if not tables:
+        cols = columns or list(manifest["schema"])
+        return pd.DataFrame({c: pd.Series(dtype=manifest["schema"][c]) for c in cols})
+    df = pa.concat_tables(tables).to_pandas()
+    if limit is not None:
+        df = df.head(limit)
+    return df
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="مخزن بيانات Parquet محلي لبيانات أمراض القلب")
+    ap.add_argument("--root", default=None, help="مجلد المخزن (افتراضياً data/store أو HEART_STORE_DIR)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p_ing = sub.add_parser("ingest", help="تحويل ملفات CSV إلى أجزاء Parquet")
+    p_ing.add_argument("paths", nargs="+")
+    p_ing.add_argument("--dataset", default="heart")
+    p_ing.add_argument("--chunk-rows", type=int, default=500_000)
+    sub.add_parser("list", help="عرض المجموعات المتاحة")
+    p_info = sub.add_parser("info", help="عرض مخطط وعدد صفوف مجموعة")
+    p_info.add_argument("--dataset", default="heart")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "ingest":
+        t0 = time.perf_counter()
+        added = ingest_csv(args.paths, args.dataset, args.root, args.chunk_rows)
+        for path, n in added.items():
+            print(f"{path}: " + (f"{n} سجل" if n else "تم إدخاله سابقاً، تخطّي"))
+        print(f"✅ اكتمل الإدخال خلال {time.perf_counter() - t0:.2f} ث")
+    elif args.cmd == "list":
+        for name in list_datasets(args.root):
+            m = read_manifest(name, args.root)
+            print(f"{name}: {m['total_rows']} سجل، {len(m['partitions'])} جزء")
+    else:
+        m = read_manifest(args.dataset, args.root)
+        if m is None:
+            raise SystemExit(f"المجموعة '{args.dataset}' غير موجودة")
+        print(json.dumps({k: m[k] for k in ("dataset", "schema", "total_rows", "created", "updated") if k in m},
+                         ensure_ascii=False, indent=1))
+        print(f"عدد الأجزاء: {len(m['partitions'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+# منطق تدريب النموذج مفصولاً عن واجهة Streamlit
+# يُستخدم من صفحة "تدريب النموذج" ويعيد الحمولة (payload) بنفس الشكل الذي تفهمه load_model
+import os
+import shutil
+import tempfile
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from scipy import stats
+from sklearn.base import clone
+from sklearn.model_selection import train_test_split, StratifiedKFold
+from sklearn.metrics import (accuracy_score, roc_auc_score, classification_report, confusion_matrix,
+                             precision_recall_fscore_support)
+from sklearn.preprocessing import StandardScaler, OneHotEncoder
+from sklearn.linear_model import LogisticRegression
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.compose import ColumnTransformer
+
+
+# تحويل الهدف إلى int إن أمكن مع توثيق الخريطة للفئات النصية
+def encode_target(y: pd.Series):
+    y_mapping = None
+    if y.dtype != int and y.dtype != np.int64:
+        try:
+            y = y.astype(int)
+        except Exception:
+            y_cat = y.astype("category")
+            y_mapping = dict(enumerate(y_cat.cat.categories))
+            y = y_cat.cat.codes
+    return y, y_mapping
+
+
+# إنشاء بايبلاين ما قبل المعالجة + المصنّف بنفس إعدادات صفحة التدريب
+# params: معاملات إضافية للمصنّف (مثل n_estimators أو C)، و n_jobs لتدريب RandomForest على عدة أنوية
+def build_pipeline(algo, num_cols, cat_cols, random_state=42, class_weight_balanced=True, scale_features=True,
+                   params=None, n_jobs=None):
+    transformers = []
+    if num_cols:
+        transformers.append(("num", StandardScaler() if (algo == "LogisticRegression" and scale_features) else "passthrough", num_cols))
+    if cat_cols:
+        transformers.append(("cat", OneHotEncoder(handle_unknown='ignore'), cat_cols))
+    pre = ColumnTransformer(transformers=transformers, remainder='drop')
+
+    class_weight = 'balanced' if class_weight_balanced else None
+    if algo == "LogisticRegression":
+        base = LogisticRegression(max_iter=200, class_weight=class_weight)
+    else:
+        base = RandomForestClassifier(n_estimators=300, random_state=random_state, class_weight=class_weight, n_jobs=n_jobs)
+    if params:
+        base.set_params(**params)
+    return Pipeline([
+        ("pre", pre),
+        ("clf", base)
+    ])
+
+
+# داخل العمليات العاملة نلغي توازي المصنّف نفسه (n_jobs) حتى لا تتنافس الطيّات/المهام على الأنوية
+def _single_threaded(est):
+    nj = {k: 1 for k in est.get_params() if k == "n_jobs" or k.endswith("__n_jobs")}
+    if nj:
+        est.set_params(**nj)
+    return est
+
+
+# تدريب وتقييم طيّة واحدة داخل عملية عاملة
+# X قد يكون مصفوفة memmap للقراءة فقط (مشتركة بين العمليات) فنعيد تغليفها بأسماء الأعمدة
+def _fit_score_fold(estimator, X, y, columns, train_idx, test_idx, labels):
+    if not isinstance(X, pd.DataFrame):
+        X = pd.DataFrame(X, columns=columns, copy=False)
+    y = np.asarray(y)
+    est = _single_threaded(clone(estimator))
+    est.fit(X.iloc[train_idx], y[train_idx])
+    X_te, y_te = X.iloc[test_idx], y[test_idx]
+    y_pred = est.predict(X_te)
+    prec, rec, _, _ = precision_recall_fscore_support(y_te, y_pred, labels=labels, zero_division=0)
+    out = {"accuracy": float(accuracy_score(y_te, y_pred)), "precision": prec.tolist(), "recall": rec.tolist(), "roc_auc": None}
+    try:
+        if len(labels) == 2 and hasattr(est, "predict_proba"):
+            out["roc_auc"] = float(roc_auc_score(y_te, est.predict_proba(X_te)[:, 1]))
+    except Exception:
+        pass
+    return out
+
+
+# المتوسط ± فترة ثقة (t-student) لقيم الطيّات
+def summarize_folds(values, confidence=0.95):
+    v = np.asarray([x for x in values if x is not None], dtype=float)
+    if len(v) == 0:
+        return None
+    mean = float(v.mean())
+    std = float(v.std(ddof=1)) if len(v) > 1 else 0.0
+    half = float(stats.t.ppf((1 + confidence) / 2.0, len(v) - 1) * std / np.sqrt(len(v))) if len(v) > 1 else 0.0
+    return {"mean": mean, "std": std, "ci_low": mean - half, "ci_high": mean + half, "folds": v.tolist()}
+
+
+# تحقق متقاطع طبقي (Stratified k-fold) بالتوازي على كل الأنوية
+# تُحفظ المصفوفات مرة واحدة كملف memmap فتقرؤها العمليات العاملة دون نسخ البيانات لكل طيّة
+def cross_validate_model(estimator, X, y, n_splits=5, random_state=42, n_jobs=-1, confidence=0.95):
+    y = np.asarray(y)
+    labels, counts = np.unique(y, return_counts=True)
+    n_splits = int(min(n_splits, counts.min()))
+    if n_splits < 2:
+        return None
+    skf = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+    folds = list(skf.split(np.zeros(len(y)), y))
+    columns = list(X.columns)
+
+    tmp_dir = None
+    X_shared, y_shared = X, y
+    # memmap ممكن فقط عندما تكون كل الأعمدة رقمية
+    if all(np.issubdtype(t, np.number) for t in X.dtypes):
+        tmp_dir = tempfile.mkdtemp(prefix="heart_cv_")
+        x_path, y_path = os.path.join(tmp_dir, "X.mmap"), os.path.join(tmp_dir, "y.mmap")
+        joblib.dump(np.ascontiguousarray(X.to_numpy(dtype=np.float64)), x_path)
+        joblib.dump(y, y_path)
+        X_shared = joblib.load(x_path, mmap_mode="r")
+        y_shared = joblib.load(y_path, mmap_mode="r")
+    try:
+        results = joblib.Parallel(n_jobs=n_jobs)(
+            joblib.delayed(_fit_score_fold)(estimator, X_shared, y_shared, columns, tr, te, labels)
+            for tr, te in folds
+        )
+    finally:
+        del X_shared, y_shared
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    cv = {
+        "n_splits": n_splits,
+        "confidence": confidence,
+        "accuracy": summarize_folds([r["accuracy"] for r in results], confidence),
+        "roc_auc": summarize_folds([r["roc_auc"] for r in results], confidence),
+        "precision": {},
+        "recall": {},
+    }
+    for i, lab in enumerate(labels):
+        key = str(lab.item() if hasattr(lab, "item") else lab)
+        cv["precision"][key] = summarize_folds([r["precision"][i] for r in results], confidence)
+        cv["recall"][key] = summarize_folds([r["recall"][i] for r in results], confidence)
+    return cv
+
+
+# درجة النموذج على بيانات معيّنة: ROC-AUC للتصنيف الثنائي مع احتمالات، وإلا الدقة
+def _score(estimator, X, y, scoring):
+    if scoring == "roc_auc":
+        return float(roc_auc_score(y, estimator.predict_proba(X)[:, 1]))
+    return float(accuracy_score(y, estimator.predict(X)))
+
+
+# مهمة واحدة (سمة × تكرار): خلط عمود واحد وقياس انخفاض الدرجة
+def _permuted_drop(estimator, X, y, col, seed, baseline, scoring):
+    _single_threaded(estimator)
+    rng = np.random.default_rng(seed)
+    Xp = X.copy()
+    Xp[col] = rng.permutation(Xp[col].to_numpy())
+    return baseline - _score(estimator, Xp, y, scoring)
+
+
+# أهمية السمات بالتبديل (Permutation importance) على مجموعة الاختبار
+# تعمل مع أي Pipeline لأنها تعتمد على الأعمدة الأصلية وليس على coef_/feature_importances_
+# المهام (السمات × التكرارات) تُوزّع بالتوازي، ومجموعات الاختبار الكبيرة تُعيَّن عشوائياً إلى max_samples
+def permutation_importance(estimator, X, y, n_repeats=5, max_samples=2000, random_state=42, n_jobs=-1):
+    y = np.asarray(y)
+    if max_samples and len(X) > max_samples:
+        idx = np.random.default_rng(random_state).choice(len(X), size=max_samples, replace=False)
+        X, y = X.iloc[idx], y[idx]
+    X = X.reset_index(drop=True)
+    scoring = "accuracy"
+    if len(np.unique(y)) == 2 and hasattr(estimator, "predict_proba"):
+        scoring = "roc_auc"
+    baseline = _score(estimator, X, y, scoring)
+    cols = list(X.columns)
+    tasks = [(c, r) for c in cols for r in range(n_repeats)]
+    drops = joblib.Parallel(n_jobs=n_jobs)(
+        joblib.delayed(_permuted_drop)(estimator, X, y, c, (random_state, i, r), baseline, scoring)
+        for i, (c, r) in enumerate(tasks)
+    )
+    drops = np.asarray(drops).reshape(len(cols), n_repeats)
+    mean = pd.Series(drops.mean(axis=1), index=cols).sort_values(ascending=False)
+    std = pd.Series(drops.std(axis=1), index=cols).reindex(mean.index)
+    return {
+        "method": "permutation",
+        "scoring": scoring,
+        "baseline": baseline,
+        "n_repeats": int(n_repeats),
+        "n_samples": int(len(X)),
+        "mean": {k: float(v) for k, v in mean.items()},
+        "std": {k: float(v) for k, v in std.items()},
+    }
+
+
+# تدريب وتقييم على تقسيم تدريب/اختبار واحد
+# يعيد (payload, report): الحمولة للحفظ، والتقرير لعرض النتائج دون إعادة الحساب
+def train_model(df_all, target_col, feat_cols, algo="LogisticRegression", test_size=0.2,
+                random_state=42, class_weight_balanced=True, scale_features=True, cv_folds=5, n_jobs=-1,
+                importance_repeats=5, importance_max_samples=2000, params=None, neighbors=True):
+    # زمن كل مرحلة بالثواني (يُحفظ في الحمولة لمتابعة أداء التدريب)
+    timings = {}
+    t0 = time.perf_counter()
+    # إزالة السجلات ذات القيم المفقودة في الأعمدة المستخدمة
+    work = df_all[list(feat_cols) + [target_col]].dropna()
+    y, y_mapping = encode_target(work[target_col])
+    X = work[list(feat_cols)]
+
+    # معالجة الأنواع غير الرقمية تلقائياً
+    num_cols = [c for c in feat_cols if np.issubdtype(X[c].dtype, np.number)]
+    cat_cols = [c for c in feat_cols if c not in num_cols]
+
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=test_size, random_state=random_state, stratify=y if len(y.unique()) > 1 else None
+    )
+
+    timings["prepare"] = time.perf_counter() - t0
+
+    clf = build_pipeline(algo, num_cols, cat_cols, random_state, class_weight_balanced, scale_features,
+                         params=params, n_jobs=n_jobs if algo != "LogisticRegression" else None)
+    t0 = time.perf_counter()
+    clf.fit(X_train, y_train)
+    timings["fit"] = time.perf_counter() - t0
+
+    # تقييم
+    t0 = time.perf_counter()
+    y_pred = clf.predict(X_test)
+    acc = accuracy_score(y_test, y_pred)
+    auc = None
+    try:
+        if hasattr(clf, "predict_proba"):
+            auc = float(roc_auc_score(y_test, clf.predict_proba(X_test)[:, 1]))
+    except Exception:
+        auc = None
+    timings["evaluate"] = time.perf_counter() - t0
+
+    # أهمية السمات بالتبديل على مجموعة الاختبار (متاحة دائماً مهما كانت التحويلات)
+    importance = None
+    t0 = time.perf_counter()
+    if importance_repeats:
+        try:
+            importance = permutation_importance(
+                clf, X_test, y_test, n_repeats=importance_repeats, max_samples=importance_max_samples,
+                random_state=random_state, n_jobs=n_jobs,
+            )
+        except Exception:
+            importance = None
+    timings["importance"] = time.perf_counter() - t0
+
+    # تقييم أكثر ثباتاً من تقسيم واحد: k-fold متوازٍ على كامل البيانات
+    cv = None
+    t0 = time.perf_counter()
+    if cv_folds and cv_folds >= 2:
+        cv = cross_validate_model(clf, X, y, n_splits=cv_folds, random_state=random_state, n_jobs=n_jobs)
+    timings["cv"] = time.perf_counter() - t0
+
+    # فهرس المرضى المشابهين على كامل البيانات (يُحفظ ملفاً مستقلاً بجانب النموذج، لا داخل الحمولة)
+    neighbor_index = None
+    t0 = time.perf_counter()
+    if neighbors:
+        from heart_neighbors import build_index
+        try:
+            neighbor_index = build_index(X, y, feat_cols)
+        except Exception:
+            neighbor_index = None
+    timings["neighbors"] = time.perf_counter() - t0
+
+    # النموذج المحفوظ يتنبأ بخيط واحد: أسرع لسجل واحد/دفعات صغيرة من إنشاء مجمع خيوط لكل استدعاء
+    _single_threaded(clf)
+
+    metrics = {"accuracy": float(acc)}
+    if auc is not None:
+        metrics["roc_auc"] = auc
+    if cv is not None:
+        metrics["cv"] = cv
+    payload = {"estimator": clf, "features": list(feat_cols), "metrics": metrics, "timings": timings}
+    if y_mapping is not None:
+        payload["target_mapping"] = y_mapping
+    if importance is not None:
+        payload["importance"] = importance
+
+    report = {
+        "accuracy": float(acc),
+        "roc_auc": auc,
+        "classification_report": classification_report(y_test, y_pred, output_dict=False, digits=3),
+        "confusion_matrix": confusion_matrix(y_test, y_pred),
+        "importance": importance,
+        "target_mapping": y_mapping,
+        "cv": cv,
+        "n_train": int(len(X_train)),
+        "n_test": int(len(X_test)),
+        "fit_seconds": timings["fit"],
+        "timings": timings,
+        "neighbor_index": neighbor_index,
+    }
+    return payload, report
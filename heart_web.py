@@ -1335,19 +1335,20 @@
 #             """, unsafe_allow_html=True)
 
 import streamlit as st
-import joblib
+import os
+import threading
+import time
 import numpy as np
 import pandas as pd
-import plotly.graph_objects as go
-from pathlib import Path
 from io import StringIO
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score, roc_auc_score, classification_report, confusion_matrix
-from sklearn.preprocessing import StandardScaler, OneHotEncoder
-from sklearn.linear_model import LogisticRegression
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.pipeline import Pipeline
-from sklearn.compose import ColumnTransformer
+# المكتبات الثقيلة تُستورد داخل الصفحات التي تحتاجها فقط حتى لا تدفعها كل جلسة:
+# sklearn عبر heart_training/heart_cache عند التدريب، pyarrow عبر heart_store، و plotly حيث تُرسم المخططات
+from heart_inference import REQUIRED_FEATURES, compile_linear, predict_with_spread, score_frame, to_frame, warm_up, what_if
+from heart_audit import AuditLog
+from heart_broker import PredictionBroker
+from heart_model_server import ModelClient, RemoteModel
+from heart_registry import (MODEL_FILE, LiveModel, activate_version, current_version, list_versions, publish, read_meta,
+                            rollback, version_path)
 try:
     # لمنع عرض RerunException كخطأ عند استخدام st.rerun()
     from streamlit.runtime.scriptrunner.script_runner import RerunException as _RerunException
@@ -1374,46 +1375,165 @@ def read_csv_auto(file_like):
             # أخيراً محاولـة القراءة الافتراضية
             return pd.read_csv(file_like)
 
-# تحميل النموذج مع التخزين المؤقت واكتشاف المسار تلقائياً
+# وضع خادم النموذج المنفصل: عند ضبط HEART_MODEL_SOCKET لا تحمّل هذه العملية النموذج بل تتصل بالخادم
 @st.cache_resource(show_spinner=False)
+def get_model_client():
+    path = os.environ.get("HEART_MODEL_SOCKET")
+    if not path:
+        return None
+    return ModelClient(path, pool_size=int(os.environ.get("HEART_MODEL_POOL", "8")))
+
+# النموذج الحي لهذه العملية: يتبع مؤشر سجل النماذج (models/CURRENT) ويبدّل النموذج في الخلفية عند تفعيل نسخة جديدة
+# (إن كان السجل فارغاً يُحمّل heart_model.pkl من مجلد التطبيق أو المسار الحالي)
+@st.cache_resource(show_spinner=False)
+def get_live_model():
+    return LiveModel()
+
+# تحميل النموذج الحالي؛ الاستدعاء رخيص فيُحدّث ميتاداتا الجلسة في كل مرة لتتبع النسخة الفعالة
 def load_model():
-    # نحاول التحميل من نفس مجلد الملف الحالي ثم المسار الحالي كاحتياط
-    possible_paths = [
-        Path(__file__).parent / "heart_model.pkl",
-        Path.cwd() / "heart_model.pkl",
-    ]
-    for p in possible_paths:
-        if p.exists():
-            obj = joblib.load(str(p))
-            # دعم شكلين: نموذج خام، أو قاموس يحوي الميتاداتا
-            if isinstance(obj, dict) and 'estimator' in obj:
-                est = obj['estimator']
-                feats = obj.get('features')
-                # إن لم تتوفر الميزات في الحمولة، حاول استخراجها من الـ Pipeline
-                if not feats:
-                    try:
-                        if hasattr(est, 'named_steps') and 'pre' in est.named_steps:
-                            pre = est.named_steps['pre']
-                            if hasattr(pre, 'feature_names_in_'):
-                                feats = list(pre.feature_names_in_)
-                    except Exception:
-                        pass
-                st.session_state.model_features = feats
-                # حمل المقاييس والخرائط إن وجدت
-                st.session_state.model_metrics = obj.get('metrics')
-                st.session_state.target_mapping = obj.get('target_mapping')
-                return est
-            else:
-                st.session_state.model_features = None
-                st.session_state.model_metrics = None
-                st.session_state.target_mapping = None
-                return obj
-    raise FileNotFoundError("لم يتم العثور على ملف النموذج heart_model.pkl. ضع الملف في مجلد التطبيق.")
+    client = get_model_client()
+    if client is not None:
+        meta = client.meta()
+        st.session_state.model_features = meta.get("features")
+        st.session_state.model_metrics = meta.get("metrics")
+        st.session_state.target_mapping = meta.get("target_mapping")
+        st.session_state.model_importance = meta.get("importance")
+        st.session_state.model_version = meta.get("version")
+        return RemoteModel(client)
+    live = get_live_model()
+    # دعم شكلين: نموذج خام، أو قاموس يحوي الميتاداتا (الميزات تُستخرج من الـ Pipeline عند غيابها)
+    payload = live.payload
+    st.session_state.model_features = payload["features"]
+    # حمل المقاييس والخرائط إن وجدت
+    st.session_state.model_metrics = payload["metrics"]
+    st.session_state.target_mapping = payload["target_mapping"]
+    st.session_state.model_importance = payload["importance"]
+    st.session_state.model_version = live.version
+    return payload["estimator"]
 
 # تحميل كسول: لا نحمل النموذج حتى نحتاجه بالفعل (بعد تسجيل الدخول)
 def get_model():
     return load_model()
 
+# ميتاداتا نسخة في السجل (meta.json)؛ النسخ ثابتة فيكفي اسم النسخة مفتاحاً
+@st.cache_data(show_spinner=False, max_entries=8)
+def read_version_meta(version: str):
+    return read_meta(version)
+
+# ميتاداتا النموذج (المقاييس، أهمية السمات) للصفحات التي تعرضها: من الخادم في وضع المقبس،
+# وإلا من meta.json للنسخة الفعالة (دون تحميل النموذج نفسه)، ثم من النموذج الحي للنسخ القديمة أو heart_model.pkl
+def load_model_metadata():
+    client = get_model_client()
+    if client is not None:
+        return client.meta()
+    version = current_version()
+    if version is not None:
+        meta = read_version_meta(version)
+        if "metrics" in meta:
+            return meta
+    return get_live_model().payload
+
+# قراءة مجموعة من مخزن Parquet؛ نسخة المانيفست جزء من المفتاح فتُعاد القراءة فقط بعد أي إدخال جديد
+@st.cache_data(show_spinner=False, max_entries=4)
+def load_store_dataset(name: str, version):
+    from heart_store import read_dataset
+    return read_dataset(name)
+
+# استعلامات مخزن النتائج؛ الدفعة المحفوظة لا تتغير فيكفي (الدفعة، الشروط) مفتاحاً
+@st.cache_data(show_spinner=False, max_entries=64)
+def query_results(batch_id: str, filters: tuple, after, page_size: int):
+    from heart_results import count, page
+    return count(batch_id, list(filters)), page(batch_id, list(filters), after, page_size)
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def aggregate_results(batch_id: str, by: tuple, filters: tuple):
+    from heart_results import aggregate
+    return aggregate(batch_id, by, list(filters))
+
+# توزيع الخطر للسجلات المطابقة محسوباً على الخادم: (حدود، أعداد) المدرج، ملخص النقاط المئوية، وعينة للانتشار
+@st.cache_data(show_spinner=False, max_entries=32)
+def distribution_results(batch_id: str, filters: tuple):
+    from heart_results import risk_distribution, sample_points
+    edges, counts, summary = risk_distribution(batch_id, list(filters))
+    sample = sample_points(batch_id, list(WHAT_IF_NUMERIC) + ["prediction", "risk_percent"], list(filters))
+    return edges, counts, summary, sample
+
+# مكعب الشرائح المحفوظ مع الدفعة (None للدفعات الأقدم من المكعب)
+@st.cache_resource(show_spinner=False, max_entries=16)
+def load_batch_cube(batch_id: str):
+    from heart_segments import load_cube
+    return load_cube(batch_id)
+
+# ذاكرة مؤقتة مشتركة بين كل الجلسات لنتائج التدريب (على القرص)
+@st.cache_resource(show_spinner=False)
+def get_training_cache():
+    from heart_cache import TrainingCache
+    return TrainingCache()
+
+# وسيط دفعات صغيرة واحد لكل العملية (مشترك بين الجلسات)؛ HEART_BROKER=0 لتعطيله
+@st.cache_resource(show_spinner=False)
+def get_prediction_broker():
+    # في وضع خادم النموذج يتولى الخادم نفسه تجميع الطلبات
+    if os.environ.get("HEART_BROKER", "1") == "0" or get_model_client() is not None:
+        return None
+    return PredictionBroker()
+
+# سجل التدقيق المشترك (طابور في الذاكرة + خيط كاتب)؛ HEART_AUDIT=0 لتعطيله
+@st.cache_resource(show_spinner=False)
+def get_audit_log():
+    if os.environ.get("HEART_AUDIT", "1") == "0":
+        return None
+    return AuditLog()
+
+# تنبؤ سطر واحد بلا اعتماد على الجلسة (يستخدمه predict_single والإحماء)
+# يعيد (التصنيف، الاحتمال، تشتت الأشجار أو None)؛ التشتت للغابات المحلية فقط ومن نفس التقييم
+def predict_row(model, feats, arr, broker=None):
+    X = to_frame(arr, feats)
+    # الطلب يمر عبر الوسيط المشترك فيُجمع مع طلبات الجلسات الأخرى في نداء متجه واحد
+    if broker is None:
+        prediction, proba, spread = predict_with_spread(model, X)
+        return (prediction[0], None if proba is None else float(proba[0]),
+                None if spread is None else {k: float(v[0]) for k, v in spread.items()})
+    return broker.predict(model, X, with_spread=True)
+
+# إحماء اختياري (HEART_WARMUP=1): تحميل النموذج وتنبؤات تجريبية عبر مسار predict_single في خيط خلفي
+# يبدأ مع أول تشغيل للسكربت في العملية (صفحة الدخول)، فيكون النموذج جاهزاً قبل أول تنبؤ حقيقي
+@st.cache_resource(show_spinner=False)
+def start_warmup():
+    status = {"state": "warming"}
+    client = get_model_client()
+    broker = get_prediction_broker()
+
+    def run():
+        try:
+            t0 = time.perf_counter()
+            if client is not None:
+                meta = client.meta(refresh=True)
+                model, feats, version = RemoteModel(client), meta.get("features"), meta.get("version")
+            else:
+                live = get_live_model()
+                model, feats, version = live.payload["estimator"], live.payload["features"], live.version
+            load_s = time.perf_counter() - t0
+            timings = warm_up(lambda row: predict_row(model, feats, row, broker), feats)
+            status.update(state="ready", version=version, load_s=load_s,
+                          first_ms=timings[0] * 1000, warm_ms=timings[-1] * 1000, total_s=time.perf_counter() - t0)
+            print(f"[heart_web] النموذج جاهز خلال {status['total_s']:.2f} ث (تحميل {load_s:.2f} ث، "
+                  f"أول تنبؤ {status['first_ms']:.1f}ms ثم {status['warm_ms']:.1f}ms)", flush=True)
+        except Exception as e:
+            status.update(state="failed", error=f"{type(e).__name__}: {e}")
+            print(f"[heart_web] فشل الإحماء: {status['error']}", flush=True)
+
+    thread = threading.Thread(target=run, name="heart-warmup", daemon=True)
+    try:
+        from streamlit.runtime.scriptrunner import add_script_run_ctx
+        add_script_run_ctx(thread)
+    except Exception:
+        pass
+    thread.start()
+    return status
+
+WARMUP = start_warmup() if os.environ.get("HEART_WARMUP") == "1" else None
+
 
 # CSS لتوضيح الخطوط والألوان وتطبيق RTL
 st.markdown(
@@ -1555,11 +1675,21 @@ with st.sidebar:
     st.title("❤️ Heart AI")
     if st.session_state.authenticated:
         st.caption(f"مرحباً، {st.session_state.username}")
-        options = ["الصفحة الرئيسية", "نموذج التنبؤ", "رفع ملف CSV", "تدريب النموذج", "حول"]
+        if WARMUP is not None:
+            if WARMUP["state"] == "ready":
+                st.caption(f"⚡ النموذج جاهز — تحميل {WARMUP['load_s']:.1f} ث، أول تنبؤ {WARMUP['first_ms']:.0f}ms")
+            elif WARMUP["state"] == "warming":
+                st.caption("⏳ جارِ تجهيز النموذج…")
+            else:
+                st.caption(f"⚠️ تعذر تجهيز النموذج مسبقاً: {WARMUP['error']}")
+        options = ["الصفحة الرئيسية", "نموذج التنبؤ", "رفع ملف CSV", "النتائج المحفوظة", "سجل التنبؤات", "تدريب النموذج",
+                   "حول"]
         icon_map = {
             "الصفحة الرئيسية": "🏠 الصفحة الرئيسية",
             "نموذج التنبؤ": "🩺 نموذج التنبؤ",
             "رفع ملف CSV": "📂 رفع ملف CSV",
+            "النتائج المحفوظة": "🔎 النتائج المحفوظة",
+            "سجل التنبؤات": "🗂️ سجل التنبؤات",
             "تدريب النموذج": "🧠 تدريب النموذج",
             "حول": "ℹ️ حول",
         }
@@ -1597,47 +1727,266 @@ if not st.session_state.authenticated:
 # عرض أي إشعار وسطي مخصص (إن وُجد) بعد تهيئة الشريط الجانبي
 render_center_toast()
 
-def predict_single(arr: np.ndarray):
+# نص دقة النموذج: متوسط k-fold ± نصف فترة الثقة إن وُجد، وإلا دقة تقسيم الاختبار الواحد
+def format_accuracy(mm):
+    if not isinstance(mm, dict):
+        return "—"
+    cv_acc = (mm.get("cv") or {}).get("accuracy")
+    if isinstance(cv_acc, dict) and isinstance(cv_acc.get("mean"), (int, float)):
+        half = (cv_acc["ci_high"] - cv_acc["ci_low"]) / 2.0
+        return f"{cv_acc['mean']*100:.1f}% ± {half*100:.1f}"
+    last_acc = mm.get("accuracy")
+    return f"{last_acc*100:.1f}%" if isinstance(last_acc, (int, float)) else "—"
+
+# رسم أهمية السمات بالتبديل (مخزنة مسبقاً في الحمولة) مع أشرطة الانحراف المعياري
+def render_importance(imp):
+    from heart_charts import importance_bar
+    st.plotly_chart(importance_bar(imp), use_container_width=True)
+    st.caption(f"محسوبة على {imp.get('n_samples', '—')} سجل اختبار × {imp.get('n_repeats', '—')} تكرارات.")
+
+# مخططات لوحة النتيجة مخزنة حسب القيمة المعروضة ومشتركة بين الجلسات: إعادة عرض النتيجة لا تعيد بناء الأشكال
+# band = فترة عدم اليقين (منخفض، مرتفع) بالنسبة المئوية للغابات، أو None
+@st.cache_resource(show_spinner=False, max_entries=512)
+def result_figures(risk_value: float, color: str, band=None):
+    from heart_charts import risk_donut, risk_gauge
+    return risk_gauge(risk_value, color, band), risk_donut(risk_value)
+
+# نطاقات "ماذا لو": للسمات الرقمية (أدنى، أعلى حسب حقول الإدخال، نصف عرض النافذة حول قيمة المريض)،
+# وللفئوية كل الرموز الممكنة
+WHAT_IF_NUMERIC = {
+    "age": (18, 120, 20), "trtbps": (80, 250, 40), "chol": (80, 700, 120),
+    "thalachh": (60, 220, 40), "oldpeak": (0.0, 10.0, 2.0),
+}
+WHAT_IF_CATEGORICAL = {
+    "sex": [0, 1], "cp": [0, 1, 2, 3], "fbs": [0, 1], "restecg": [0, 1, 2],
+    "exng": [0, 1], "slp": [0, 1, 2], "caa": [0, 1, 2, 3, 4], "thall": [0, 1, 2, 3],
+}
+FEATURE_LABELS = {
+    "age": "العمر", "sex": "الجنس", "cp": "ألم الصدر", "trtbps": "الضغط الانقباضي", "chol": "الكوليسترول",
+    "fbs": "سكر صائم", "restecg": "تخطيط القلب", "thalachh": "أقصى نبض", "exng": "ألم المجهود",
+    "oldpeak": "انخفاض ST", "slp": "ميل ST", "caa": "الأوعية", "thall": "الثلاسيميا",
+}
+
+# لوحة "ماذا لو": كل البدائل (نحو 130 سطراً) تُقيَّم في نداء متجه واحد للنموذج، والنتيجة ومخططاها
+# تُحفظ في الجلسة لنفس المدخلات ونسخة النموذج
+def render_what_if(features):
     model = get_model()
-    # ميزات مطلوبة افتراضياً للاستخدام كأسماء أعمدة عند غياب model_features
-    REQUIRED_FEATURES = [
-        "age","sex","cp","trtbps","chol","fbs","restecg","thalachh","exng","oldpeak","slp","caa","thall"
-    ]
-    feats = st.session_state.get("model_features")
-    cols = None
-    if isinstance(feats, (list, tuple)) and len(feats) == arr.shape[1]:
-        cols = list(feats)
-    elif len(REQUIRED_FEATURES) == arr.shape[1]:
-        cols = REQUIRED_FEATURES
-
-    # دوماً حاول تمرير DataFrame بأسماء أعمدة ليستطيع ColumnTransformer الفهرسة بالأسماء
-    if cols is not None:
-        # أنشئ DataFrame بأسماء الأعمدة المطلوبة فقط، ولا تسقط إلى مصفوفة بلا أسماء
-        X = pd.DataFrame(arr, columns=cols)
-        # تحويل إجباري للأرقام
-        for c in X.columns:
-            X[c] = pd.to_numeric(X[c], errors='coerce')
-        if X.isna().any().any():
-            raise ValueError("المدخلات تحتوي قيماً غير رقمية/ناقصة بعد التحويل. رجاءً صحح القيم.")
+    memo_key = (st.session_state.get("model_version"), tuple(float(v) for v in features[0]))
+    memo = st.session_state.get("what_if_memo")
+    if memo is None or memo[0] != memo_key:
+        row = dict(zip(REQUIRED_FEATURES, features[0]))
+        feats = st.session_state.get("model_features") or REQUIRED_FEATURES
+        df = what_if(model, row, feats, WHAT_IF_NUMERIC, WHAT_IF_CATEGORICAL)
+        if df.empty or df["risk_percent"].isna().all():
+            st.info("تحليل ماذا لو يحتاج نموذجاً يوفر احتمالات.")
+            return
+        from heart_charts import what_if_categories, what_if_curves
+        figs = (what_if_curves(df[df["feature"].isin(list(WHAT_IF_NUMERIC))], FEATURE_LABELS),
+                what_if_categories(df[df["feature"].isin(list(WHAT_IF_CATEGORICAL))], FEATURE_LABELS))
+        memo = (memo_key, figs)
+        st.session_state.what_if_memo = memo
+    curves, cats = memo[1]
+    st.caption("كيف تتغير نسبة الخطر لو تغيّرت سمة واحدة مع بقاء البقية كما هي (النقطة/العمود الداكن = قيمتك).")
+    st.plotly_chart(curves, use_container_width=True)
+    st.markdown("#### السمات الفئوية")
+    st.plotly_chart(cats, use_container_width=True)
+
+# المقدِّر المحلي لتفسير التنبؤات؛ None في وضع خادم النموذج (لا تصل الواجهة إلى مصفوفات النموذج)
+def get_local_estimator():
+    if get_model_client() is not None:
+        return None
+    payload = get_live_model().payload
+    return payload["estimator"], payload["features"] or REQUIRED_FEATURES
+
+# مساهمات السمات في نتيجة المريض (TreeSHAP للغابة، المعامل × القيمة المقيسة للانحدار اللوجستي)؛
+# المخطط يُحفظ في الجلسة لنفس المدخلات ونسخة النموذج
+def render_contributions(features):
+    local = get_local_estimator()
+    if local is None:
+        st.info("تفسير التنبؤ غير متاح عند تشغيل النموذج على خادم منفصل.")
+        return
+    from heart_explain import SCALE_PROBA, explain
+    memo_key = (st.session_state.get("model_version"), tuple(float(v) for v in features[0]))
+    memo = st.session_state.get("contrib_memo")
+    if memo is None or memo[0] != memo_key:
+        from heart_charts import contribution_bar
+        model, feats = local
+        row = pd.DataFrame([dict(zip(REQUIRED_FEATURES, features[0]))])
+        contrib, base, scale = explain(model, row, feats)
+        values = contrib.iloc[0]
+        if scale == SCALE_PROBA:
+            values, base, unit = values * 100, base * 100, "المساهمة في نسبة الخطر (نقاط مئوية)"
+        else:
+            unit = "المساهمة في لوغاريتم الأرجحية (log-odds)"
+        memo = (memo_key, contribution_bar(values.to_dict(), FEATURE_LABELS, unit), base, scale)
+        st.session_state.contrib_memo = memo
+    _, fig, base, scale = memo
+    if scale == SCALE_PROBA:
+        st.caption(f"نقطة البداية متوسط الخطر في بيانات التدريب ({base:.1f}%)، وكل شريط يضيف إليها أو يطرح منها.")
     else:
-        raise ValueError("تعذر مطابقة أسماء الميزات مع مدخلات النموذج. تحقّق من توافق النموذج مع الخصائص الأساسية أو أعد التدريب.")
-    prediction = model.predict(X)
-    # محاولة الحصول على احتمال حقيقي، ثم قرار محوّل بالسيجمويد، وإلا لا يوجد احتمال
-    proba = None
-    try:
-        if hasattr(model, "predict_proba"):
-            proba = float(model.predict_proba(X)[0][1])
-    except Exception:
-        proba = None
-    if proba is None:
-        try:
-            if hasattr(model, "decision_function"):
-                val = float(model.decision_function(X)[0])
-                proba = 1.0 / (1.0 + np.exp(-val))
-        except Exception:
-            proba = None
-    return prediction[0], proba
+        st.caption(f"نقطة البداية ثابت النموذج ({base:+.2f} log-odds)، ومجموعها مع الأشرطة يعطي أرجحية الخطر.")
+    st.plotly_chart(fig, use_container_width=True)
+
+# فهرس المرضى المشابهين للنسخة الفعالة (ملف بجانب النموذج يُبنى وقت التدريب)؛ None إن لم يُبنَ لها فهرس
+@st.cache_resource(show_spinner=False, max_entries=4)
+def get_neighbor_index(version):
+    from heart_neighbors import load_index
+    from heart_registry import resolve
+    return load_index(version_path(version) if version else resolve()[1])
+
+# توزيع الخطر من تجميعات محسوبة على الخادم: مدرج (أعداد الفئات فقط)، صندوق من النقاط المئوية، وانتشار عينة
+# لا تتجاوز SAMPLE_ROWS سجل؛ حجم ما يصل للمتصفح ثابت تقريباً مهما كبرت الدفعة
+def render_distribution(edges, counts, summary, sample, key):
+    from heart_charts import binned_histogram, quantile_box, sampled_scatter
+    if not summary.get("n"):
+        st.info("لا توجد سجلات مطابقة.")
+        return
+    st.plotly_chart(binned_histogram(edges, counts), use_container_width=True)
+    st.plotly_chart(quantile_box(summary), use_container_width=True)
+    st.dataframe(pd.DataFrame([{k: round(v, 2) for k, v in summary.items() if k != "n"}]),
+                 use_container_width=True, hide_index=True)
+    x = st.selectbox("المحور الأفقي للانتشار", list(WHAT_IF_NUMERIC), format_func=FEATURE_LABELS.get, key=f"{key}_x")
+    st.plotly_chart(sampled_scatter(sample, x, FEATURE_LABELS[x], summary["n"]), use_container_width=True)
+
+# حتى هذا الحجم يُولَّد ملف التنزيل الدفعي مباشرة؛ فوقه عند الطلب
+EAGER_DOWNLOAD_ROWS = 50_000
+# مساهمات السمات للدفعة تُحسب داخل الجلسة حتى هذا الزمن المقدَّر (ثوانٍ)؛ فوقه تُحال لسطر الأوامر،
+# وفوق CONTRIB_CONFIRM_SECONDS يُعرض التقدير أولاً وينتظر الحساب زراً
+CONTRIB_MAX_SECONDS = float(os.environ.get("HEART_CONTRIB_MAX_SECONDS", "120"))
+CONTRIB_CONFIRM_SECONDS = 3.0
+
+# تحليل الشرائح (الفئة العمرية × الجنس × cp × exng) من مكعب الدفعة: كل تفاعل يجمع محاور 80 خلية فقط
+# ولا يعيد مسح السجلات مهما كان حجم الدفعة؛ key يميز عناصر كل صفحة
+def render_segments(cube, key):
+    from heart_charts import binned_histogram, segment_heatmap
+    from heart_segments import DIMENSIONS
+    names = {"age_band": "الفئة العمرية", "sex": "الجنس", "cp": "نوع ألم الصدر (cp)", "exng": "ذبحة مع المجهود (exng)"}
+    metrics = {"mean_risk": "متوسط الخطر %", "positive_pct": "نسبة المتنبأ بإصابتهم %", "n": "عدد السجلات"}
+    c1, c2, c3 = st.columns(3)
+    with c1:
+        rows = st.selectbox("الصفوف", list(DIMENSIONS), format_func=names.get, key=f"{key}_rows")
+    with c2:
+        cols = st.selectbox("الأعمدة", [d for d in DIMENSIONS if d != rows], format_func=names.get, key=f"{key}_cols")
+    with c3:
+        metric = st.selectbox("المقياس", list(metrics), format_func=metrics.get, key=f"{key}_metric")
+    # الأبعاد الأخرى تُستخدم للتصفية (فارغ = الكل)
+    where = {}
+    for col, d in zip(st.columns(2), [d for d in DIMENSIONS if d not in (rows, cols)]):
+        with col:
+            where[d] = st.multiselect(names[d], list(range(len(DIMENSIONS[d]))),
+                                      format_func=lambda i, d=d: DIMENSIONS[d][i], key=f"{key}_where_{d}")
+    values, counts = cube.pivot(rows, cols, metric, where)
+    st.plotly_chart(segment_heatmap(values, counts, metrics[metric], names[rows], names[cols]), use_container_width=True)
+
+    # توزيع الخطر لشريحة واحدة (أو لكل الصفوف/الأعمدة) من مدرجات المكعب
+    c1, c2 = st.columns(2)
+    with c1:
+        r = st.selectbox(names[rows], [None] + list(range(len(DIMENSIONS[rows]))), key=f"{key}_hist_r",
+                         format_func=lambda i: "الكل" if i is None else DIMENSIONS[rows][i])
+    with c2:
+        c = st.selectbox(names[cols], [None] + list(range(len(DIMENSIONS[cols]))), key=f"{key}_hist_c",
+                         format_func=lambda i: "الكل" if i is None else DIMENSIONS[cols][i])
+    edges, hist = cube.histogram({**where, rows: [] if r is None else [r], cols: [] if c is None else [c]})
+    st.plotly_chart(binned_histogram(edges, hist, f"توزيع نسبة الخطر للشريحة ({int(hist.sum()):,} سجل)"),
+                    use_container_width=True)
+    table = cube.table([rows, cols], where)
+    st.dataframe(table[table["n"] > 0].reset_index(), use_container_width=True, hide_index=True)
+    if cube.n_excluded:
+        st.caption(f"{cube.n_excluded:,} سجل برموز خارج المدى المعروف (مثل cp > 3) غير داخل في الشرائح.")
+
+# أقرب k مرضى من بيانات التدريب ونتائجهم الفعلية؛ الاستعلام بأجزاء من الميلي ثانية فلا حاجة لحفظه في الجلسة
+def render_similar_patients(features, k=5):
+    index = get_neighbor_index(st.session_state.get("model_version"))
+    if index is None:
+        st.info("لا يتوفر فهرس المرضى المشابهين لهذه النسخة من النموذج؛ يُبنى تلقائياً عند تدريب نموذج جديد.")
+        return
+    row = pd.DataFrame([dict(zip(REQUIRED_FEATURES, features[0]))])
+    near = index.neighbors(row, k)
+    positive = int((near["outcome"] == 1).sum())
+    st.caption(f"{positive} من أقرب {len(near)} مرضى في بيانات التدريب ({index.n_rows:,} سجل) كانت نتيجتهم إيجابية. "
+               "المسافة على السمات المقيسة: كلما صغرت زاد التشابه.")
+    mapping = st.session_state.get("target_mapping") or {}
+    near["outcome"] = [mapping.get(int(v), mapping.get(str(int(v)), "مصاب" if v == 1 else "سليم")) for v in near["outcome"]]
+    near = near.rename(columns={**FEATURE_LABELS, "outcome": "النتيجة", "distance": "المسافة"})
+    st.dataframe(near.round({"المسافة": 2}), use_container_width=True, hide_index=True)
+
+# "كيف أصل إلى خطر أقل من الحد؟": أصغر تغيير في السمات القابلة للتعديل (بحث متجه، نداء واحد للنموذج لكل تكرار)؛
+# النتيجة تُحفظ في الجلسة لنفس المدخلات والحد ونسخة النموذج فلا يُعاد البحث عند إعادة العرض
+def render_counterfactuals(features, target_percent: float):
+    from heart_counterfactual import counterfactuals
+    memo_key = (st.session_state.get("model_version"), tuple(float(v) for v in features[0]), target_percent)
+    memo = st.session_state.get("counterfactual_memo")
+    if memo is None or memo[0] != memo_key:
+        row = dict(zip(REQUIRED_FEATURES, features[0]))
+        feats = st.session_state.get("model_features") or REQUIRED_FEATURES
+        memo = (memo_key, counterfactuals(get_model(), row, feats, target=target_percent / 100.0))
+        st.session_state.counterfactual_memo = memo
+    res = memo[1]
+    if res["current_risk"] < res["target"]:
+        st.success(f"نسبة الخطر الحالية أقل من {target_percent:.0f}% بالفعل.")
+        return
+    if not res["found"]:
+        # أقل خطر بلغه البحث يُعرض فقط إن كان تحسناً فعلياً عن الخطر الحالي
+        extreme = res.get("extreme_risk")
+        better = extreme is not None and extreme < res["current_risk"]
+        st.info(f"لم نجد تغييراً ضمن الحدود الواقعية يُنزل الخطر تحت {target_percent:.0f}%"
+                + (f" (أقصى تحسين ممكن يصل إلى {extreme * 100:.1f}%)." if better else "."))
+        return
+    fmt = lambda v: f"{v:g}"
+    rows = [{
+        "الخيار": i + 1,
+        "التغييرات": "، ".join(f"{FEATURE_LABELS.get(f, f)} من {fmt(a)} إلى {fmt(b)}" for f, (a, b) in s["changes"].items()),
+        "نسبة الخطر بعد التغيير %": np.floor(s["risk"] * 1000) / 10,
+    } for i, s in enumerate(res["solutions"])]
+    st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+    st.caption(f"تم تقييم {res['evaluated']:,} بديلاً خلال {res['seconds'] * 1000:.0f} ميلي ثانية. "
+               "هذه تقديرات النموذج وليست خطة علاج؛ ناقش أي تغيير مع الطبيب.")
+
+# المُقيّم الخطي السريع للنسخة الحالية (يُبنى مرة لكل نسخة ويُشارك بين الجلسات)؛ None إن لم يكن النموذج خطياً
+@st.cache_resource(show_spinner=False, max_entries=4)
+def get_fast_scorer(version):
+    payload = get_live_model().payload
+    return compile_linear(payload["estimator"], payload["features"])
+
+# مؤشر المعاينة الفورية مخزن حسب القيمة المعروضة (بدقة عُشر بالمئة)
+@st.cache_resource(show_spinner=False, max_entries=1024)
+def preview_gauge(risk_tenths: int, color: str):
+    from heart_charts import risk_gauge
+    return risk_gauge(risk_tenths / 10.0, color)
+
+# معاينة الخطر داخل جزء نموذج الإدخال: كل تغيير في حقل يعيد تشغيل ذلك الجزء فقط، والحساب ضرب نقطي واحد
+def render_live_preview(features):
+    if get_model_client() is not None:
+        st.caption("المعاينة الفورية غير متاحة في وضع خادم النموذج المنفصل؛ استخدم زر التنبؤ.")
+        return
+    scorer = get_fast_scorer(get_live_model().version)
+    if scorer is None or not set(scorer.features) <= set(REQUIRED_FEATURES):
+        st.caption("المعاينة الفورية متاحة للنماذج الخطية (LogisticRegression) فقط؛ استخدم زر التنبؤ.")
+        return
+    values = dict(zip(REQUIRED_FEATURES, features[0]))
+    row = tuple(float(values[c]) for c in scorer.features)
+    # إعادة التشغيل بنفس القيم (مثل فتح نافذة مساعدة) لا تعيد الحساب
+    memo = st.session_state.get("live_preview_memo")
+    if memo is not None and memo[0] == (id(scorer), row):
+        label, proba, elapsed = memo[1]
+    else:
+        t0 = time.perf_counter()
+        label, proba = scorer.predict_row(row)
+        elapsed = time.perf_counter() - t0
+        st.session_state.live_preview_memo = ((id(scorer), row), (label, proba, elapsed))
+    fig = preview_gauge(int(round(proba * 1000)), "red" if label == 1 else "green")
+    st.plotly_chart(fig, use_container_width=True)
+    st.caption(f"معاينة فورية — النتيجة النهائية بعد الضغط على \"🔍 تنبؤ\" (زمن الحساب {elapsed * 1e6:.0f} ميكروثانية)")
 
+def predict_single(arr: np.ndarray):
+    model = get_model()
+    result = predict_row(model, st.session_state.get("model_features"), arr, get_prediction_broker())
+    # التسجيل وضع في طابور فقط؛ الكتابة للقرص في خيط السجل
+    audit = get_audit_log()
+    if audit is not None:
+        audit.log_single(np.atleast_2d(arr)[0], REQUIRED_FEATURES, result[0], result[1],
+                         st.session_state.username, st.session_state.get("model_version"))
+    return result
 
 # الصفحة الرئيسية
 if st.session_state.nav == "الصفحة الرئيسية":
@@ -1650,27 +1999,17 @@ if st.session_state.nav == "الصفحة الرئيسية":
     # إحصاءات وبطاقات معلومات لملء المساحة
     cA, cB, cC = st.columns(3)
     with cA:
-        last_acc = None
         mm = st.session_state.get("model_metrics")
         # محاولة تحميل المقاييس من ملف النموذج إذا لم تكن محملة بعد
         if not isinstance(mm, dict):
             try:
-                possible_paths = [
-                    Path(__file__).parent / "heart_model.pkl",
-                    Path.cwd() / "heart_model.pkl",
-                ]
-                for p in possible_paths:
-                    if p.exists():
-                        obj = joblib.load(str(p))
-                        if isinstance(obj, dict) and 'metrics' in obj:
-                            st.session_state.model_metrics = obj.get('metrics')
-                            mm = st.session_state.model_metrics
-                        break
+                obj = load_model_metadata()
+                if 'metrics' in obj:
+                    st.session_state.model_metrics = obj.get('metrics')
+                    mm = st.session_state.model_metrics
             except Exception:
                 pass
-        if isinstance(mm, dict):
-            last_acc = mm.get("accuracy")
-        acc_txt = f"{last_acc*100:.1f}%" if isinstance(last_acc, (int, float)) else "—"
+        acc_txt = format_accuracy(mm)
         st.markdown(f"<div class='stat fade-in'><div class='label'>دقة النموذج</div><div class='value'>{acc_txt}</div></div>", unsafe_allow_html=True)
     with cB:
         st.markdown("<div class='stat fade-in'><div class='label'>عدد السمات</div><div class='value'>13</div></div>", unsafe_allow_html=True)
@@ -1731,269 +2070,286 @@ elif st.session_state.nav == "نموذج التنبؤ":
             st.markdown("<hr>", unsafe_allow_html=True)
             st.markdown(body, unsafe_allow_html=True)
 
-    st.markdown("<div class='section-title'>المدخلات</div>", unsafe_allow_html=True)
-    with st.expander("📘 توثيق الترميزات المتوقعة"):
-        st.markdown(
-            """
-            - sex: 0=أنثى، 1=ذكر
-            - cp: 0=ألم نموذجي، 1=ألم غير نموذجي، 2=ألم غير قلبي، 3=لا أعراض
-            - restecg: 0=طبيعي، 1=شذوذ ST-T، 2=تضخّم بطين أيسر محتمل
-            - fbs: 0=لا، 1=نعم (سكر صائم > 120 mg/dl)
-            - exng: 0=لا، 1=نعم (ألم مع المجهود)
-            - slp: 0=هابط، 1=مستوٍ، 2=صاعد
-            - caa: 0..4 عدد الأوعية الرئيسية
-            - thall: 0=طبيعي، 1=عيب ثابت، 2=عيب قابل للعكس، 3=غير محدد/حسب المصدر
-            """
-        )
-    # تخطيط احترافي: مجموعات ضمن بطاقات، وكل بطاقة بعمودين لسهولة الإدخال
-    # المجموعة 1: البيانات الأساسية
-    st.markdown("""
-        <div class='card fade-in'>
-            <h4 style='margin-top:0'>👤 البيانات الأساسية</h4>
-        </div>
-    """, unsafe_allow_html=True)
-    col1, col2 = st.columns(2)
-    with col1:
-        c, h = st.columns([4, 1])
-        with c:
-            age = st.number_input("العمر (سنة)", min_value=18, max_value=120, value=30, key=keys["age"])
-        with h:
-            help_popover("العمر", """
-            <p>العمر بالسنوات.<br/>قيم أعلى قد ترتبط بخطر أعلى حسب الحالة السريرية.</p>
-            """)
-    with col2:
-        c, h = st.columns([4, 1])
-        with c:
-            sex = st.radio("الجنس", ["ذكر", "أنثى"], key=keys["sex"])
-        with h:
-            help_popover("الجنس (sex)", """
-            <ul>
-                <li>0 = أنثى</li>
-                <li>1 = ذكر</li>
-            </ul>
-            <p>يُستخدم ترميز رقمي لهذه القيم داخل النموذج.</p>
-            """)
-
-    # المجموعة 2: أعراض وفحوصات أساسية
-    st.markdown("""
-        <div class='card fade-in'>
-            <h4 style='margin-top:0'>🩺 الأعراض والفحوصات الأساسية</h4>
-        </div>
-    """, unsafe_allow_html=True)
-    col1, col2 = st.columns(2)
-    with col1:
-        c, h = st.columns([4, 1])
-        with c:
-            cp = st.selectbox("نوع ألم الصدر (cp)", [0, 1, 2, 3], key=keys["cp"])
-        with h:
-            help_popover("cp (ألم الصدر)", """
-            <ul>
-                <li>0 = ألم نموذجي</li>
-                <li>1 = ألم غير نموذجي</li>
-                <li>2 = ألم غير قلبي</li>
-                <li>3 = لا أعراض</li>
-            </ul>
-            """)
-    with col2:
-        c, h = st.columns([4, 1])
-        with c:
-            restecg = st.selectbox("نتائج تخطيط القلب (restecg)", [0, 1, 2], key=keys["restecg"])
-        with h:
-            help_popover("restecg (تخطيط القلب)", """
-            <ul>
-                <li>0 = طبيعي</li>
-                <li>1 = شذوذ ST-T</li>
-                <li>2 = تضخّم بطين أيسر محتمل</li>
-            </ul>
-            """)
-
-    # المجموعة 3: قياسات حيوية
-    st.markdown("""
-        <div class='card fade-in'>
-            <h4 style='margin-top:0'>📊 القياسات الحيوية</h4>
-        </div>
-    """, unsafe_allow_html=True)
-    col1, col2 = st.columns(2)
-    with col1:
-        c, h = st.columns([4, 1])
-        with c:
-            trtbps = st.number_input("ضغط انقباضي (mm Hg)", min_value=80, max_value=250, value=120, key=keys["trtbps"])
-        with h:
-            help_popover("trtbps (الضغط الانقباضي)", """
-            <p>ضغط الدم الانقباضي أثناء الراحة (mm Hg).<br/>تقريباً: 90–120 ضمن الطبيعي.</p>
-            """)
-    with col2:
-        c, h = st.columns([4, 1])
-        with c:
-            chol = st.number_input("الكوليسترول (mg/dl)", min_value=80, max_value=700, value=200, key=keys["chol"])
-        with h:
-            help_popover("chol (الكوليسترول)", """
-            <ul>
-                <li>&lt; 200 مرغوب</li>
-                <li>200–239 حدّي</li>
-                <li>≥ 240 مرتفع</li>
-            </ul>
-            """)
-    col1, col2 = st.columns(2)
-    with col1:
-        c, h = st.columns([4, 1])
-        with c:
-            fbs = st.radio("سكر صائم > 120 mg/dl", [0, 1], key=keys["fbs"])
-        with h:
-            help_popover("fbs (سكر صائم &gt; 120)", """
-            <ul>
-                <li>0 = لا</li>
-                <li>1 = نعم</li>
-            </ul>
-            """)
-    with col2:
-        c, h = st.columns([4, 1])
-        with c:
-            thalachh = st.number_input("أقصى معدل ضربات القلب", min_value=60, max_value=220, value=150, key=keys["thalachh"])
-        with h:
-            help_popover("thalachh (أقصى نبض)", """
-            <p>أعلى معدل ضربات قلب تم الوصول إليه أثناء الاختبار.</p>
-            """)
-
-    # المجموعة 4: المجهود و ST
-    st.markdown("""
-        <div class='card fade-in'>
-            <h4 style='margin-top:0'>🏃‍♂️ المجهود وقياس ST</h4>
-        </div>
-    """, unsafe_allow_html=True)
-    col1, col2 = st.columns(2)
-    with col1:
-        c, h = st.columns([4, 1])
-        with c:
-            exng = st.radio("ألم عند المجهود (exng)", [0, 1], key=keys["exng"])
-        with h:
-            help_popover("exng (ألم مجهود)", """
-            <ul>
-                <li>0 = لا</li>
-                <li>1 = نعم</li>
-            </ul>
-            """)
-    with col2:
-        c, h = st.columns([4, 1])
-        with c:
-            oldpeak = st.number_input("انخفاض ST (oldpeak)", min_value=0.0, max_value=10.0, value=1.0, step=0.1, key=keys["oldpeak"])
-        with h:
-            help_popover("oldpeak (انخفاض ST)", """
-            <p>انخفاض مقطع ST مقارنةً بالراحة.<br/>قيم أعلى قد تترافق مع خطر أعلى.</p>
-            """)
-    col1, col2 = st.columns(2)
-    with col1:
-        c, h = st.columns([4, 1])
-        with c:
-            slp = st.selectbox("ميل مقطع ST (slp)", [0, 1, 2], key=keys["slp"])
-        with h:
-            help_popover("slp (ميل ST)", """
-            <ul>
-                <li>0 = هابط</li>
-                <li>1 = مستوٍ</li>
-                <li>2 = صاعد</li>
-            </ul>
-            """)
-
-    # المجموعة 5: الأوعية والثلاسيميا
-    st.markdown("""
-        <div class='card fade-in'>
-            <h4 style='margin-top:0'>🧬 الأوعية والثلاسيميا</h4>
-        </div>
-    """, unsafe_allow_html=True)
-    col1, col2 = st.columns(2)
-    with col1:
-        c, h = st.columns([4, 1])
-        with c:
-            caa = st.selectbox("عدد الأوعية الرئيسية (caa)", [0, 1, 2, 3, 4], key=keys["caa"])
-        with h:
-            help_popover("caa (الأوعية الرئيسية)", """
-            <ul>
-                <li>0 = لا يوجد</li>
-                <li>1 = وعاء واحد</li>
-                <li>2 = وعاءان</li>
-                <li>3 = ثلاثة</li>
-                <li>4 = أربعة</li>
-            </ul>
-            """)
-    with col2:
-        c, h = st.columns([4, 1])
-        with c:
-            thall = st.selectbox("نوع الثلاسيميا (thall)", [0, 1, 2, 3], key=keys["thall"])
-        with h:
-            help_popover("thall (الثلاسيميا)", """
-            <ul>
-                <li>0 = طبيعي</li>
-                <li>1 = عيب ثابت</li>
-                <li>2 = عيب قابل للعكس</li>
-                <li>3 = غير محدد/حسب المصدر</li>
-            </ul>
-            """)
-
-    # إعداد القيم لاستخدامها في التنبؤ
-
-    sex_val = 1 if st.session_state.get(keys["sex"], "ذكر") == "ذكر" else 0
-    age = st.session_state.get(keys["age"], 30)
-    cp = st.session_state.get(keys["cp"], 0)
-    trtbps = st.session_state.get(keys["trtbps"], 120)
-    chol = st.session_state.get(keys["chol"], 200)
-    fbs = st.session_state.get(keys["fbs"], 0)
-    restecg = st.session_state.get(keys["restecg"], 0)
-    thalachh = st.session_state.get(keys["thalachh"], 150)
-    exng = st.session_state.get(keys["exng"], 0)
-    oldpeak = st.session_state.get(keys["oldpeak"], 1.0)
-    slp = st.session_state.get(keys["slp"], 0)
-    caa = st.session_state.get(keys["caa"], 0)
-    thall = st.session_state.get(keys["thall"], 0)
-
-    features = np.array([[age, sex_val, cp, trtbps, chol, fbs,
-                          restecg, thalachh, exng, oldpeak, slp,
-                          caa, thall]])
-
-    # تحقق إدخال إضافي
-    issues = []
-    if chol > 600:
-        issues.append("قيمة الكوليسترول تبدو عالية للغاية (>600 mg/dl)")
-    if trtbps < 70 or trtbps > 250:
-        issues.append("ضغط انقباضي خارج النطاق المنطقي (70–250)")
-    if thalachh < 50 or thalachh > 230:
-        issues.append("أقصى معدل ضربات القلب خارج النطاق المعتاد (50–230)")
-    if oldpeak < 0 or oldpeak > 10:
-        issues.append("قيمة oldpeak خارج النطاق (0–10)")
-    if issues:
-        st.warning("\n".join(["⚠️ تحقّق من المدخلات:"] + [f"- {m}" for m in issues]))
-
-    if st.button("🔍 تنبؤ"):
-        try:
-            with st.spinner("جاري تحليل البيانات..."):
-                pred, proba = predict_single(features)
-                risk_value = float(proba) * 100 if proba is not None else None
-                st.session_state.prediction = int(pred)
-                st.session_state.risk_value = risk_value
-                st.session_state.page = "result"
-                # إشعار وسطي مختصر
-                if risk_value is not None:
-                    if st.session_state.prediction == 1:
-                        queue_center_toast(f"⚠️ خطر محتمل ({risk_value:.1f}%)")
-                    else:
-                        queue_center_toast(f"✅ خطر منخفض ({risk_value:.1f}%)")
-                else:
-                    queue_center_toast("ℹ️ تم عرض التصنيف فقط لعدم توفر احتمال دقيق")
-                # إعادة تشغيل فورية لإظهار الإشعار والانتقال للنتيجة
-                st.rerun()
-        except FileNotFoundError as e:
-            st.error(str(e))
-        except Exception as e:
-            # لا تعرض RerunException كمخالفة؛ أعد رميها لتقوم ستريملت بإعادة التشغيل
-            if _RerunException is not None and isinstance(e, _RerunException):
-                raise e
-            st.exception(e)
+    # نموذج الإدخال جزء مستقل (fragment): تغيير أي حقل يعيد تشغيل هذا الجزء فقط،
+    # لا السكربت كاملاً (CSS، الشريط الجانبي، لوحة النتيجة ومخططاتها)؛ زر التنبؤ يعيد تشغيل الصفحة كاملة
+    @st.fragment
+    def prediction_form():
+        st.markdown("<div class='section-title'>المدخلات</div>", unsafe_allow_html=True)
+        with st.expander("📘 توثيق الترميزات المتوقعة"):
+            st.markdown(
+                """
+                - sex: 0=أنثى، 1=ذكر
+                - cp: 0=ألم نموذجي، 1=ألم غير نموذجي، 2=ألم غير قلبي، 3=لا أعراض
+                - restecg: 0=طبيعي، 1=شذوذ ST-T، 2=تضخّم بطين أيسر محتمل
+                - fbs: 0=لا، 1=نعم (سكر صائم > 120 mg/dl)
+                - exng: 0=لا، 1=نعم (ألم مع المجهود)
+                - slp: 0=هابط، 1=مستوٍ، 2=صاعد
+                - caa: 0..4 عدد الأوعية الرئيسية
+                - thall: 0=طبيعي، 1=عيب ثابت، 2=عيب قابل للعكس، 3=غير محدد/حسب المصدر
+                """
+            )
+        # تخطيط احترافي: مجموعات ضمن بطاقات، وكل بطاقة بعمودين لسهولة الإدخال
+        # المجموعة 1: البيانات الأساسية
+        st.markdown("""
+            <div class='card fade-in'>
+                <h4 style='margin-top:0'>👤 البيانات الأساسية</h4>
+            </div>
+        """, unsafe_allow_html=True)
+        col1, col2 = st.columns(2)
+        with col1:
+            c, h = st.columns([4, 1])
+            with c:
+                age = st.number_input("العمر (سنة)", min_value=18, max_value=120, value=30, key=keys["age"])
+            with h:
+                help_popover("العمر", """
+                <p>العمر بالسنوات.<br/>قيم أعلى قد ترتبط بخطر أعلى حسب الحالة السريرية.</p>
+                """)
+        with col2:
+            c, h = st.columns([4, 1])
+            with c:
+                sex = st.radio("الجنس", ["ذكر", "أنثى"], key=keys["sex"])
+            with h:
+                help_popover("الجنس (sex)", """
+                <ul>
+                    <li>0 = أنثى</li>
+                    <li>1 = ذكر</li>
+                </ul>
+                <p>يُستخدم ترميز رقمي لهذه القيم داخل النموذج.</p>
+                """)
 
-    # عرض النتيجة ضمن صفحة نموذج التنبؤ
-    if st.session_state.page == "result":
+        # المجموعة 2: أعراض وفحوصات أساسية
+        st.markdown("""
+            <div class='card fade-in'>
+                <h4 style='margin-top:0'>🩺 الأعراض والفحوصات الأساسية</h4>
+            </div>
+        """, unsafe_allow_html=True)
+        col1, col2 = st.columns(2)
+        with col1:
+            c, h = st.columns([4, 1])
+            with c:
+                cp = st.selectbox("نوع ألم الصدر (cp)", [0, 1, 2, 3], key=keys["cp"])
+            with h:
+                help_popover("cp (ألم الصدر)", """
+                <ul>
+                    <li>0 = ألم نموذجي</li>
+                    <li>1 = ألم غير نموذجي</li>
+                    <li>2 = ألم غير قلبي</li>
+                    <li>3 = لا أعراض</li>
+                </ul>
+                """)
+        with col2:
+            c, h = st.columns([4, 1])
+            with c:
+                restecg = st.selectbox("نتائج تخطيط القلب (restecg)", [0, 1, 2], key=keys["restecg"])
+            with h:
+                help_popover("restecg (تخطيط القلب)", """
+                <ul>
+                    <li>0 = طبيعي</li>
+                    <li>1 = شذوذ ST-T</li>
+                    <li>2 = تضخّم بطين أيسر محتمل</li>
+                </ul>
+                """)
+
+        # المجموعة 3: قياسات حيوية
+        st.markdown("""
+            <div class='card fade-in'>
+                <h4 style='margin-top:0'>📊 القياسات الحيوية</h4>
+            </div>
+        """, unsafe_allow_html=True)
+        col1, col2 = st.columns(2)
+        with col1:
+            c, h = st.columns([4, 1])
+            with c:
+                trtbps = st.number_input("ضغط انقباضي (mm Hg)", min_value=80, max_value=250, value=120, key=keys["trtbps"])
+            with h:
+                help_popover("trtbps (الضغط الانقباضي)", """
+                <p>ضغط الدم الانقباضي أثناء الراحة (mm Hg).<br/>تقريباً: 90–120 ضمن الطبيعي.</p>
+                """)
+        with col2:
+            c, h = st.columns([4, 1])
+            with c:
+                chol = st.number_input("الكوليسترول (mg/dl)", min_value=80, max_value=700, value=200, key=keys["chol"])
+            with h:
+                help_popover("chol (الكوليسترول)", """
+                <ul>
+                    <li>&lt; 200 مرغوب</li>
+                    <li>200–239 حدّي</li>
+                    <li>≥ 240 مرتفع</li>
+                </ul>
+                """)
+        col1, col2 = st.columns(2)
+        with col1:
+            c, h = st.columns([4, 1])
+            with c:
+                fbs = st.radio("سكر صائم > 120 mg/dl", [0, 1], key=keys["fbs"])
+            with h:
+                help_popover("fbs (سكر صائم &gt; 120)", """
+                <ul>
+                    <li>0 = لا</li>
+                    <li>1 = نعم</li>
+                </ul>
+                """)
+        with col2:
+            c, h = st.columns([4, 1])
+            with c:
+                thalachh = st.number_input("أقصى معدل ضربات القلب", min_value=60, max_value=220, value=150, key=keys["thalachh"])
+            with h:
+                help_popover("thalachh (أقصى نبض)", """
+                <p>أعلى معدل ضربات قلب تم الوصول إليه أثناء الاختبار.</p>
+                """)
+
+        # المجموعة 4: المجهود و ST
+        st.markdown("""
+            <div class='card fade-in'>
+                <h4 style='margin-top:0'>🏃‍♂️ المجهود وقياس ST</h4>
+            </div>
+        """, unsafe_allow_html=True)
+        col1, col2 = st.columns(2)
+        with col1:
+            c, h = st.columns([4, 1])
+            with c:
+                exng = st.radio("ألم عند المجهود (exng)", [0, 1], key=keys["exng"])
+            with h:
+                help_popover("exng (ألم مجهود)", """
+                <ul>
+                    <li>0 = لا</li>
+                    <li>1 = نعم</li>
+                </ul>
+                """)
+        with col2:
+            c, h = st.columns([4, 1])
+            with c:
+                oldpeak = st.number_input("انخفاض ST (oldpeak)", min_value=0.0, max_value=10.0, value=1.0, step=0.1, key=keys["oldpeak"])
+            with h:
+                help_popover("oldpeak (انخفاض ST)", """
+                <p>انخفاض مقطع ST مقارنةً بالراحة.<br/>قيم أعلى قد تترافق مع خطر أعلى.</p>
+                """)
+        col1, col2 = st.columns(2)
+        with col1:
+            c, h = st.columns([4, 1])
+            with c:
+                slp = st.selectbox("ميل مقطع ST (slp)", [0, 1, 2], key=keys["slp"])
+            with h:
+                help_popover("slp (ميل ST)", """
+                <ul>
+                    <li>0 = هابط</li>
+                    <li>1 = مستوٍ</li>
+                    <li>2 = صاعد</li>
+                </ul>
+                """)
+
+        # المجموعة 5: الأوعية والثلاسيميا
+        st.markdown("""
+            <div class='card fade-in'>
+                <h4 style='margin-top:0'>🧬 الأوعية والثلاسيميا</h4>
+            </div>
+        """, unsafe_allow_html=True)
+        col1, col2 = st.columns(2)
+        with col1:
+            c, h = st.columns([4, 1])
+            with c:
+                caa = st.selectbox("عدد الأوعية الرئيسية (caa)", [0, 1, 2, 3, 4], key=keys["caa"])
+            with h:
+                help_popover("caa (الأوعية الرئيسية)", """
+                <ul>
+                    <li>0 = لا يوجد</li>
+                    <li>1 = وعاء واحد</li>
+                    <li>2 = وعاءان</li>
+                    <li>3 = ثلاثة</li>
+                    <li>4 = أربعة</li>
+                </ul>
+                """)
+        with col2:
+            c, h = st.columns([4, 1])
+            with c:
+                thall = st.selectbox("نوع الثلاسيميا (thall)", [0, 1, 2, 3], key=keys["thall"])
+            with h:
+                help_popover("thall (الثلاسيميا)", """
+                <ul>
+                    <li>0 = طبيعي</li>
+                    <li>1 = عيب ثابت</li>
+                    <li>2 = عيب قابل للعكس</li>
+                    <li>3 = غير محدد/حسب المصدر</li>
+                </ul>
+                """)
+
+        # إعداد القيم لاستخدامها في التنبؤ
+
+        sex_val = 1 if st.session_state.get(keys["sex"], "ذكر") == "ذكر" else 0
+        age = st.session_state.get(keys["age"], 30)
+        cp = st.session_state.get(keys["cp"], 0)
+        trtbps = st.session_state.get(keys["trtbps"], 120)
+        chol = st.session_state.get(keys["chol"], 200)
+        fbs = st.session_state.get(keys["fbs"], 0)
+        restecg = st.session_state.get(keys["restecg"], 0)
+        thalachh = st.session_state.get(keys["thalachh"], 150)
+        exng = st.session_state.get(keys["exng"], 0)
+        oldpeak = st.session_state.get(keys["oldpeak"], 1.0)
+        slp = st.session_state.get(keys["slp"], 0)
+        caa = st.session_state.get(keys["caa"], 0)
+        thall = st.session_state.get(keys["thall"], 0)
+
+        features = np.array([[age, sex_val, cp, trtbps, chol, fbs,
+                              restecg, thalachh, exng, oldpeak, slp,
+                              caa, thall]])
+
+        # تحقق إدخال إضافي
+        issues = []
+        if chol > 600:
+            issues.append("قيمة الكوليسترول تبدو عالية للغاية (>600 mg/dl)")
+        if trtbps < 70 or trtbps > 250:
+            issues.append("ضغط انقباضي خارج النطاق المنطقي (70–250)")
+        if thalachh < 50 or thalachh > 230:
+            issues.append("أقصى معدل ضربات القلب خارج النطاق المعتاد (50–230)")
+        if oldpeak < 0 or oldpeak > 10:
+            issues.append("قيمة oldpeak خارج النطاق (0–10)")
+        if issues:
+            st.warning("\n".join(["⚠️ تحقّق من المدخلات:"] + [f"- {m}" for m in issues]))
+
+        if st.toggle("⚡ معاينة فورية للخطر", key="live_preview"):
+            render_live_preview(features)
+
+        if st.button("🔍 تنبؤ"):
+            try:
+                with st.spinner("جاري تحليل البيانات..."):
+                    pred, proba, spread = predict_single(features)
+                    risk_value = float(proba) * 100 if proba is not None else None
+                    st.session_state.prediction = int(pred)
+                    st.session_state.risk_value = risk_value
+                    st.session_state.risk_spread = spread if risk_value is not None else None
+                    # لقطة المدخلات وقت التنبؤ: لوحة النتيجة تعرضها حتى لو عُدّلت الحقول بعد ذلك
+                    st.session_state.prediction_inputs = features
+                    st.session_state.page = "result"
+                    # إشعار وسطي مختصر
+                    if risk_value is not None:
+                        if st.session_state.prediction == 1:
+                            queue_center_toast(f"⚠️ خطر محتمل ({risk_value:.1f}%)")
+                        else:
+                            queue_center_toast(f"✅ خطر منخفض ({risk_value:.1f}%)")
+                    else:
+                        queue_center_toast("ℹ️ تم عرض التصنيف فقط لعدم توفر احتمال دقيق")
+                    # إعادة تشغيل فورية لإظهار الإشعار والانتقال للنتيجة
+                    st.rerun()
+            except FileNotFoundError as e:
+                st.error(str(e))
+            except Exception as e:
+                # لا تعرض RerunException كمخالفة؛ أعد رميها لتقوم ستريملت بإعادة التشغيل
+                if _RerunException is not None and isinstance(e, _RerunException):
+                    raise e
+                st.exception(e)
+
+    prediction_form()
+
+    # لوحة النتيجة جزء مستقل أيضاً تعرض لقطة المدخلات وقت التنبؤ
+    @st.fragment
+    def prediction_result():
         st.subheader(f"📊 نتيجة التنبؤ للمستخدم {st.session_state.username}")
         risk_value = st.session_state.get("risk_value", 0.0)
         pred_label = st.session_state.get("prediction", 0)
+        features = st.session_state.get("prediction_inputs")
+        if features is None:
+            return
+        age, trtbps, chol, thalachh = (int(features[0][i]) for i in (0, 3, 4, 7))
 
         # لوحة ملونة حسب مستوى الخطر
         if risk_value is None:
@@ -2034,34 +2390,15 @@ elif st.session_state.nav == "نموذج التنبؤ":
             # لا نعرض أي عتبة هنا بناءً على طلبك
             st.write("")
 
-        # رسم نسبة الخطر باستخدام Plotly Gauge
+        # رسم نسبة الخطر (Gauge) ومخطط دونات الخطر مقابل الأمان
         if risk_value is not None:
-            fig = go.Figure(go.Indicator(
-            mode="gauge+number",
-            value=risk_value,
-            number={'suffix': "%"},
-            gauge={
-                'axis': {'range': [0, 100]},
-                'bar': {'color': color},
-                'steps': [
-                    {'range': [0, 30], 'color': "#c6f5d9"},
-                    {'range': [30, 70], 'color': "#fff2cc"},
-                    {'range': [70, 100], 'color': "#f4c7c3"}
-                ],
-                'threshold': {
-                    'line': {'color': "black", 'width': 4},
-                    'thickness': 0.75,
-                    'value': risk_value
-                }
-            }
-            ))
+            spread = st.session_state.get("risk_spread")
+            band = None if spread is None else (round(spread["low"] * 100, 1), round(spread["high"] * 100, 1))
+            fig, pie = result_figures(risk_value, color, band)
             st.plotly_chart(fig, use_container_width=True)
-
-        # مخطط دونات لنسبة الخطر مقابل الأمان
-        if risk_value is not None:
-            safe = max(0.0, 100.0 - risk_value)
-            pie = go.Figure(data=[go.Pie(labels=["خطر", "آمن"], values=[risk_value, safe], hole=.6, marker_colors=["#e76f51", "#2a9d8f"])])
-            pie.update_layout(showlegend=True)
+            if spread is not None:
+                st.caption(f"مدى اتفاق أشجار الغابة: 90% من الأشجار تقدّر الخطر بين {band[0]:.1f}% و {band[1]:.1f}% "
+                           f"(انحراف معياري {spread['std'] * 100:.1f} نقطة)؛ المدى الواسع يعني أن النتيجة أقل يقيناً.")
             st.plotly_chart(pie, use_container_width=True)
         else:
             st.info("تم عرض التصنيف فقط لعدم توفر احتمالات دقيقة من النموذج الحالي.")
@@ -2075,6 +2412,33 @@ elif st.session_state.nav == "نموذج التنبؤ":
         st.markdown("### مقارنة بالقيم المرجعية")
         st.dataframe(ref, use_container_width=True)
 
+        st.markdown("### 🧭 لماذا هذه النتيجة؟")
+        try:
+            render_contributions(features)
+        except Exception as e:
+            st.warning(f"تعذر حساب مساهمات السمات: {e}")
+
+        if risk_value is not None:
+            st.markdown("### 🔀 ماذا لو؟")
+            try:
+                render_what_if(features)
+            except Exception as e:
+                st.warning(f"تعذر حساب تحليل ماذا لو: {e}")
+
+        st.markdown("### 👥 مرضى مشابهون")
+        try:
+            render_similar_patients(features)
+        except Exception as e:
+            st.warning(f"تعذر البحث عن مرضى مشابهين: {e}")
+
+        if risk_value is not None:
+            st.markdown("### 🎯 كيف أخفّض الخطر؟")
+            target = st.slider("الحد المطلوب لنسبة الخطر (%)", 5, 95, 30, step=5, key="counterfactual_target")
+            try:
+                render_counterfactuals(features, float(target))
+            except Exception as e:
+                st.warning(f"تعذر البحث عن تغييرات مقترحة: {e}")
+
         with st.expander("🩺 نصائح"):
             st.markdown(advice)
 
@@ -2093,28 +2457,46 @@ elif st.session_state.nav == "نموذج التنبؤ":
             st.session_state.page = "form"
             st.rerun()
 
+    if st.session_state.page == "result":
+        prediction_result()
+
 # صفحة تدريب النموذج
 elif st.session_state.nav == "تدريب النموذج":
     st.header("🧠 تدريب نموذج جديد من CSV")
-    st.caption("يمكنك رفع ملف أو عدة ملفات CSV وسيتم دمجها. اختر العمود الهدف ثم الإعدادات.")
+    st.caption("يمكنك رفع ملف أو عدة ملفات CSV وسيتم دمجها، أو التدريب من مخزن البيانات مباشرةً. اختر العمود الهدف ثم الإعدادات.")
 
-    uploads = st.file_uploader("اختر ملف/ملفات CSV", type=["csv"], accept_multiple_files=True)
-    if uploads:
+    data_source = st.radio("مصدر البيانات", ["رفع ملفات CSV", "مخزن البيانات (Parquet)"], horizontal=True)
+    uploads = None
+    store_name = None
+    if data_source == "رفع ملفات CSV":
+        uploads = st.file_uploader("اختر ملف/ملفات CSV", type=["csv"], accept_multiple_files=True)
+    else:
+        from heart_store import list_datasets, manifest_version
+        store_names = list_datasets()
+        if store_names:
+            store_name = st.selectbox("المجموعة", store_names)
+        else:
+            st.info("المخزن فارغ. أدخل ملفات CSV مرة واحدة أولاً: python heart_store.py ingest <ملفات CSV>")
+    if uploads or store_name:
         try:
-            dfs = []
             required_features = [
                 "age","sex","cp","trtbps","chol","fbs","restecg","thalachh","exng","oldpeak","slp","caa","thall"
             ]
-            # تحقق لكل ملف على حدة قبل الدمج
-            for f in uploads:
-                df_i = read_csv_auto(f)
-                miss_i = [c for c in required_features if c not in df_i.columns]
-                if miss_i:
-                    st.error(f"لا يمكن قبول الملف '{getattr(f, 'name', 'CSV')}' لغياب الخصائص: " + ", ".join(miss_i))
-                    st.stop()
-                dfs.append(df_i)
-            df_all = pd.concat(dfs, axis=0, ignore_index=True)
-            st.success(f"تم تحميل {len(uploads)} ملف/ملفات. الإجمالي: {df_all.shape[0]} سجل، {df_all.shape[1]} عمود")
+            if store_name:
+                df_all = load_store_dataset(store_name, manifest_version(store_name))
+                st.success(f"تم تحميل المجموعة '{store_name}' من المخزن. الإجمالي: {df_all.shape[0]} سجل، {df_all.shape[1]} عمود")
+            else:
+                dfs = []
+                # تحقق لكل ملف على حدة قبل الدمج
+                for f in uploads:
+                    df_i = read_csv_auto(f)
+                    miss_i = [c for c in required_features if c not in df_i.columns]
+                    if miss_i:
+                        st.error(f"لا يمكن قبول الملف '{getattr(f, 'name', 'CSV')}' لغياب الخصائص: " + ", ".join(miss_i))
+                        st.stop()
+                    dfs.append(df_i)
+                df_all = pd.concat(dfs, axis=0, ignore_index=True)
+                st.success(f"تم تحميل {len(uploads)} ملف/ملفات. الإجمالي: {df_all.shape[0]} سجل، {df_all.shape[1]} عمود")
             st.dataframe(df_all.head(20), use_container_width=True)
 
             # فرض توافق الخصائص الأساسية مع واجهة الإدخال
@@ -2137,6 +2519,7 @@ elif st.session_state.nav == "تدريب النموذج":
                 random_state = st.number_input("random_state", min_value=0, value=42, step=1)
                 class_weight_balanced = st.checkbox("استخدام class_weight='balanced'", value=True)
                 scale_features = st.checkbox("تقييس السمات (StandardScaler) - مفيد مع LogisticRegression", value=True)
+                cv_folds = st.slider("عدد طيّات التحقق المتقاطع (k-fold، 0 = تعطيل)", 0, 10, 5, step=1)
 
             # تثبيت أعمدة السمات على الخصائص الأساسية حصراً
             feat_cols = required_features
@@ -2149,98 +2532,83 @@ elif st.session_state.nav == "تدريب النموذج":
                         st.error("العمود الهدف غير موجود.")
                         st.stop()
 
-                    # إزالة السجلات ذات القيم المفقودة في الأعمدة المستخدمة
-                    work = df_all[feat_cols + [target_col]].dropna()
-
-                    # تحويل الهدف إلى int إن أمكن مع توثيق الخريطة
-                    y = work[target_col]
-                    y_mapping = None
-                    if y.dtype != int and y.dtype != np.int64:
+                    # مفتاح الذاكرة المؤقتة: بصمة البيانات المدمجة المستخدمة + الإعدادات
+                    train_params = {
+                        "target": target_col,
+                        "features": feat_cols,
+                        "algo": algo,
+                        "test_size": float(test_size),
+                        "random_state": int(random_state),
+                        "class_weight_balanced": bool(class_weight_balanced),
+                        "scale_features": bool(scale_features),
+                        "cv_folds": int(cv_folds),
+                    }
+                    from heart_cache import training_key
+                    from heart_training import train_model
+                    train_cache = get_training_cache()
+                    cache_key = training_key(df_all[feat_cols + [target_col]], train_params)
+                    entry = train_cache.get(cache_key)
+                    if entry is not None:
+                        st.info("⚡ تم استرجاع نموذج مدرّب مسبقاً بنفس البيانات والإعدادات من الذاكرة المؤقتة.")
+                    else:
+                        with st.spinner("جاري تدريب النموذج..."):
+                            payload, report = train_model(
+                                df_all, target_col, feat_cols, algo=algo, test_size=test_size,
+                                random_state=int(random_state), class_weight_balanced=class_weight_balanced,
+                                scale_features=scale_features, cv_folds=int(cv_folds),
+                            )
+                        entry = {"payload": payload, "report": report}
                         try:
-                            y = y.astype(int)
+                            train_cache.put(cache_key, entry)
                         except Exception:
-                            # محاولة تحويل الفئات النصية إلى أرقام
-                            y_cat = y.astype("category")
-                            y_mapping = dict(enumerate(y_cat.cat.categories))
-                            y = y_cat.cat.codes
-
-                    X = work[feat_cols]
-
-                    # معالجة الأنواع غير الرقمية تلقائياً
-                    num_cols = [c for c in feat_cols if np.issubdtype(X[c].dtype, np.number)]
-                    cat_cols = [c for c in feat_cols if c not in num_cols]
-
-                    X_train, X_test, y_train, y_test = train_test_split(
-                        X, y, test_size=test_size, random_state=random_state, stratify=y if len(y.unique()) > 1 else None
-                    )
-
-                    # إنشاء بايبلاين ما قبل المعالجة
-                    transformers = []
-                    if num_cols:
-                        transformers.append(("num", StandardScaler() if (algo == "LogisticRegression" and scale_features) else "passthrough", num_cols))
-                    if cat_cols:
-                        transformers.append(("cat", OneHotEncoder(handle_unknown='ignore'), cat_cols))
-                    pre = ColumnTransformer(transformers=transformers, remainder='drop')
-
-                    # إنشاء النموذج
-                    if algo == "LogisticRegression":
-                        base = LogisticRegression(max_iter=200, class_weight='balanced' if class_weight_balanced else None)
-                        clf = Pipeline([
-                            ("pre", pre),
-                            ("clf", base)
-                        ])
-                    else:
-                        base = RandomForestClassifier(n_estimators=300, random_state=random_state, class_weight='balanced' if class_weight_balanced else None)
-                        clf = Pipeline([
-                            ("pre", pre),
-                            ("clf", base)
-                        ])
-
-                    with st.spinner("جاري تدريب النموذج..."):
-                        clf.fit(X_train, y_train)
+                            # فشل التخزين المؤقت لا يجب أن يُفشل التدريب
+                            pass
+                    payload, report = entry["payload"], entry["report"]
+                    y_mapping = report.get("target_mapping")
 
                     # تقييم
-                    y_pred = clf.predict(X_test)
-                    acc = accuracy_score(y_test, y_pred)
+                    acc = report["accuracy"]
                     st.success(f"✅ الدقة (Accuracy): {acc:.3f}")
-
-                    try:
-                        if hasattr(clf, "predict_proba"):
-                            y_proba = clf.predict_proba(X_test)[:, 1]
-                            try:
-                                auc = roc_auc_score(y_test, y_proba)
-                                st.info(f"ROC-AUC: {auc:.3f}")
-                            except Exception:
-                                pass
-                    except Exception:
-                        pass
+                    if report.get("roc_auc") is not None:
+                        st.info(f"ROC-AUC: {report['roc_auc']:.3f}")
+
+                    # نتائج التحقق المتقاطع: المتوسط ± فترة الثقة لكل مقياس
+                    cv = report.get("cv")
+                    if cv:
+                        st.markdown(f"### التحقق المتقاطع ({cv['n_splits']} طيّات، ثقة {cv['confidence']*100:.0f}%)")
+                        cv_rows = []
+                        for name, summ in [("Accuracy", cv.get("accuracy")), ("ROC-AUC", cv.get("roc_auc"))]:
+                            if summ:
+                                cv_rows.append((name, summ))
+                        for cls, summ in cv.get("precision", {}).items():
+                            if summ:
+                                cv_rows.append((f"Precision [{cls}]", summ))
+                        for cls, summ in cv.get("recall", {}).items():
+                            if summ:
+                                cv_rows.append((f"Recall [{cls}]", summ))
+                        cv_df = pd.DataFrame({
+                            "المقياس": [n for n, _ in cv_rows],
+                            "المتوسط": [round(s["mean"], 3) for _, s in cv_rows],
+                            "فترة الثقة": [f"{s['ci_low']:.3f} – {s['ci_high']:.3f}" for _, s in cv_rows],
+                            "الانحراف المعياري": [round(s["std"], 3) for _, s in cv_rows],
+                        })
+                        st.dataframe(cv_df, use_container_width=True)
 
                     # تقرير تصنيفي
                     st.markdown("### تقرير تصنيفي")
-                    rep = classification_report(y_test, y_pred, output_dict=False, digits=3)
-                    st.code(rep)
+                    st.code(report["classification_report"])
 
                     # مصفوفة الالتباس
                     st.markdown("### مصفوفة الالتباس")
-                    cm = confusion_matrix(y_test, y_pred)
-                    fig_cm = go.Figure(data=go.Heatmap(z=cm, colorscale='Blues'))
-                    fig_cm.update_layout(xaxis_title='Predicted', yaxis_title='Actual')
-                    st.plotly_chart(fig_cm, use_container_width=True)
+                    from heart_charts import confusion_heatmap
+                    st.plotly_chart(confusion_heatmap(report["confusion_matrix"]), use_container_width=True)
 
                     # أهمية السمات أو المعاملات
                     st.divider()
                     st.markdown("### أهمية السمات")
-                    try:
-                        final_est = clf.named_steps.get("clf", clf)
-                        if hasattr(final_est, "feature_importances_") and len(cat_cols) == 0:
-                            imp = pd.Series(final_est.feature_importances_, index=feat_cols).sort_values(ascending=False)
-                            st.bar_chart(imp)
-                        elif hasattr(final_est, "coef_") and len(cat_cols) == 0:
-                            coef = pd.Series(final_est.coef_[0], index=feat_cols).sort_values(ascending=False)
-                            st.bar_chart(coef)
-                        else:
-                            st.caption("تعذر إظهار أهمية السمات عند استخدام ترميز/تحويلات تجعل أسماء السمات مختلفة عن الأصل.")
-                    except Exception:
+                    if report.get("importance") is not None:
+                        render_importance(report["importance"])
+                    else:
                         st.caption("لا تتوفر أهمية السمات لهذا النموذج.")
 
                     # عرض خريطة ترميز الهدف إن وُجدت
@@ -2249,29 +2617,20 @@ elif st.session_state.nav == "تدريب النموذج":
                         map_df = pd.DataFrame(list(y_mapping.items()), columns=["label_id", "label_name"]).sort_values("label_id")
                         st.dataframe(map_df, use_container_width=True)
 
-                    # حفظ النموذج
-                    model_path = Path(__file__).parent / "heart_model.pkl"
+                    # حفظ النموذج كنسخة جديدة ثابتة في سجل النماذج (كتابة ذرّية، دون المساس بالنسخة الفعالة)
                     try:
                         # حفظ مع ميتاداتا: الأعمدة، المقاييس، وخريطة الهدف إن وجدت
-                        metrics = {"accuracy": float(acc)}
-                        payload = {"estimator": clf, "features": feat_cols, "metrics": metrics}
-                        if y_mapping is not None:
-                            payload["target_mapping"] = y_mapping
-                        joblib.dump(payload, model_path)
-                        st.success(f"💾 تم حفظ النموذج في: {model_path}")
-                        # تعيين المقاييس فوراً في الجلسة لعرض الدقة على الصفحة الرئيسية
-                        st.session_state.model_metrics = metrics
+                        from heart_neighbors import index_path
+                        neighbors = {index_path(MODEL_FILE).name: report.get("neighbor_index")}
+                        version = publish(payload, activate=False, attachments=neighbors, note=f"{algo} — " + (f"store:{store_name}" if store_name else ", ".join(getattr(f, "name", "CSV") for f in uploads)))
+                        model_path = version_path(version)
+                        st.session_state.last_published_version = version
+                        st.success(f"💾 تم حفظ النموذج كنسخة {version} في: {model_path}")
 
                         # إتاحة التنزيل
                         with open(model_path, "rb") as mf:
                             st.download_button("⬇️ تنزيل النموذج المدرب", data=mf.read(), file_name="heart_model.pkl")
-
-                        # زر لتفعيل النموذج فوراً في التطبيق
-                        st.divider()
-                        if st.button("✅ استخدام النموذج المدرب الآن"):
-                            load_model.clear()
-                            _ = load_model()
-                            queue_center_toast("✅ تم تفعيل النموذج الجديد")
+                        st.info("لتفعيل هذه النسخة لكل المستخدمين استخدم قسم \"🗂️ نسخ النموذج\" أدناه.")
                     except Exception as e:
                         st.error(f"تعذر حفظ النموذج: {e}")
 
@@ -2282,111 +2641,374 @@ elif st.session_state.nav == "تدريب النموذج":
             st.exception(e)
 
 
+    # سجل النسخ: التفعيل أو التراجع يغيّر المؤشر CURRENT فقط، وكل العمليات تلتقط التغيير خلال ثانية تقريباً
+    st.divider()
+    st.markdown("### 🗂️ نسخ النموذج")
+    versions = list_versions()
+    if not versions:
+        st.caption("لا توجد نسخ في السجل بعد؛ يُستخدم الملف heart_model.pkl.")
+    else:
+        active = current_version()
+        labels = {m["version"]: f"{m['version']}" + (" (الفعالة)" if m["version"] == active else "")
+                  + (f" — دقة {m['cv_accuracy'] or m['accuracy']:.3f}" if (m.get("cv_accuracy") or m.get("accuracy")) else "")
+                  for m in versions}
+        ids = [m["version"] for m in reversed(versions)]
+        preferred = st.session_state.get("last_published_version") or active
+        chosen = st.selectbox("النسخة", ids, index=ids.index(preferred) if preferred in ids else 0,
+                              format_func=lambda v: labels[v])
+        cV1, cV2 = st.columns(2)
+        with cV1:
+            if st.button("✅ تفعيل هذه النسخة", disabled=(chosen == active)):
+                activate_version(chosen)
+                if get_model_client() is None:
+                    get_live_model().refresh()
+                queue_center_toast(f"✅ تم تفعيل النسخة {chosen}")
+                st.rerun()
+        with cV2:
+            if st.button("↩️ التراجع للنسخة السابقة", disabled=active is None):
+                try:
+                    back = rollback()
+                    if get_model_client() is None:
+                        get_live_model().refresh()
+                    queue_center_toast(f"↩️ النسخة الفعالة الآن {back}")
+                    st.rerun()
+                except ValueError as e:
+                    st.warning(str(e))
+
 # التنبؤ الدفعي عبر CSV
 elif st.session_state.nav == "رفع ملف CSV":
     st.header("📂 رفع ملف CSV للتنبؤ الدفعي")
     st.caption("ينبغي أن يحتوي الملف على الأعمدة التالية مرتبة أو بأسماء مطابقة: age, sex, cp, trtbps, chol, fbs, restecg, thalachh, exng, oldpeak, slp, caa, thall")
 
+    # تحليلات الدفعة جزء مستقل: تحريك العتبة أو تقليب الصفحات يعيد تشغيل هذا الجزء فقط على تجميعات محسوبة
+    # مرة وقت التقييم (مدرج، نقاط مئوية، عينة، ترتيب الخطر)؛ لا يُنسخ ولا يُرتب ولا يُرسل جدول الدفعة كاملاً
+    @st.fragment
+    def batch_analytics(batch):
+        out = batch["out"]
+        thr = st.slider("اختر العتبة (%)", 0.0, 100.0, 50.0, step=1.0)
+        # الخطر مرتب تنازلياً: عدد الحالات ≥ العتبة بحث ثنائي
+        n_high = int(np.searchsorted(-batch["risk_sorted"], -thr, side="right"))
+        st.write(f"عدد الحالات عالية الخطر (≥ {thr:.0f}%): {n_high}")
+
+        # توزيع الخطر وعدادات الفئات المتنبأ بها
+        render_distribution(*batch["hist"], batch["summary"], batch["sample"], "batch_dist")
+        st.plotly_chart(batch["bar_fig"], use_container_width=True)
+
+        # جدول الحالات فوق العتبة بالأعلى خطراً أولاً، صفحة صفحة من الترتيب المحسوب مسبقاً
+        st.markdown("### أعلى الحالات خطراً")
+        c1, c2 = st.columns(2)
+        with c1:
+            page_size = st.selectbox("عدد السجلات في الصفحة", [10, 25, 50, 100], key="batch_page_size")
+        n_pages = max(1, -(-n_high // page_size))
+        with c2:
+            # المفتاح يتبع عدد الصفحات فتعود للأولى عند تغيير العتبة أو حجم الصفحة
+            page_no = st.number_input("الصفحة", min_value=1, max_value=n_pages, value=1, step=1,
+                                      key=f"batch_page_{n_pages}")
+        start = (int(page_no) - 1) * page_size
+        top_df = out.iloc[batch["order"][start:min(start + page_size, n_high)]].assign(high_risk=True)
+        st.dataframe(top_df, use_container_width=True)
+        st.caption(f"الصفحة {int(page_no)} من {n_pages:,} — {n_high:,} حالة ≥ {thr:.0f}%")
+
+        st.markdown("### 🧩 تحليل الشرائح")
+        render_segments(batch["cube"], "batch_segments")
+
+        # أعمدة المساهمات اختيارية: تُحسب مرة لكل ملف عند الطلب وتُلحق بملف التنزيل فقط
+        extra = []
+        if st.checkbox("إضافة مساهمات السمات (contrib_*) وأهم العوامل إلى ملف التنزيل", key="batch_contrib"):
+            if "contrib" not in batch:
+                local = get_local_estimator()
+                if local is None:
+                    st.info("مساهمات السمات غير متاحة عند تشغيل النموذج على خادم منفصل.")
+                else:
+                    # الكلفة تُقدَّر من بنية الأشجار (سجلات × أوراق × عمق²) قبل البدء
+                    from heart_explain import contribution_columns, explain_cost
+                    units, seconds = explain_cost(local[0], len(out), local[1], n_jobs=-1)
+                    if seconds > CONTRIB_MAX_SECONDS:
+                        eta = f"{seconds / 60:,.0f} دقيقة" if seconds >= 60 else f"{seconds:.0f} ثانية"
+                        st.warning(f"حساب المساهمات لـ {len(out):,} سجل يُقدَّر بنحو {eta} "
+                                   f"({units:,} سجل×ورقة)، أكثر من حد الواجهة ({CONTRIB_MAX_SECONDS:.0f} ث). "
+                                   "شغّله خارج الواجهة: `python heart_explain.py --csv <الملف> --out explained.csv "
+                                   "--n-jobs -1`، أو ارفع ملفاً أصغر.")
+                    elif seconds <= CONTRIB_CONFIRM_SECONDS or st.button(
+                            f"▶️ حساب المساهمات (تقدير ~{seconds:.0f} ث)", key="batch_contrib_run"):
+                        with st.spinner("جاري حساب مساهمات السمات..."):
+                            cols, _, scale = contribution_columns(local[0], batch["out"], local[1], n_jobs=-1)
+                        batch["contrib"] = (cols, scale)
+            if "contrib" in batch:
+                cols, scale = batch["contrib"]
+                extra.append(("contrib", cols))
+                st.caption(f"المساهمات على مقياس {scale}؛ top_factors = أكثر ثلاث سمات رفعاً للخطر لكل سجل.")
+
+        # ملخص الجيران لكل سجل (نسبة المصابين بين أقرب 5 مرضى في بيانات التدريب ومتوسط المسافة)
+        if st.checkbox("إضافة ملخص المرضى المشابهين (similar_*) إلى ملف التنزيل", key="batch_neighbors"):
+            if "neighbors" not in batch:
+                index = get_neighbor_index(st.session_state.get("model_version"))
+                batch["neighbors"] = None if index is None else index.summarize(batch["out"])
+            if batch["neighbors"] is None:
+                st.info("لا يتوفر فهرس المرضى المشابهين لهذه النسخة من النموذج.")
+            else:
+                extra.append(("neighbors", batch["neighbors"]))
+
+        # ملف التنزيل يُولَّد مرة لكل (عتبة، أعمدة إضافية) ويُحفظ مع الدفعة؛ للدفعات الكبيرة عند الطلب فقط
+        # حتى لا يُعاد توليد ملايين الأسطر مع كل تحريك للعتبة
+        opts = (thr, tuple(name for name, _ in extra))
+        ready = batch.get("download")
+        if (ready is None or ready[0] != opts) and (len(out) <= EAGER_DOWNLOAD_ROWS or
+                                                    st.button(f"📦 تجهيز ملف التنزيل ({len(out):,} سجل)")):
+            full = pd.concat([out.assign(high_risk=out["risk_percent"] >= thr)] + [cols for _, cols in extra], axis=1)
+            buf = StringIO()
+            full.to_csv(buf, index=False)
+            ready = batch["download"] = (opts, buf.getvalue())
+        if ready is not None and ready[0] == opts:
+            st.download_button("⬇️ تنزيل النتائج (CSV)", data=ready[1], file_name="heart_batch_results.csv",
+                               mime="text/csv")
+
     uploaded = st.file_uploader("اختر ملف CSV", type=["csv"])
     if uploaded is not None:
         try:
-            df = read_csv_auto(uploaded)
             required_cols = ["age","sex","cp","trtbps","chol","fbs","restecg","thalachh","exng","oldpeak","slp","caa","thall"]
-            missing = [c for c in required_cols if c not in df.columns]
-            if missing:
-                st.error("الأعمدة الناقصة: " + ", ".join(missing))
-            else:
-                # استخدم DataFrame بأسماء الأعمدة ليتوافق مع ColumnTransformer
-                X = df[required_cols]
-                model = get_model()
-                # تنبؤ متجه بالكامل
-                y_pred = model.predict(X)
-                # احتمالات: predict_proba ثم decision_function->sigmoid، وإلا نستخدم التصنيف مع تحذير
-                y_proba = None
-                try:
-                    if hasattr(model, "predict_proba"):
-                        y_proba = model.predict_proba(X)[:, 1] * 100.0
-                except Exception:
-                    y_proba = None
-                if y_proba is None:
+            model = get_model()
+            # النتائج تُحسب مرة لكل (ملف، نسخة نموذج) وتُحفظ في الجلسة مع مخططاتها
+            batch_key = (uploaded.file_id, st.session_state.get("model_version"))
+            batch = st.session_state.get("batch_result")
+            if batch is None or batch["key"] != batch_key:
+                batch = None
+                st.session_state.batch_result = None
+                df = read_csv_auto(uploaded)
+                missing = [c for c in required_cols if c not in df.columns]
+                if missing:
+                    st.error("الأعمدة الناقصة: " + ", ".join(missing))
+                else:
+                    # تنبؤ متجه بالكامل (نفس الدالة التي تستخدمها خدمة HTTP)
+                    # احتمالات: predict_proba ثم decision_function->sigmoid، وإلا نستخدم التصنيف مع تحذير
+                    out, has_proba = score_frame(model, df, required_cols)
+                    audit = get_audit_log()
+                    batch_id = None if audit is None else audit.log_batch(
+                        out, required_cols, out["prediction"], out["risk_percent"] if has_proba else None,
+                        st.session_state.username, st.session_state.get("model_version"), uploaded.name)
+                    # مكعب الشرائح بمرور متجه واحد وقت التقييم؛ يبقى مع الدفعة في الجلسة ويُحفظ مع النتائج
+                    from heart_segments import build_cube, save_cube
+                    cube = build_cube(out)
+                    # حفظ النتائج في مخزن الدفعات (بنفس رقم الدفعة في السجل) للاستعلام لاحقاً دون إعادة الرفع
                     try:
-                        if hasattr(model, "decision_function"):
-                            vals = model.decision_function(X)
-                            y_proba = (1.0 / (1.0 + np.exp(-vals))) * 100.0
-                    except Exception:
-                        y_proba = None
-                if y_proba is None:
+                        from heart_results import save_results
+                        with st.spinner("جاري حفظ النتائج..."):
+                            batch_id = save_results(out, batch_id, user=st.session_state.username,
+                                                    model_version=st.session_state.get("model_version"),
+                                                    source=uploaded.name, has_proba=bool(has_proba))
+                            save_cube(cube, batch_id)
+                    except Exception as e:
+                        st.warning(f"تعذر حفظ النتائج في المخزن: {e}")
+                    # تجميعات العرض تُحسب هنا مرة: ترتيب الخطر التنازلي (للعتبة والصفحات)، مدرج، نقاط مئوية، وعينة
+                    from heart_charts import class_counts_bar
+                    from heart_segments import risk_summary, sample_index
+                    risk = out["risk_percent"].to_numpy(dtype=float)
+                    order = np.argsort(-risk, kind="stable")
+                    counts, edges = np.histogram(risk, bins=40)
+                    classes = out["prediction"].value_counts()
+                    batch = {
+                        "key": batch_key, "out": out, "has_proba": has_proba, "batch_id": batch_id, "cube": cube,
+                        "order": order, "risk_sorted": risk[order], "hist": (edges, counts),
+                        "summary": risk_summary(risk),
+                        "sample": out.iloc[sample_index(len(out))][
+                            list(WHAT_IF_NUMERIC) + ["prediction", "risk_percent"]],
+                        "bar_fig": class_counts_bar(int(classes.get(0, 0)), int(classes.get(1, 0))),
+                    }
+                    st.session_state.batch_result = batch
+            if batch is not None:
+                out = batch["out"]
+                if not batch["has_proba"]:
                     st.info("ℹ️ لا يوفر النموذج احتمالات دقيقة؛ تم استخدام التصنيف الثنائي كمرجع تقريبي.")
-                    y_proba = y_pred.astype(float) * 100.0
-                out = df.copy()
-                out["prediction"] = y_pred.astype(int)
-                out["risk_percent"] = np.round(y_proba, 2)
-                st.success("تم الحساب بنجاح")
+                st.success("تم الحساب بنجاح" + (f" — رقم الدفعة: {batch['batch_id']}" if batch["batch_id"] else ""))
+                if batch["batch_id"] and st.button("🔎 استعلام هذه الدفعة"):
+                    st.session_state.results_batch = batch["batch_id"]
+                    st.session_state.nav = "النتائج المحفوظة"
+                    st.rerun()
 
                 # ملخصات تفاعلية
                 cA, cB, cC, cD = st.columns(4)
                 with cA:
                     st.metric("عدد السجلات", len(out))
                 with cB:
-                    st.metric("متوسط نسبة الخطر %", f"{out['risk_percent'].mean():.2f}")
+                    st.metric("متوسط نسبة الخطر %", f"{batch['summary'].get('mean', np.nan):.2f}")
                 with cC:
-                    st.metric("أعلى نسبة خطر %", f"{out['risk_percent'].max():.2f}")
+                    st.metric("أعلى نسبة خطر %", f"{batch['summary'].get('max', np.nan):.2f}")
                 with cD:
-                    st.metric("أقل نسبة خطر %", f"{out['risk_percent'].min():.2f}")
+                    st.metric("أقل نسبة خطر %", f"{batch['summary'].get('min', np.nan):.2f}")
 
                 # عتبة الخطر وعرض الأعلى خطراً
                 st.markdown("### عتبة تحديد الحالات عالية الخطر")
-                thr = st.slider("اختر العتبة (%)", 0.0, 100.0, 50.0, step=1.0)
-                out["high_risk"] = out["risk_percent"] >= thr
-                st.write(f"عدد الحالات عالية الخطر (≥ {thr:.0f}%): {int(out['high_risk'].sum())}")
-
-                # مخطط هيستوجرام لنسبة الخطر
-                hist_fig = go.Figure(data=[go.Histogram(x=out["risk_percent"], nbinsx=20, marker_color="#c0392b")])
-                hist_fig.update_layout(title="توزيع نسبة الخطر (%)", xaxis_title="نسبة الخطر", yaxis_title="عدد السجلات")
-                st.plotly_chart(hist_fig, use_container_width=True)
-
-                # عدادات للفئات المتنبأ بها
-                counts = out["prediction"].value_counts().sort_index()
-                bar_fig = go.Figure(data=[go.Bar(x=["غير خطر (0)", "خطر (1)"], y=[counts.get(0,0), counts.get(1,0)], marker_color=["#2ecc71", "#e74c3c"])])
-                bar_fig.update_layout(title="عدد السجلات حسب الفئة المتنبأ بها", xaxis_title="الفئة", yaxis_title="العدد")
-                st.plotly_chart(bar_fig, use_container_width=True)
-
-                # جدول أعلى الحالات خطراً مع إمكانية تصفية حسب العتبة
-                st.markdown("### أعلى الحالات خطراً")
-                top_n = st.number_input("أعرض أعلى N", min_value=5, max_value=100, value=10, step=1)
-                top_df = out[out["high_risk"]].sort_values("risk_percent", ascending=False).head(int(top_n))
-                st.dataframe(top_df, use_container_width=True)
-
-                buf = StringIO()
-                out.to_csv(buf, index=False)
-                st.download_button("⬇️ تنزيل النتائج (CSV)", data=buf.getvalue(), file_name="heart_batch_results.csv", mime="text/csv")
+                batch_analytics(batch)
         except Exception as e:
+            if _RerunException is not None and isinstance(e, _RerunException):
+                raise e
             st.exception(e)
+    else:
+        st.session_state.pop("batch_result", None)
+
+# النتائج المحفوظة: تصفية وصفحات وتجميع على دفعات مُقيَّمة سابقاً (مخزن Parquet) دون إعادة رفع الملف
+elif st.session_state.nav == "النتائج المحفوظة":
+    from heart_results import AGE_BANDS, build_filters, list_batches
+    st.header("🔎 النتائج المحفوظة")
+    batches = list_batches()
+    if not batches:
+        st.info("لا توجد دفعات محفوظة بعد؛ ارفع ملف CSV من صفحة \"رفع ملف CSV\".")
+        st.stop()
+    by_id = {m["batch_id"]: m for m in batches}
+    ids = list(by_id)
+    chosen = st.session_state.get("results_batch")
+    batch_id = st.selectbox(
+        "الدفعة", ids, index=ids.index(chosen) if chosen in ids else 0,
+        format_func=lambda b: f"{by_id[b].get('source') or b} — {by_id[b].get('n_rows', 0):,} سجل — {by_id[b].get('created', '')}")
+    st.session_state.results_batch = batch_id
+
+    c1, c2, c3 = st.columns(3)
+    with c1:
+        risk_rng = st.slider("نطاق الخطر (%)", 0.0, 100.0, (0.0, 100.0), step=1.0, key="results_risk")
+        pred_sel = st.multiselect("التصنيف", [0, 1], key="results_pred")
+    with c2:
+        bands = st.multiselect("الفئة العمرية", list(range(len(AGE_BANDS))), format_func=lambda i: AGE_BANDS[i],
+                               key="results_age")
+        sex_sel = st.multiselect("الجنس", [0, 1], format_func=lambda v: "أنثى" if v == 0 else "ذكر", key="results_sex")
+    with c3:
+        cp_sel = st.multiselect("نوع ألم الصدر (cp)", [0, 1, 2, 3], key="results_cp")
+        exng_sel = st.multiselect("ذبحة مع المجهود (exng)", [0, 1], key="results_exng")
+    filters = tuple(build_filters(risk_rng[0] if risk_rng[0] > 0 else None, risk_rng[1] if risk_rng[1] < 100 else None,
+                                  bands, sex_sel, cp_sel, exng_sel, pred_sel))
+    filters = tuple((c, o, tuple(v) if isinstance(v, list) else v) for c, o, v in filters)
+
+    # الصفحات بالمفتاح: (الخطر، رقم السطر) لآخر سجل في كل صفحة سابقة؛ تُصفَّر عند تغيير الدفعة أو الشروط
+    page_size = 50
+    if st.session_state.get("results_query") != (batch_id, filters):
+        st.session_state.results_query = (batch_id, filters)
+        st.session_state.results_cursors = [None]
+    cursors = st.session_state.results_cursors
+    t0 = time.perf_counter()
+    n_match, page_df = query_results(batch_id, filters, cursors[-1], page_size)
+    elapsed = time.perf_counter() - t0
+    st.metric("السجلات المطابقة", f"{n_match:,}")
+    st.dataframe(page_df, use_container_width=True, hide_index=True)
+    st.caption(f"الصفحة {len(cursors)} من {max(1, -(-n_match // page_size)):,} (الأعلى خطراً أولاً) — "
+               f"{elapsed * 1000:.0f} ميلي ثانية")
+    cP, cN = st.columns(2)
+    with cP:
+        if st.button("⬅️ السابق", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+    with cN:
+        if st.button("التالي ➡️", disabled=len(page_df) < page_size):
+            last = page_df.iloc[-1]
+            cursors.append((float(last["risk_percent"]), int(last["row_no"])))
+            st.rerun()
+
+    st.markdown("### توزيع الخطر للسجلات المطابقة")
+    render_distribution(*distribution_results(batch_id, filters), "results_dist")
+
+    st.markdown("### تجميع حسب")
+    dims = {"age_band": "الفئة العمرية", "sex": "الجنس", "cp": "cp", "exng": "exng", "fbs": "fbs", "slp": "slp",
+            "caa": "caa", "thall": "thall"}
+    by = st.multiselect("الأعمدة", list(dims), default=["age_band"], format_func=lambda c: dims[c], key="results_by")
+    agg = aggregate_results(batch_id, tuple(by), filters)
+    if "age_band" in agg.columns:
+        agg["age_band"] = agg["age_band"].map(lambda i: AGE_BANDS[int(i)])
+    st.dataframe(agg, use_container_width=True, hide_index=True)
+
+    # الشرائح من المكعب المحفوظ مع الدفعة (لا تتأثر بالشروط أعلاه ولا تقرأ السجلات)
+    st.markdown("### 🧩 تحليل الشرائح")
+    cube = load_batch_cube(batch_id)
+    if cube is None:
+        st.info("لا يوجد مكعب شرائح لهذه الدفعة (حُفظت قبل إضافة التحليل)؛ استخدم جدول التجميع أعلاه.")
+    else:
+        render_segments(cube, "results_segments")
+
+# سجل التنبؤات: كل الاستعلامات على فهارس SQLite، والصفحات بالمفتاح (id) لا بـ OFFSET
+elif st.session_state.nav == "سجل التنبؤات":
+    import datetime
+    from heart_audit import DEFAULT_DB, distinct, list_batches, parse_hash, recent, summary
+    st.header("🗂️ سجل التنبؤات")
+    audit = get_audit_log()
+    if audit is None:
+        st.info("سجل التدقيق معطّل (HEART_AUDIT=0).")
+    db = audit.db if audit is not None else DEFAULT_DB
+    if audit is not None:
+        s = audit.stats()
+        st.caption(f"في هذه العملية: {s['written_rows']:,} سجل مكتوب، {s['pending']} بانتظار الكتابة، "
+                   f"{s['dropped']} مُسقط لامتلاء الطابور")
+
+    c1, c2, c3 = st.columns(3)
+    with c1:
+        user = st.selectbox("المستخدم", ["الكل"] + distinct("user", db), key="audit_user")
+    with c2:
+        version = st.selectbox("نسخة النموذج", ["الكل"] + distinct("model_version", db), key="audit_version")
+    with c3:
+        kind = st.selectbox("النوع", ["الكل", "single", "batch"], key="audit_kind",
+                            format_func=lambda k: {"الكل": "الكل", "single": "فردي", "batch": "دفعي"}[k])
+    c1, c2, c3 = st.columns(3)
+    with c1:
+        today = datetime.date.today()
+        days = st.date_input("الفترة", (today - datetime.timedelta(days=7), today), key="audit_days")
+    with c2:
+        risk_rng = st.slider("نطاق الخطر (%)", 0.0, 100.0, (0.0, 100.0), step=1.0, key="audit_risk")
+    with c3:
+        hash_txt = st.text_input("بصمة المدخلات (اختياري)", key="audit_hash").strip()
+
+    filters = {
+        "user": None if user == "الكل" else user,
+        "version": None if version == "الكل" else version,
+        "kind": None if kind == "الكل" else kind,
+        "risk_min": None if risk_rng[0] <= 0 else risk_rng[0],
+        "risk_max": None if risk_rng[1] >= 100 else risk_rng[1],
+    }
+    if isinstance(days, (tuple, list)) and len(days) == 2:
+        filters["since"] = time.mktime(days[0].timetuple())
+        filters["until"] = time.mktime((days[1] + datetime.timedelta(days=1)).timetuple())
+    if hash_txt:
+        try:
+            filters["inputs"] = parse_hash(hash_txt)
+        except ValueError:
+            st.warning("البصمة يجب أن تكون 16 خانة سداسية.")
+
+    st.dataframe(summary(db, **filters), use_container_width=True, hide_index=True)
+
+    # مؤشرات الصفحات: id أصغر سجل في كل صفحة سابقة؛ تُصفَّر عند تغيير أي شرط
+    page_size = 50
+    if st.session_state.get("audit_filters") != filters:
+        st.session_state.audit_filters = filters
+        st.session_state.audit_cursors = [None]
+    cursors = st.session_state.audit_cursors
+    t0 = time.perf_counter()
+    page = recent(db, page_size, before_id=cursors[-1], **filters)
+    elapsed = time.perf_counter() - t0
+    st.dataframe(page, use_container_width=True, hide_index=True)
+    st.caption(f"الصفحة {len(cursors)} — {len(page)} سجل خلال {elapsed * 1000:.0f} ميلي ثانية")
+    cP, cN = st.columns(2)
+    with cP:
+        if st.button("⬅️ السابق", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+    with cN:
+        if st.button("التالي ➡️", disabled=len(page) < page_size):
+            cursors.append(int(page["id"].iloc[-1]))
+            st.rerun()
+
+    st.markdown("### الدفعات")
+    st.dataframe(list_batches(db, user=filters["user"]), use_container_width=True, hide_index=True)
 
 # صفحة حول
 elif st.session_state.nav == "حول":
     st.header("ℹ️ حول التطبيق")
     # اجلب الدقة ديناميكياً كما في الصفحة الرئيسية
-    last_acc = None
     mm = st.session_state.get("model_metrics")
     if not isinstance(mm, dict):
         try:
-            possible_paths = [
-                Path(__file__).parent / "heart_model.pkl",
-                Path.cwd() / "heart_model.pkl",
-            ]
-            for p in possible_paths:
-                if p.exists():
-                    obj = joblib.load(str(p))
-                    if isinstance(obj, dict) and 'metrics' in obj:
-                        st.session_state.model_metrics = obj.get('metrics')
-                        mm = st.session_state.model_metrics
-                    break
+            obj = load_model_metadata()
+            if 'metrics' in obj:
+                st.session_state.model_metrics = obj.get('metrics')
+                st.session_state.model_importance = obj.get('importance')
+                mm = st.session_state.model_metrics
         except Exception:
             pass
-    if isinstance(mm, dict):
-        last_acc = mm.get("accuracy")
-    acc_txt = f"{last_acc*100:.1f}%" if isinstance(last_acc, (int, float)) else "—"
+    acc_txt = format_accuracy(mm)
 
     st.markdown(
         f"""
@@ -2395,6 +3017,12 @@ elif st.session_state.nav == "حول":
         """
     )
 
+    # أهمية السمات للنموذج الحالي: تُقرأ من الحمولة مباشرةً دون أي حساب
+    model_imp = st.session_state.get("model_importance")
+    if isinstance(model_imp, dict) and model_imp.get("mean"):
+        st.markdown("### 📊 أهمية السمات في النموذج الحالي")
+        render_importance(model_imp)
+
     st.markdown("### 👥 الإشراف والفريق")
     c1, c2 = st.columns(2)
     with c2:
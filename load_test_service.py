@@ -0,0 +1,85 @@
+# اختبار حِمل محلي لخدمة التنبؤ heart_service.py (مكتبة قياسية فقط)
+# كل خيط يفتح اتصالاً دائماً (keep-alive) ويرسل طلبات متتالية، ثم تُطبع الإنتاجية وزمن الاستجابة p50/p95/p99
+#
+# أمثلة:
+#   python load_test_service.py --concurrency 32 --duration 10
+#   python load_test_service.py --mode batch --batch-rows 500 --concurrency 4
+import argparse
+import http.client
+import json
+import threading
+import time
+
+import numpy as np
+
+from heart_inference import REQUIRED_FEATURES
+from make_heart_data import generate_chunk
+
+
+def _worker(host, port, path, bodies, headers, deadline, latencies, errors, lock):
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    local, bad, i = [], 0, 0
+    while time.perf_counter() < deadline:
+        body = bodies[i % len(bodies)]
+        i += 1
+        t = time.perf_counter()
+        try:
+            conn.request("POST", path, body=body, headers=headers)
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status != 200:
+                bad += 1
+        except (OSError, http.client.HTTPException):
+            bad += 1
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+            continue
+        local.append(time.perf_counter() - t)
+    conn.close()
+    with lock:
+        latencies.extend(local)
+        errors[0] += bad
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="اختبار حِمل لخدمة التنبؤ")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8600)
+    ap.add_argument("--mode", choices=["single", "batch"], default="single")
+    ap.add_argument("--concurrency", type=int, default=32, help="عدد العملاء المتزامنين")
+    ap.add_argument("--duration", type=float, default=10.0, help="مدة الاختبار بالثواني")
+    ap.add_argument("--batch-rows", type=int, default=100, help="عدد السجلات في كل طلب دفعي")
+    args = ap.parse_args(argv)
+
+    rows = generate_chunk(max(1000, args.batch_rows), np.random.default_rng(0))[REQUIRED_FEATURES]
+    if args.mode == "single":
+        path, headers = "/v1/predict", {"Content-Type": "application/json"}
+        bodies = [json.dumps(r).encode("utf-8") for r in rows.head(1000).to_dict("records")]
+        per_request = 1
+    else:
+        path, headers = "/v1/predict/batch", {"Content-Type": "application/x-ndjson"}
+        chunk = rows.head(args.batch_rows).to_dict("records")
+        bodies = [("\n".join(json.dumps(r) for r in chunk) + "\n").encode("utf-8")]
+        per_request = args.batch_rows
+
+    latencies, errors, lock = [], [0], threading.Lock()
+    deadline = time.perf_counter() + args.duration
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=_worker, args=(args.host, args.port, path, bodies, headers, deadline,
+                                                      latencies, errors, lock))
+               for _ in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    lat = np.array(latencies) * 1000
+    n = len(lat)
+    print(f"الطلبات: {n} خلال {elapsed:.1f} ث ({n / elapsed:,.0f} طلب/ث، {n * per_request / elapsed:,.0f} سجل/ث)، أخطاء: {errors[0]}")
+    if n:
+        print(f"زمن الاستجابة: p50={np.percentile(lat, 50):.1f}ms  p95={np.percentile(lat, 95):.1f}ms  p99={np.percentile(lat, 99):.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
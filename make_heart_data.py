@@ -1,32 +1,161 @@
-import pandas as pd
+# مولّد بيانات اصطناعية لأمراض القلب لاختبارات الحِمل (تدريب/تنبؤ بأحجام كبيرة)
+# - يولّد N سجل (حتى 100M) على شكل أجزاء (shards) بالتوازي عبر عدة عمليات
+# - العمود output يُشتق من نموذج خطر كامن قابل للضبط (لوجستي) حتى تكون دقة النماذج ذات معنى
+# - البذرة (seed) تجعل الناتج قابلاً لإعادة الإنتاج بغض النظر عن عدد العمليات
+#
+# أمثلة:
+#   python make_heart_data.py --rows 10000 --out data/synthetic
+#   python make_heart_data.py --rows 100000000 --chunk-rows 1000000 --workers 8 --format parquet --out data/big
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
 import numpy as np
+import pandas as pd
 
-# عدد السجلات الجديدة
-num_records = 10000
-
-# توليد بيانات عشوائية قريبة من بيانات أمراض القلب
-data = {
-    "age": np.random.randint(29, 77, num_records),          # العمر
-    "sex": np.random.randint(0, 2, num_records),            # الجنس (0 = أنثى, 1 = ذكر)
-    "cp": np.random.randint(0, 4, num_records),             # نوع ألم الصدر
-    "trtbps": np.random.randint(90, 200, num_records),      # ضغط الدم
-    "chol": np.random.randint(120, 570, num_records),       # الكولسترول
-    "fbs": np.random.randint(0, 2, num_records),            # سكر صائم > 120
-    "restecg": np.random.randint(0, 2, num_records),        # تخطيط القلب
-    "thalachh": np.random.randint(70, 210, num_records),    # أعلى معدل نبض
-    "exng": np.random.randint(0, 2, num_records),           # ذبحة عند المجهود
-    "oldpeak": np.round(np.random.uniform(0.0, 6.2, num_records), 1),  # انخفاض ST
-    "slp": np.random.randint(0, 3, num_records),            # ميل القطع ST
-    "caa": np.random.randint(0, 5, num_records),            # عدد الأوعية
-    "thall": np.random.randint(0, 4, num_records),          # نوع thal
-    "output": np.random.randint(0, 2, num_records)          # النتيجة (0 أو 1)
+COLUMNS = ["age", "sex", "cp", "trtbps", "chol", "fbs", "restecg", "thalachh",
+           "exng", "oldpeak", "slp", "caa", "thall", "output"]
+
+# نموذج الخطر الكامن الافتراضي:
+#   logit = intercept + Σ weight * (x - center) / scale  للسمات الرقمية
+#                     + levels[x]                          للسمات الفئوية
+# الاتجاهات مأخوذة من بيانات heart.csv الأصلية (مثلاً: cp>0 و thalachh المرتفع يرفعان احتمال output=1)
+DEFAULT_RISK_MODEL = {
+    "intercept": 0.15,
+    "numeric": {
+        "age": {"center": 54, "scale": 9, "weight": -0.25},
+        "trtbps": {"center": 131, "scale": 17, "weight": -0.2},
+        "chol": {"center": 246, "scale": 52, "weight": -0.1},
+        "thalachh": {"center": 150, "scale": 23, "weight": 0.55},
+        "oldpeak": {"center": 1.0, "scale": 1.1, "weight": -0.6},
+    },
+    "categorical": {
+        "sex": {"0": 0.7, "1": -0.3},
+        "cp": {"0": -1.0, "1": 0.6, "2": 0.8, "3": 0.5},
+        "fbs": {"0": 0.0, "1": -0.05},
+        "restecg": {"0": -0.2, "1": 0.2, "2": -0.3},
+        "exng": {"0": 0.45, "1": -0.9},
+        "slp": {"0": -0.3, "1": -0.5, "2": 0.55},
+        "caa": {"0": 0.8, "1": -0.5, "2": -1.0, "3": -1.0, "4": 0.3},
+        "thall": {"0": 0.0, "1": -0.4, "2": 0.7, "3": -0.8},
+    },
 }
 
-# تحويل البيانات إلى DataFrame
-df = pd.DataFrame(data)
 
-# حفظ البيانات في ملف CSV جديد
-file_path = r"C:/Users/Elite/Downloads/heart_comma_updated.csv"
-df.to_csv(file_path, sep=';', index=False)
+# دمج إعدادات المستخدم (JSON) فوق النموذج الافتراضي
+def load_risk_model(path=None):
+    model = json.loads(json.dumps(DEFAULT_RISK_MODEL))
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            user = json.load(f)
+        if "intercept" in user:
+            model["intercept"] = float(user["intercept"])
+        for section in ("numeric", "categorical"):
+            for col, spec in (user.get(section) or {}).items():
+                model[section].setdefault(col, {}).update(spec)
+    return model
+
+
+# احتمال output=1 لكل صف وفق نموذج الخطر (متجه بالكامل)
+def risk_probability(df: pd.DataFrame, risk_model: dict) -> np.ndarray:
+    logit = np.full(len(df), float(risk_model.get("intercept", 0.0)))
+    for col, spec in risk_model.get("numeric", {}).items():
+        x = df[col].to_numpy(dtype=np.float64)
+        logit += float(spec.get("weight", 0.0)) * (x - float(spec.get("center", 0.0))) / float(spec.get("scale", 1.0))
+    for col, levels in risk_model.get("categorical", {}).items():
+        codes = df[col].to_numpy().astype(np.int64)
+        table = np.zeros(int(codes.max(initial=0)) + 1)
+        for k, w in levels.items():
+            if int(k) < len(table):
+                table[int(k)] = float(w)
+        logit += table[codes]
+    return 1.0 / (1.0 + np.exp(-logit))
+
+
+# توليد جزء واحد: توزيعات قريبة من بيانات أمراض القلب مع ارتباطات بسيطة بالعمر
+def generate_chunk(n: int, rng: np.random.Generator, risk_model: dict = None) -> pd.DataFrame:
+    risk_model = risk_model or DEFAULT_RISK_MODEL
+    age = np.clip(np.rint(rng.normal(54, 9, n)), 29, 77).astype(np.int16)
+    df = pd.DataFrame({
+        "age": age,                                                                           # العمر
+        "sex": (rng.random(n) < 0.68).astype(np.int8),                                        # الجنس (0 = أنثى, 1 = ذكر)
+        "cp": rng.choice(4, size=n, p=[0.47, 0.17, 0.28, 0.08]).astype(np.int8),              # نوع ألم الصدر
+        "trtbps": np.clip(np.rint(rng.normal(98 + 0.6 * age, 16)), 90, 200).astype(np.int16),  # ضغط الدم
+        "chol": np.clip(np.rint(rng.normal(198 + 0.9 * age, 48)), 120, 570).astype(np.int16),  # الكولسترول
+        "fbs": (rng.random(n) < 0.15).astype(np.int8),                                        # سكر صائم > 120
+        "restecg": rng.choice(3, size=n, p=[0.48, 0.50, 0.02]).astype(np.int8),               # تخطيط القلب
+        "thalachh": np.clip(np.rint(rng.normal(205 - 1.0 * age, 20)), 70, 210).astype(np.int16),  # أعلى معدل نبض
+        "exng": (rng.random(n) < 0.33).astype(np.int8),                                       # ذبحة عند المجهود
+        "oldpeak": np.clip(np.round(rng.gamma(1.2, 0.85, n), 1), 0.0, 6.2).astype(np.float32),  # انخفاض ST
+        "slp": rng.choice(3, size=n, p=[0.07, 0.46, 0.47]).astype(np.int8),                   # ميل القطع ST
+        "caa": rng.choice(5, size=n, p=[0.58, 0.22, 0.12, 0.07, 0.01]).astype(np.int8),       # عدد الأوعية
+        "thall": rng.choice(4, size=n, p=[0.01, 0.06, 0.55, 0.38]).astype(np.int8),           # نوع thal
+    })
+    df["output"] = (rng.random(n) < risk_probability(df, risk_model)).astype(np.int8)  # النتيجة (0 أو 1)
+    return df
+
+
+# كتابة ذرّية: ملف مؤقت ثم os.replace حتى لا يظهر جزء نصف مكتوب عند الانقطاع
+def write_frame(df: pd.DataFrame, path: Path, fmt: str = "csv", sep: str = ";"):
+    tmp = path.with_name(path.name + ".tmp")
+    if fmt == "parquet":
+        df.to_parquet(tmp, index=False)
+    else:
+        df.to_csv(tmp, sep=sep, index=False)
+    os.replace(tmp, path)
+
+
+# مهمة عملية عاملة: توليد جزء وكتابته (البذرة مشتقة من SeedSequence برقم الجزء)
+def _write_shard(args):
+    index, n, seed_seq, out_dir, fmt, sep, risk_model = args
+    rng = np.random.default_rng(seed_seq)
+    df = generate_chunk(n, rng, risk_model)
+    path = Path(out_dir) / f"part-{index:05d}.{fmt}"
+    write_frame(df, path, fmt, sep)
+    return str(path), n, int(df["output"].sum())
+
+
+def generate_dataset(rows, out_dir, chunk_rows=1_000_000, workers=None, seed=42, fmt="csv", sep=";", risk_model=None):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    risk_model = risk_model or DEFAULT_RISK_MODEL
+    n_chunks = max(1, -(-int(rows) // int(chunk_rows)))
+    seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+    tasks = []
+    for i in range(n_chunks):
+        n = min(chunk_rows, rows - i * chunk_rows)
+        tasks.append((i, n, seeds[i], str(out_dir), fmt, sep, risk_model))
+    if n_chunks == 1 or workers == 1:
+        return [_write_shard(t) for t in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        return list(ex.map(_write_shard, tasks))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="توليد بيانات اصطناعية لأمراض القلب على شكل أجزاء CSV/Parquet")
+    ap.add_argument("--rows", type=int, default=10000, help="عدد السجلات الكلي")
+    ap.add_argument("--out", default="data/synthetic", help="مجلد الإخراج للأجزاء part-XXXXX")
+    ap.add_argument("--chunk-rows", type=int, default=1_000_000, help="عدد السجلات في كل جزء")
+    ap.add_argument("--workers", type=int, default=None, help="عدد العمليات (افتراضياً عدد الأنوية)")
+    ap.add_argument("--seed", type=int, default=42, help="البذرة لإعادة الإنتاج")
+    ap.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    ap.add_argument("--sep", default=";", help="فاصل CSV (الملفات الحالية تستخدم ';')")
+    ap.add_argument("--risk-model", default=None, help="ملف JSON لتعديل نموذج الخطر الكامن")
+    args = ap.parse_args(argv)
+
+    risk_model = load_risk_model(args.risk_model)
+    t0 = time.perf_counter()
+    shards = generate_dataset(args.rows, args.out, args.chunk_rows, args.workers, args.seed,
+                              args.format, args.sep, risk_model)
+    elapsed = time.perf_counter() - t0
+    total = sum(n for _, n, _ in shards)
+    positives = sum(p for _, _, p in shards)
+    print(f"✅ تم إنشاء {total} سجل في {len(shards)} جزء داخل {args.out} خلال {elapsed:.1f} ث "
+          f"({total / max(elapsed, 1e-9):,.0f} سجل/ث)، نسبة output=1: {positives / max(total, 1):.1%}")
+
 
-print(f"✅ تم إنشاء الملف وحفظ {num_records} سجل في {file_path}")
+if __name__ == "__main__":
+    main()